@@ -0,0 +1,146 @@
+"""
+Benchmark the client end to end against the local stub server: pagination, bulk upload and polling, with the
+throughput and latency percentiles of each scenario.
+
+    python -m benchmarks.bench_client --latency-ms 20 --error-rate 0.01
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from document_insighter.poller import ChannelLogPoller
+from document_insighter.transport import TransportPolicy
+from tests.stub_server import StubConfig, StubServer
+
+START_DATE = datetime(2022, 3, 1)
+END_DATE = datetime(2022, 3, 2)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+def report(name, count, unit, elapsed, latencies):
+    p50, p90, p99 = (percentile(latencies, q) * 1000 for q in (50, 90, 99))
+    print(f"{name:32s} {count / elapsed:10.1f} {unit}/s  p50 {p50:8.1f} ms  p90 {p90:8.1f} ms  p99 {p99:8.1f} ms")
+
+
+def bench_pagination(server, args, prefetch):
+    with server.client(transport=args.transport) as client:
+        latencies = []
+        count = 0
+        start = last = time.perf_counter()
+        for page in client.query_extractions_pages("NB_COA", START_DATE, END_DATE, page_size=args.page_size,
+                                                   prefetch=prefetch):
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+            count += len(page)
+        report(f"pagination, prefetch {prefetch}", count, "extractions", time.perf_counter() - start, latencies)
+
+
+def bench_streamed_query(server, args):
+    with server.client(transport=args.transport) as client:
+        latencies = []
+        count = 0
+        start = last = time.perf_counter()
+        for _ in client.query_extractions("NB_COA", START_DATE, END_DATE, page_size=args.page_size):
+            count += 1
+            if count % args.page_size == 0:
+                # the latency of each page of the stream
+                now = time.perf_counter()
+                latencies.append(now - last)
+                last = now
+        report("streamed query", count, "extractions", time.perf_counter() - start, latencies)
+
+
+def bench_upload(server, args, file_paths):
+    with server.client(transport=args.transport) as client:
+        started = {}
+        latencies = []
+        lock = threading.Lock()
+
+        def metadata_fn(file_path):
+            with lock:
+                started[file_path] = time.perf_counter()
+            return {"source": "benchmark"}
+
+        start = time.perf_counter()
+        failed = 0
+        for result in client.upload_documents("NB_COA", file_paths, metadata_fn=metadata_fn,
+                                              max_workers=args.workers):
+            latencies.append(time.perf_counter() - started[result.file_path])
+            failed += not result.ok
+        elapsed = time.perf_counter() - start
+        report(f"bulk upload, {args.workers} workers", len(file_paths), "files", elapsed, latencies)
+        print(f"{'':32s} {len(file_paths) * args.file_kb / 1024 / elapsed:10.1f} MiB/s  failed {failed}")
+
+
+def bench_polling(server, args):
+    with server.client(transport=args.transport) as client:
+        log_ids = [f"log-{i}" for i in range(args.polls)]
+        now = time.monotonic()
+        for i, log_id in enumerate(log_ids):
+            server.channel_logs[log_id] = (now, i)
+
+        latencies = []
+        lock = threading.Lock()
+        done = threading.Semaphore(0)
+        with ChannelLogPoller(client, initial_step=args.poll_step, max_workers=args.workers) as poller:
+            start = time.perf_counter()
+            for log_id in log_ids:
+                def callback(future, submitted=time.perf_counter()):
+                    with lock:
+                        latencies.append(time.perf_counter() - submitted)
+                    done.release()
+                poller.submit(log_id, callback=callback)
+            for _ in log_ids:
+                done.acquire()
+            elapsed = time.perf_counter() - start
+        report(f"polling, {args.workers} workers", len(log_ids), "logs", elapsed, latencies)
+        print(f"{'':32s} {server.requests['status'] / len(log_ids):10.1f} status requests per log")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", default=20, type=float, help="Latency of each request of the stub")
+    parser.add_argument("--error-rate", default=0, type=float, help="Probability of a 503 response")
+    parser.add_argument("--extractions", default=2000, type=int, help="Extractions returned by the query")
+    parser.add_argument("--page-size", default=100, type=int, help="Extractions per page")
+    parser.add_argument("--files", default=200, type=int, help="Files uploaded")
+    parser.add_argument("--file-kb", default=256, type=int, help="Size of each uploaded file in KiB")
+    parser.add_argument("--polls", default=200, type=int, help="Channel logs polled")
+    parser.add_argument("--processing-ms", default=500, type=float, help="Processing time of a channel log")
+    parser.add_argument("--poll-step", default=0.1, type=float, help="Initial seconds between two polls")
+    parser.add_argument("--workers", default=8, type=int, help="Worker threads of uploads and polls")
+    args = parser.parse_args()
+    args.transport = TransportPolicy(pool_maxsize=max(args.workers, 10), backoff_factor=0.01)
+
+    config = StubConfig(
+        latency=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        extractions=args.extractions,
+        processing_time=args.processing_ms / 1000,
+    )
+    with StubServer(config) as server, tempfile.TemporaryDirectory() as directory:
+        bench_pagination(server, args, prefetch=0)
+        bench_pagination(server, args, prefetch=2)
+        bench_streamed_query(server, args)
+
+        file_paths = []
+        for i in range(args.files):
+            file_paths.append(os.path.join(directory, f"scan-{i}.pdf"))
+            with open(file_paths[-1], "wb") as f:
+                f.write(os.urandom(args.file_kb * 1024))
+        bench_upload(server, args, file_paths)
+        bench_polling(server, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Benchmark decoding of NB_COA extractions with dataclasses_json and the compiled codec.
+
+    python -m benchmarks.bench_decode --extractions 500 --batches 3 --rows 12
+"""
+import argparse
+import timeit
+
+from document_insighter.codec import from_dict, to_dict
+from document_insighter.model import Extraction
+from tests.payloads import make_page
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--extractions", default=500, type=int, help="Number of extractions")
+    parser.add_argument("--batches", default=3, type=int, help="Batch sections in each extraction")
+    parser.add_argument("--rows", default=12, type=int, help="Rows in each test parameters table")
+    parser.add_argument("--repeat", default=3, type=int, help="Repeat each benchmark and keep the best")
+    args = parser.parse_args()
+
+    page = make_page(0, args.extractions, batches=args.batches, rows=args.rows)
+    decoded = [from_dict(Extraction, x) for x in page]
+    assert decoded == [Extraction.from_dict(x) for x in page]
+
+    cases = [
+        ("dataclasses_json from_dict", lambda: [Extraction.from_dict(x) for x in page]),
+        ("codec from_dict", lambda: [from_dict(Extraction, x) for x in page]),
+        ("dataclasses_json to_dict", lambda: [x.to_dict() for x in decoded]),
+        ("codec to_dict", lambda: [to_dict(x) for x in decoded]),
+    ]
+    results = {}
+    for name, func in cases:
+        results[name] = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print(f"{name:30s} {results[name] * 1000:10.1f} ms  {args.extractions / results[name]:10.0f} extractions/s")
+
+    for operation in ("from_dict", "to_dict"):
+        speedup = results[f"dataclasses_json {operation}"] / results[f"codec {operation}"]
+        print(f"{operation} speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
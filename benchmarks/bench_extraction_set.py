@@ -0,0 +1,75 @@
+"""
+Benchmark an out of spec query across many extractions: nested loops over Extraction objects, and the vectorized
+query of an ExtractionSet.
+
+    python -m benchmarks.bench_extraction_set --extractions 20000
+"""
+import argparse
+import time
+
+from document_insighter.codec import LAZY_TABLES, from_dict
+from document_insighter.extraction_set import ExtractionSet, group_by
+from document_insighter.model import Extraction
+from tests.payloads import make_page
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def nested_loops(extractions):
+    counts = {}
+    for extraction in extractions:
+        for section in extraction.sections_by_category.get("coa_batch", []):
+            table = section.table("test_parameters")
+            if table is None:
+                continue
+            columns = table.columns
+            limits = columns["specification"].standard_values
+            for name, result, limit in zip(columns["name"].values, columns["result"].values, limits):
+                if number(result) > number(limit):
+                    counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def vectorized(extraction_set):
+    rows = extraction_set.table("test_parameters", section_category="coa_batch")
+    out = rows.filter(rows.numbers("result") > rows.numbers("specification", standard=True))
+    names, counts = group_by(out.values("name"))
+    return dict(zip(names, counts.tolist()))
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--extractions", default=20000, type=int, help="Number of extractions")
+    parser.add_argument("--batches", default=3, type=int, help="Batch sections in each extraction")
+    parser.add_argument("--rows", default=12, type=int, help="Rows in each test parameters table")
+    args = parser.parse_args()
+
+    page = make_page(0, args.extractions, batches=args.batches, rows=args.rows)
+    extractions, decode = measure(lambda: [from_dict(Extraction, x, lazy=LAZY_TABLES) for x in page])
+    extraction_set, build = measure(ExtractionSet, page)
+    expected, loops = measure(nested_loops, extractions)
+    # the columns of a table are gathered on the first query of the set
+    measure(vectorized, extraction_set)
+    result, query = measure(vectorized, extraction_set)
+    assert result == expected
+
+    print(f"{'decode Extraction objects':30s} {decode * 1000:10.1f} ms")
+    print(f"{'build ExtractionSet':30s} {build * 1000:10.1f} ms")
+    print(f"{'nested loops query':30s} {loops * 1000:10.1f} ms")
+    print(f"{'vectorized query':30s} {query * 1000:10.1f} ms")
+    print(f"query speedup: {loops / query:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
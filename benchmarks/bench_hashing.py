@@ -0,0 +1,79 @@
+"""
+Benchmark md5 checksums of large files: reading the whole file, reading in chunks, memory mapping, and the
+FileHashCache on a second run.
+
+    python -m benchmarks.bench_hashing --size-mb 300
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+import tracemalloc
+
+from document_insighter.hash_cache import FileHashCache
+from document_insighter.helpers import md5_checksum
+
+
+def read_all(file_path):
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    return hashlib.md5(data).hexdigest()
+
+
+def memory_mapped(file_path):
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        return hashlib.md5(m).hexdigest()
+
+
+def measure(func, file_path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    digest = func(file_path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return digest, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", default=300, type=int, help="Size of the file in MiB")
+    parser.add_argument("--files", default=3, type=int, help="Number of files hashed in each run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(directory, f"scan-{i}.pdf")
+            with open(path, "wb") as f:
+                for _ in range(args.size_mb):
+                    f.write(os.urandom(1024 * 1024))
+            paths.append(path)
+
+        cache = FileHashCache(os.path.join(directory, "hashes.db"))
+        cases = [
+            ("read all", read_all),
+            ("chunked 64 KiB", lambda path: md5_checksum(path, chunk_size=64 * 1024)),
+            ("chunked 1 MiB", md5_checksum),
+            ("mmap", memory_mapped),
+            ("cache, first run", cache.md5),
+            ("cache, second run", cache.md5),
+        ]
+        expected = [read_all(path) for path in paths]
+        total_mb = args.size_mb * args.files
+        for name, func in cases:
+            elapsed = 0
+            peak = 0
+            for path, digest in zip(paths, expected):
+                result, seconds, memory = measure(func, path)
+                assert result == digest
+                elapsed += seconds
+                peak = max(peak, memory)
+            print(f"{name:20s} {elapsed:8.3f} s {total_mb / elapsed:10.0f} MiB/s  peak {peak / 1024 / 1024:8.1f} MiB")
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
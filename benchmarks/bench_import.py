@@ -0,0 +1,78 @@
+"""
+Benchmark the startup cost of the client: the import time of document_insighter.api_client measured with
+`python -X importtime` in fresh interpreters, and the modules which are loaded before the first request.
+
+    python -m benchmarks.bench_import --runs 10 --budget-ms 150
+
+The exit status is 1 when the median import time exceeds the budget, or when a dependency which should be
+loaded on first use is imported at startup.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+STATEMENT = "import document_insighter.api_client"
+# dependencies which are loaded by the first request, not by importing the client or constructing it
+LAZY_MODULES = ("requests", "urllib3", "requests_oauthlib", "oauthlib", "polling2", "dataclasses_json",
+                "marshmallow")
+STARTUP = """
+import json, sys
+from document_insighter.api_client import ServiceAccountClient
+from document_insighter.env import Env
+client = ServiceAccountClient(Env.STAGING, client_id="id", client_secret="secret", token_json="{}")
+print(json.dumps(sorted({name.split(".")[0] for name in sys.modules} & set(sys.argv[1:]))))
+"""
+
+
+def import_times(statement):
+    """Return the self and cumulative import time in microseconds of each module imported by the statement."""
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                         capture_output=True, text=True, check=True)
+    times = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def loaded_lazy_modules():
+    res = subprocess.run([sys.executable, "-c", STARTUP, *LAZY_MODULES], capture_output=True, text=True, check=True)
+    return json.loads(res.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", default=10, type=int, help="Number of fresh interpreters")
+    parser.add_argument("--budget-ms", default=None, type=float, help="Fail when the median import time is higher")
+    parser.add_argument("--top", default=10, type=int, help="Number of slowest modules reported")
+    args = parser.parse_args()
+
+    runs = [import_times(STATEMENT) for _ in range(args.runs)]
+    totals = [times["document_insighter.api_client"][1] / 1000 for times in runs]
+    median = statistics.median(totals)
+    print(f"import document_insighter.api_client: median {median:.1f} ms, min {min(totals):.1f} ms, "
+          f"max {max(totals):.1f} ms over {args.runs} runs")
+
+    print(f"\n{'module':<40} {'self ms':>10} {'cumulative ms':>15}")
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{name:<40} {self_us / 1000:>10.1f} {cumulative_us / 1000:>15.1f}")
+
+    failed = False
+    loaded = loaded_lazy_modules()
+    if loaded:
+        print(f"\nloaded before the first request: {', '.join(loaded)}")
+        failed = True
+    if args.budget_ms is not None and median > args.budget_ms:
+        print(f"\nmedian import time {median:.1f} ms exceeds the budget of {args.budget_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark decoding and flattening pages of extractions in one process and in a process pool with map_pages.
+
+    python -m benchmarks.bench_parallel --pages 40 --page-size 100 --processes 4
+"""
+import argparse
+import json
+import os
+import time
+
+from document_insighter.parallel import decode_page, map_pages
+from tests.payloads import make_page
+
+
+def out_of_spec(extractions):
+    """Return the test parameters whose result is above the specification, one tuple per row."""
+    rows = []
+    for extraction in extractions:
+        for section in extraction.sections_by_category.get("coa_batch", []):
+            table = section.table("test_parameters")
+            if table is None:
+                continue
+            names = table.columns["name"].values
+            results = table.columns["result"].values
+            limits = table.columns["specification"].standard_values
+            for name, result, limit in zip(names, results, limits):
+                try:
+                    if float(result) > float(limit):
+                        rows.append((extraction.id, name, result))
+                except (TypeError, ValueError):
+                    pass
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", default=40, type=int, help="Number of pages")
+    parser.add_argument("--page-size", default=100, type=int, help="Extractions in each page")
+    parser.add_argument("--batches", default=3, type=int, help="Batch sections in each extraction")
+    parser.add_argument("--rows", default=12, type=int, help="Rows in each test parameters table")
+    parser.add_argument("--processes", default=os.cpu_count(), type=int, help="Worker processes")
+    args = parser.parse_args()
+
+    pages = [json.dumps(make_page(i * args.page_size, args.page_size, batches=args.batches, rows=args.rows)).encode()
+             for i in range(args.pages)]
+    extractions = args.pages * args.page_size
+
+    start = time.perf_counter()
+    serial = [decode_page(page, out_of_spec) for page in pages]
+    serial_elapsed = time.perf_counter() - start
+    print(f"{'one process':20s} {serial_elapsed * 1000:10.1f} ms  {extractions / serial_elapsed:10.0f} extractions/s")
+
+    start = time.perf_counter()
+    parallel = list(map_pages(pages, out_of_spec, processes=args.processes))
+    elapsed = time.perf_counter() - start
+    assert parallel == serial
+    name = f"{args.processes} processes"
+    print(f"{name:20s} {elapsed * 1000:10.1f} ms  {extractions / elapsed:10.0f} extractions/s")
+    print(f"speedup: {serial_elapsed / elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
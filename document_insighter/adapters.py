@@ -0,0 +1,38 @@
+import random
+from typing import Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from document_insighter.transport import Timeout
+
+
+class JitteredRetry(Retry):
+    """
+    urllib3 Retry with full jitter: the backoff is a random time between 0 and the exponential backoff,
+    capped at backoff_cap seconds, so that clients retrying the same failure do not retry together.
+    """
+
+    backoff_cap = 60
+
+    def new(self, **kwargs):
+        retry = super().new(**kwargs)
+        retry.backoff_cap = self.backoff_cap
+        return retry
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, min(backoff, self.backoff_cap)) if backoff > 0 else 0
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter which uses a default timeout for requests without one."""
+
+    def __init__(self, timeout: Optional[Timeout] = None, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
@@ -1,29 +1,54 @@
+import copy
+import itertools
 import json
 import logging
 import os
-from datetime import datetime
-from typing import Generator, List, Optional
-
-from requests.sessions import merge_setting
-from requests.structures import CaseInsensitiveDict
-from requests_oauthlib import OAuth2Session
-
-from document_insighter.exceptions import ChannelLogExistsError
-from document_insighter.model import EnvType
-import polling2
-
-from document_insighter.helpers import md5_checksum
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Callable, Generator, Iterable, List, Optional, Union
+
+from document_insighter.checkpoint import PaginationCheckpoint
+from document_insighter.exceptions import ChannelLogExistsError, ChannelLogTimeoutError
+from document_insighter.extraction_cache import CacheEntry, cacheable
+from document_insighter.metrics import Instrumentation, PollEvent, RequestEvent, TokenRefreshEvent, endpoint_name
+from document_insighter.env import EnvType
+from document_insighter.multipart import MultipartEncoder
+from document_insighter.poller import ChannelLogPoller
+from document_insighter.results import DuplicateCheck, UploadResult
+from document_insighter.token_manager import TokenManager
+from document_insighter.transport import TransportPolicy
+
+from document_insighter.helpers import date_windows, md5_checksum, put_until_stopped, read_ahead, write_json_atomic
+from document_insighter.streaming import iter_json_array
 
 SEARCH_DATE_FORMAT = "%Y-%m-%d"
 logger = logging.getLogger(__name__)
 
 
 class DocumentInsighter:
-    def __init__(self, env: EnvType, client_id, client_secret, token_filename, token_json, tenant: str):
+    # seconds before the token expires it is refreshed in background
+    TOKEN_REFRESH_MARGIN = 300
+    BACKGROUND_TOKEN_REFRESH = True
+
+    def __init__(
+            self,
+            env: EnvType,
+            client_id,
+            client_secret,
+            token_filename,
+            token_json,
+            tenant: str,
+            transport: Optional[TransportPolicy] = None,
+    ):
         """
         The APIClient for communication with Document Insighter API.
 
         :param tenant: tenant name
+        :param transport: connection pool, timeout and retry policy of the session, TransportPolicy() by default
         :param env used for switch production and staging env
         :param client_id client_id of the okta api client application.
             env variable: INSIGHTER_CLIENT_ID
@@ -37,25 +62,199 @@ class DocumentInsighter:
         self.token_filename = token_filename
         self.token_json = token_json
         self.tenant = tenant
-        self.oauth = None
-        self.default_headers = CaseInsensitiveDict({
+        self.transport = transport or TransportPolicy()
+        # the session is created on first use, see the oauth property
+        self._oauth = None
+        self._session_lock = threading.RLock()
+        self.token_manager = None
+        # the client whose session is shared by this tenant view, None for a client
+        self._root = None
+        self.default_headers = {
             "X-CURRENT-TENANT": tenant,
-        }) if tenant else {}
+        } if tenant else {}
+        # optional FileHashCache, so that unchanged files are not hashed again for duplicate checks
+        self.hash_cache = None
+        # optional DedupIndex, so that md5 checksums which are already known are not checked again
+        self.dedup_index = None
+        # optional ExtractionCache, so that the extractions of completed channel logs are not downloaded again
+        self.extraction_cache = None
+        # listeners of the request, token refresh and polling events, see document_insighter.metrics
+        self.instrumentation = Instrumentation()
+
+    # the caches and instrumentation are read through the client of a tenant view, so that a cache set on the
+    # client after the view was created is shared with the view too
+    @property
+    def hash_cache(self):
+        return (self._root or self)._hash_cache
+
+    @hash_cache.setter
+    def hash_cache(self, cache):
+        (self._root or self)._hash_cache = cache
+
+    @property
+    def extraction_cache(self):
+        return (self._root or self)._extraction_cache
+
+    @extraction_cache.setter
+    def extraction_cache(self, cache):
+        (self._root or self)._extraction_cache = cache
+
+    @property
+    def instrumentation(self) -> Instrumentation:
+        return (self._root or self)._instrumentation
+
+    @instrumentation.setter
+    def instrumentation(self, instrumentation: Instrumentation):
+        (self._root or self)._instrumentation = instrumentation
+
+    @property
+    def oauth(self):
+        """
+        The session of the client. It is created by _create_session on first use, so that constructing a client
+        neither imports requests and requests_oauthlib nor reads the token.
+        """
+        if self._oauth is None and self._root is None:
+            with self._session_lock:
+                if self._oauth is None:
+                    session = self._create_session()
+                    if session is not None:
+                        self._configure_session(session)
+                        self._oauth = session
+        return self._oauth
+
+    @oauth.setter
+    def oauth(self, session):
+        self._oauth = session
+
+    def _create_session(self):
+        """Return a new session of the client, None when the client has no session of its own."""
+        return None
+
+    def _configure_session(self, session=None):
+        """Mount the transport policy, add the default headers and start the token manager of the session."""
+        session = session if session is not None else self._oauth
+        if session:
+            self.transport.mount(session)
+            session.hooks["response"].append(self._instrument_response)
+            if getattr(session, "auto_refresh_url", None):
+                self.token_manager = TokenManager(
+                    self._refresh_access_token,
+                    token_filename=self.token_filename,
+                    token=session.token or None,
+                    refresh_margin=self.TOKEN_REFRESH_MARGIN,
+                    on_update=self._adopt_token,
+                    background=self.BACKGROUND_TOKEN_REFRESH,
+                )
+            self._append_default_headers(session)
+
+    def for_tenant(self, tenant: str) -> "DocumentInsighter":
+        """
+        Return a view of the client for another tenant. The view shares the session, connection pool, token
+        manager, transport policy, hash cache, extraction cache and instrumentation of the client, only the tenant
+        header of its requests differs, so that one client can serve many tenants over warm connections. The
+        caches and instrumentation are read from the client on each use, so setting them on the client or on any
+        of its views changes them for all of them.
 
-    def _append_default_headers(self):
-        if self.oauth:
-            self.oauth.headers = merge_setting(self.oauth.headers, self.default_headers, dict_class=CaseInsensitiveDict)
+        The dedup index is not shared, because a file uploaded to one tenant is not a duplicate in another one.
+
+        :param tenant: tenant name
+        """
+        # the session is created before the view copies it
+        self.oauth
+        view = copy.copy(self)
+        view.tenant = tenant
+        view.default_headers = {"X-CURRENT-TENANT": tenant}
+        view.dedup_index = None
+        view._root = self._root or self
+        return view
+
+    def _headers(self, headers: Optional[dict] = None) -> dict:
+        """Headers of a request. The tenant header is sent with each request, so that tenant views can share the
+        session."""
+        merged = dict(self.default_headers)
+        if headers:
+            merged.update(headers)
+        return merged
+
+    def close(self):
+        """Stop the background token refresh and close the connections of the session. Closing a tenant view
+        does nothing, the session belongs to its client."""
+        if self._root is not None:
+            return
+        if self.token_manager is not None:
+            self.token_manager.close()
+        if self._oauth is not None:
+            self._oauth.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _append_default_headers(self, session):
+        from requests.sessions import merge_setting
+        from requests.structures import CaseInsensitiveDict
+
+        session.headers = merge_setting(session.headers, self.default_headers, dict_class=CaseInsensitiveDict)
+
+    def _complete_token(self, token):
+        if 'access_token' not in token:
+            token['access_token'] = token['id_token']
+            self.oauth.access_token = token['id_token']
+        return token
 
     def _token_saver(self, token):
         if token:
-            id_token = token['id_token']
-            if 'access_token' not in token:
-                token['access_token'] = id_token
-                self.oauth.access_token = id_token
-            if self.token_filename:
-                os.makedirs(os.path.abspath(os.path.dirname(self.token_filename)), exist_ok=True)
-                with open(self.token_filename, "w") as fp:
-                    json.dump(token, fp)
+            token = self._complete_token(token)
+            if self.token_manager is not None:
+                self.token_manager.store(token)
+            elif self.token_filename:
+                write_json_atomic(self.token_filename, token)
+
+    def _instrument_response(self, res, *args, **kwargs):
+        """Response hook of the session, which reports the request to the instrumentation listeners."""
+        if not self.instrumentation.enabled:
+            return
+        elapsed = res.elapsed.total_seconds()
+        if kwargs.get("stream"):
+            received = int(res.headers.get("Content-Length") or 0)
+        else:
+            # the body is read here instead of after the hook, so that its download time is measured
+            start = time.perf_counter()
+            received = len(res.content)
+            elapsed += time.perf_counter() - start
+        retries = getattr(res.raw, "retries", None)
+        self.instrumentation.emit(RequestEvent(
+            endpoint_name(res.url),
+            res.request.method,
+            res.status_code,
+            elapsed,
+            _body_size(res.request.body, res.request.headers),
+            received,
+            len(retries.history) if retries is not None else 0,
+        ))
+
+    def _adopt_token(self, token):
+        self.oauth.token = token
+
+    def _refresh_access_token(self):
+        """Request a new token with the refresh token, like OAuth2Session.request does when the token is expired."""
+        from requests.auth import HTTPBasicAuth
+
+        auth = None
+        if self.client_id and self.client_secret:
+            auth = HTTPBasicAuth(self.client_id, self.client_secret)
+        if not self.instrumentation.enabled:
+            return self._complete_token(self.oauth.refresh_token(self.oauth.auto_refresh_url, auth=auth))
+        start = time.perf_counter()
+        try:
+            token = self.oauth.refresh_token(self.oauth.auto_refresh_url, auth=auth)
+        except Exception as e:
+            self.instrumentation.emit(TokenRefreshEvent(time.perf_counter() - start, error=repr(e)))
+            raise
+        self.instrumentation.emit(TokenRefreshEvent(time.perf_counter() - start))
+        return self._complete_token(token)
 
     def _load_token(self):
         token = None
@@ -69,59 +268,223 @@ class DocumentInsighter:
             token['access_token'] = token['id_token']
         return token
 
-    def upload_document(self, category, file_path, metadata=None, ignore_duplicate=False):
+    def upload_document(
+            self,
+            category,
+            file_path,
+            metadata=None,
+            ignore_duplicate=False,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
+    ):
         """
-        Upload document to Document Insighter.
+        Upload document to Document Insighter. The file is streamed in chunks, it is never held in memory.
 
         :param category: category of the document
         :param file_path: path of the file
         :param metadata: metadata of the document
-        :param ignore_duplicate: ignore duplicate check
+        :param ignore_duplicate: ignore duplicate check. The md5 checksum is then computed while the file is
+            uploaded, and recorded in the dedup index when it is set.
+        :param progress_callback: called with the bytes sent and the total bytes of the request body
         """
         params = {"category": category, 'extracts[]': ['true']}
         files = {
             'fields': (None, json.dumps([metadata or {}]), 'application/json'),
-            'files': (os.path.basename(file_path), open(file_path, 'rb'), 'application/octet-stream')
+            'files': (os.path.basename(file_path), file_path, 'application/octet-stream')
         }
 
+        md5 = None
         if not ignore_duplicate:
-            md5 = md5_checksum(file_path)
-            existing_channel_log_uuids = self.oauth.get(
-                f"{self.env.host}/api/document-channel-logs/md5-checksum/{md5}/uuids",
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-            ).json()
+            md5 = self._md5_checksum(file_path)
+            existing_channel_log_uuids = self.get_channel_log_uuids_by_md5(md5)
             if existing_channel_log_uuids:
                 # TODO: name should be changed to File has been already uploaded
                 raise ChannelLogExistsError(md5, existing_channel_log_uuids)
 
-        res = self.oauth.post(
-            f"{self.env.host}/api/documents/common/upload", files=files, params=params,
+        with MultipartEncoder(files, progress_callback=progress_callback,
+                              compute_md5=md5 is None and self.dedup_index is not None) as body:
+            res = self.oauth.post(
+                f"{self.env.host}/api/documents/common/upload", data=body, params=params,
+                headers=self._headers({"Content-Type": body.content_type}),
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+            )
+        md5 = md5 or body.md5
+        logger.info("Ends upload document.")
+        res.raise_for_status()
+        logs = res.json()
+        log = logs[0] if logs else None
+        if log and md5 and self.dedup_index is not None:
+            self.dedup_index.add(md5, log.get("uuid", log.get("id")))
+        return log
+
+    def _md5_checksum(self, file_path):
+        return self.hash_cache.md5(file_path) if self.hash_cache is not None else md5_checksum(file_path)
+
+    def get_channel_log_uuids_by_md5(self, md5: str) -> List[str]:
+        """
+        Get the uuids of the channel logs which were uploaded with the md5 checksum, from the dedup index
+        when it is set and knows the md5.
+
+        :param md5: md5 checksum of the file
+        :return: channel log uuids, empty when the file was not uploaded
+        """
+        if self.dedup_index is not None:
+            uuids = self.dedup_index.get(md5)
+            if uuids is not None:
+                return uuids
+        res = self.oauth.get(
+            f"{self.env.host}/api/document-channel-logs/md5-checksum/{md5}/uuids",
+            headers=self._headers(),
             client_id=self.client_id,
             client_secret=self.client_secret,
         )
-        logger.info("Ends upload document.")
         res.raise_for_status()
-        logs = res.json()
-        return logs[0] if logs else None
+        uuids = res.json() or []
+        if self.dedup_index is not None:
+            self.dedup_index.put(md5, uuids)
+        return uuids
+
+    def check_duplicates(self, file_paths: Iterable[str], max_workers: int = 4) -> List[DuplicateCheck]:
+        """
+        Check a batch of files for duplicates before uploading them.
+
+        Every file is hashed, since the server is asked about md5 checksums, and files with the same md5 checksum
+        are the duplicates inside the batch. The server is asked about each distinct md5 checksum once, and only
+        when the dedup index does not resolve it.
 
-    def upload_and_poll(self, category: str, file_path: str, metadata: dict = None, timeout=600):
+        :param file_paths: paths of the files
+        :param max_workers: number of threads hashing files and sending duplicate checks
+        :return: duplicate check of each file, in the order of file_paths
+        """
+        file_paths = list(file_paths)
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            md5s = dict(zip(file_paths, executor.map(self._md5_checksum, file_paths)))
+
+            first_of = {}
+            for file_path in file_paths:
+                first_of.setdefault(md5s[file_path], file_path)
+
+            unique_md5s = list(dict.fromkeys(md5s[file_path] for file_path in file_paths))
+            uuids = dict(zip(unique_md5s, executor.map(self.get_channel_log_uuids_by_md5, unique_md5s)))
+
+        return [
+            DuplicateCheck(
+                file_path,
+                md5s[file_path],
+                uuids[md5s[file_path]],
+                first_of[md5s[file_path]] if first_of[md5s[file_path]] != file_path else None,
+            )
+            for file_path in file_paths
+        ]
+
+    def upload_documents(
+            self,
+            category: str,
+            file_paths: Iterable[str],
+            metadata_fn: Optional[Callable[[str], dict]] = None,
+            ignore_duplicate: bool = False,
+            max_workers: int = 8,
+            max_in_flight: Optional[int] = None,
+    ) -> Generator[UploadResult, None, None]:
+        """
+        Upload many documents concurrently, the duplicate check and upload of each file run in a thread pool
+        which shares the connection pool of the session.
+
+        :param category: category of the documents
+        :param file_paths: paths of the files, consumed lazily
+        :param metadata_fn: function which returns the metadata of a file path
+        :param ignore_duplicate: ignore duplicate check
+        :param max_workers: number of worker threads
+        :param max_in_flight: max number of files submitted but not yet yielded, defaults to max_workers
+        :returns upload results in generator, in the order the files finish.
+            Errors of metadata_fn, ChannelLogExistsError and HTTP failures are reported in UploadResult.error
+            instead of raised.
+        """
+        from requests.exceptions import RequestException
+
+        max_in_flight = max(max_in_flight or max_workers, 1)
+        self._ensure_pool_size(max_workers)
+
+        def upload(file_path):
+            try:
+                metadata = metadata_fn(file_path) if metadata_fn else None
+            except Exception as e:
+                logger.warning("Failed to get the metadata of %s: %s", file_path, e)
+                return UploadResult(file_path, error=e)
+            try:
+                log = self.upload_document(category, file_path, metadata, ignore_duplicate=ignore_duplicate)
+            except (ChannelLogExistsError, RequestException, OSError) as e:
+                logger.warning("Failed to upload %s: %s", file_path, e)
+                return UploadResult(file_path, error=e)
+            return UploadResult(file_path, channel_log=log)
+
+        paths = iter(file_paths)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = set()
+            try:
+                while True:
+                    for file_path in paths:
+                        in_flight.add(executor.submit(upload, file_path))
+                        if len(in_flight) >= max_in_flight:
+                            break
+                    if not in_flight:
+                        return
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+    def _ensure_pool_size(self, size: int):
+        """Mount an adapter with at least `size` connections per host, so that worker threads do not
+        discard connections when the pool is full."""
+        adapter = self.oauth.get_adapter(self.env.host)
+        if getattr(adapter, "_pool_maxsize", size) < size:
+            self.oauth.mount(self.env.host, self.transport.with_pool_size(size).adapter())
+
+    def upload_and_poll(
+            self,
+            category: str,
+            file_path: str,
+            metadata: dict = None,
+            timeout=600,
+            poller: Optional[ChannelLogPoller] = None,
+    ):
         """
         Upload a document and poll the extractions until it is completed or failed.
 
         :param category: extraction category
         :param file_path: local file path
         :param metadata: file metadata and channel log metadata
-        :param timeout: request timeout
+        :param timeout: seconds to wait for the channel log, ChannelLogTimeoutError is raised after them
+        :param poller: shared ChannelLogPoller, when it is given the channel log is polled by the poller
+            instead of a polling loop in this thread
         :return: extraction list
         """
         log = self.upload_document(category, file_path, metadata)
         log_id = log.get("id")
         logger.info("Starts polling extractions.")
-        polling2.poll(target=lambda: self.get_channel_log_status(log_id).get("status") in ['COMPLETED', 'FAILED'],
-                      step=1,
-                      timeout=timeout)
-        extractions = self.get_channel_extractions_exporting(log_id)
+        if poller is not None:
+            extractions = poller.submit(log_id, timeout=timeout).result()
+            logger.info("Ends polling extractions.")
+            return extractions
+        start = time.perf_counter()
+        statuses = []
+
+        def completed():
+            statuses.append(self.get_channel_log_status(log_id).get("status"))
+            return statuses[-1] in ['COMPLETED', 'FAILED']
+
+        import polling2
+
+        try:
+            polling2.poll(target=completed, step=1, timeout=timeout)
+        except polling2.TimeoutException as e:
+            raise ChannelLogTimeoutError(log_id, timeout, statuses[-1] if statuses else None) from e
+        if self.instrumentation.enabled:
+            self.instrumentation.emit(PollEvent(log_id, len(statuses), time.perf_counter() - start, statuses[-1]))
+        extractions = self.get_channel_extractions_exporting(log_id, statuses[-1])
         logger.info("Ends polling extractions.")
         return extractions
 
@@ -134,26 +497,49 @@ class DocumentInsighter:
         """
         res = self.oauth.get(
             f"{self.env.host}/api/document-channel-logs/{channel_log_id}/status",
+            headers=self._headers(),
             client_id=self.client_id,
             client_secret=self.client_secret,
         )
         res.raise_for_status()
         return res.json()
 
-    def get_channel_extractions_exporting(self, channel_log_id):
+    def get_channel_extractions_exporting(self, channel_log_id, status: Optional[str] = None):
         """
-        Get channel extractions, one document may have multiple extractions
+        Get channel extractions, one document may have multiple extractions. They are served from the
+        extraction cache when it is set and has them.
 
         :param channel_log_id: channel log id
+        :param status: status of the channel log seen by the caller, the extractions are only cached when it
+            is COMPLETED
         :return: extractions
         """
+        entry = self._cached_extractions(channel_log_id)
+        if entry is not None and self.extraction_cache.servable(entry):
+            return json.loads(entry.body)
         res = self.oauth.get(
             f"{self.env.host}/api/extraction-exporting/document-channel-logs/{channel_log_id}/extractions",
+            headers=self._headers({"If-None-Match": entry.etag} if entry is not None else None),
             client_id=self.client_id,
             client_secret=self.client_secret,
         )
+        if res.status_code == 304 and entry is not None:
+            self.extraction_cache.touch(self.tenant, channel_log_id)
+            return json.loads(entry.body)
         res.raise_for_status()
-        return res.json()
+        extractions = res.json()
+        self._cache_extractions(channel_log_id, extractions, res.content, res.headers.get("ETag"), status)
+        return extractions
+
+    def _cached_extractions(self, channel_log_id) -> Optional[CacheEntry]:
+        if self.extraction_cache is None:
+            return None
+        return self.extraction_cache.get(self.tenant, channel_log_id)
+
+    def _cache_extractions(self, channel_log_id, extractions, body: bytes, etag: Optional[str],
+                           status: Optional[str] = None):
+        if self.extraction_cache is not None and cacheable(extractions, status):
+            self.extraction_cache.put(self.tenant, channel_log_id, body, etag)
 
     def query_extractions_pages(
             self,
@@ -161,17 +547,129 @@ class DocumentInsighter:
             start_date: datetime,
             end_date: datetime,
             page_size: int = 50,
-            tags: List[str] = None
+            tags: List[str] = None,
+            prefetch: int = 0,
+            checkpoint: Optional[str] = None,
+            resume_from: Optional[str] = None,
+            checkpoint_every: int = 1,
+            raw: bool = False,
     ) -> Generator:
         """Query extraction pages by dates
 
+        With a checkpoint file, the cursor of the query and the number of extractions delivered are saved as the
+        pages are consumed. A page counts as delivered when the consumer asks for the next one, so a consumer
+        which crashes while it processes a page gets that page again when the query is resumed, and never the
+        pages before it. The checkpoint is written after each page and flushed to disk every `checkpoint_every`
+        pages, so only a power failure can lose the last saves and deliver up to `checkpoint_every` pages again.
+
         :param category: extraction category, like NB_COA
         :param start_date: filter extraction processed after this date,
             start date is inclusive.
         :param end_date: filter extraction processed after this date, exclusive
         :param page_size: number of extraction in each page
+        :param tags: filter extractions which include any of the tags
+        :param prefetch: number of pages fetched in background ahead of the consumer, 0 disables read-ahead
+        :param checkpoint: path of the json file the position of the query is saved to
+        :param resume_from: path of a checkpoint file to continue the same query from, the checkpoint is then
+            saved to it too unless `checkpoint` is given. Nothing is yielded when the query was completed.
+        :param checkpoint_every: number of pages between two fsyncs of the checkpoint, the last page is always
+            flushed
+        :param raw: yield the json bytes of each page instead of parsing it, to parse it in another process,
+            see document_insighter.parallel.map_pages. It cannot be checkpointed.
         :returns pages in generator. each page is a list of extraction
         """
+        if checkpoint is None and resume_from is None:
+            pages = self._query_extractions_pages(category, start_date, end_date, page_size, tags, raw=raw)
+            return read_ahead(pages, prefetch) if prefetch > 0 else pages
+        if raw:
+            raise ValueError("Raw pages cannot be checkpointed, the extractions they deliver are not counted.")
+
+        state = self._load_checkpoint(category, start_date, end_date, page_size, tags, resume_from)
+        checkpoint = checkpoint or resume_from
+        if state.done:
+            return iter(())
+        pages = self._query_extractions_pages(category, start_date, end_date, page_size, tags,
+                                              start_url=state.next_url, with_cursor=True)
+        pages = read_ahead(pages, prefetch) if prefetch > 0 else pages
+        return self._checkpointed_pages(pages, state, checkpoint, max(checkpoint_every, 1))
+
+    @staticmethod
+    def _load_checkpoint(category, start_date, end_date, page_size, tags, resume_from) -> PaginationCheckpoint:
+        """Return the checkpoint to resume the query from, a new one when there is nothing to resume."""
+        query = {
+            "category": category,
+            "startDate": start_date.strftime(SEARCH_DATE_FORMAT),
+            "endDate": end_date.strftime(SEARCH_DATE_FORMAT),
+            "size": page_size,
+            "tags": list(tags or []),
+        }
+        if resume_from is None or not os.path.exists(resume_from):
+            return PaginationCheckpoint(query)
+        state = PaginationCheckpoint.load(resume_from)
+        if state.query != query:
+            raise ValueError(f"Checkpoint {resume_from} is of another query: {state.query}")
+        logger.info("Resuming the query after %s pages and %s extractions.", state.pages, state.delivered)
+        return state
+
+    @staticmethod
+    def _checkpointed_pages(pages, state: PaginationCheckpoint, checkpoint: str, checkpoint_every: int):
+        # the checkpoint is saved here, on the consumer side of the read-ahead, once the consumer asks for the
+        # next page
+        for page, next_url in pages:
+            yield page
+            state.advance(next_url, len(page))
+            state.save(checkpoint, fsync=state.done or state.pages % checkpoint_every == 0)
+
+    def _query_extractions_pages(self, category, start_date, end_date, page_size, tags, start_url=None,
+                                 with_cursor=False, raw=False):
+        for res in self._extractions_responses(category, start_date, end_date, page_size, tags,
+                                               start_url=start_url):
+            page = res.content if raw else res.json()
+            yield (page, self._next_url(res)) if with_cursor else page
+
+    def query_extractions(
+            self,
+            category: str,
+            start_date: datetime,
+            end_date: datetime,
+            page_size: int = 500,
+            tags: List[str] = None,
+            decode: bool = False,
+            chunk_size: int = 64 * 1024,
+    ) -> Generator:
+        """Query extractions by dates, one extraction at a time.
+
+        Each page is parsed incrementally while it is downloaded, so the memory used is about one extraction
+        instead of one page, and large pages can be used to save round trips.
+
+        :param category: extraction category, like NB_COA
+        :param start_date: filter extraction processed after this date,
+            start date is inclusive.
+        :param end_date: filter extraction processed after this date, exclusive
+        :param page_size: number of extraction in each page
+        :param tags: filter extractions which include any of the tags
+        :param decode: yield Extraction objects instead of dicts
+        :param chunk_size: bytes read from the socket at a time
+        :returns extractions in generator
+        """
+        decode_extraction = None
+        if decode:
+            from document_insighter.codec import decoder
+            from document_insighter.model import Extraction
+
+            decode_extraction = decoder(Extraction)
+        for res in self._extractions_responses(category, start_date, end_date, page_size, tags, stream=True):
+            with res:
+                for extraction in iter_json_array(res.iter_content(chunk_size=chunk_size)):
+                    yield decode_extraction(extraction) if decode_extraction else extraction
+
+    def _extractions_responses(self, category, start_date, end_date, page_size, tags, stream=False, start_url=None):
+        """Request the extraction pages one after another, following the next links from start_url when it is
+        given, or from the first page.
+
+        Failed requests are retried by the transport policy, so a retry resumes at the failed page instead of
+        restarting the query.
+        """
         params = {
             "category": category,
             "startDate": start_date.strftime(SEARCH_DATE_FORMAT),
@@ -183,23 +681,169 @@ class DocumentInsighter:
         if tags:
             params["tags"] = tags or []
 
-        res = self.oauth.get(
-            f"{self.env.host}/api/extraction-exporting/extractions",
-            params=params,
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-        )
-        res.raise_for_status()
-        yield res.json()
-
-        while res.links.get("next") is not None:
-            res = self.oauth.get(
-                res.links.get("next").get("url").replace("http://", "https://"),
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-            )
+        # only pass stream when it is set, the session passes unknown keywords on to token refreshes
+        kwargs = {"stream": True} if stream else {}
+        url = f"{self.env.host}/api/extraction-exporting/extractions"
+        if start_url is not None:
+            url, params = start_url, None
+        while url is not None:
+            res = self._get_page(url, params, **kwargs)
             res.raise_for_status()
-            yield res.json()
+            yield res
+
+            params = None
+            url = self._next_url(res)
+
+    def _next_url(self, res) -> Optional[str]:
+        """Return the url of the next page, the api returns http links behind its https proxy."""
+        next_link = res.links.get("next")
+        if next_link is None:
+            return None
+        url = next_link.get("url")
+        return url.replace("http://", "https://") if self.env.host.startswith("https://") else url
+
+    def _get_page(self, url, params, **kwargs):
+        from requests.exceptions import ChunkedEncodingError
+
+        # the body of a page is read after the adapter returns, a connection broken while reading it is not
+        # retried by the adapter, so the page is requested again here
+        attempt = 0
+        while True:
+            try:
+                return self.oauth.get(
+                    url,
+                    params=params,
+                    headers=self._headers(),
+                    client_id=self.client_id,
+                    client_secret=self.client_secret,
+                    **kwargs,
+                )
+            except ChunkedEncodingError:
+                attempt += 1
+                if kwargs.get("stream") or attempt > self.transport.max_retries:
+                    raise
+                logger.warning("Page %s was interrupted, retrying (%s).", url, attempt)
+                time.sleep(self.transport.backoff(attempt))
+
+    def query_extractions_pages_sharded(
+            self,
+            category: str,
+            start_date: datetime,
+            end_date: datetime,
+            page_size: int = 50,
+            tags: List[str] = None,
+            shard: Union[str, timedelta] = "day",
+            max_workers: int = 4,
+            ordered: bool = True,
+    ) -> Generator:
+        """Query extraction pages by dates, the date range is split into shards which are paginated concurrently.
+
+        :param category: extraction category, like NB_COA
+        :param start_date: filter extraction processed after this date,
+            start date is inclusive.
+        :param end_date: filter extraction processed after this date, exclusive
+        :param page_size: number of extraction in each page
+        :param tags: filter extractions which include any of the tags
+        :param shard: size of each date window, "day", "week" or a timedelta of whole days
+        :param max_workers: number of shards paginated at the same time
+        :param ordered: yield pages in date window order then page order. When it is False, pages are yielded
+            as soon as they are downloaded, which is faster but the order is not deterministic.
+        :returns pages in generator. each page is a list of extraction
+        """
+        windows = date_windows(start_date, end_date, shard)
+        max_workers = max(min(max_workers, len(windows)), 1)
+        self._ensure_pool_size(max_workers)
+
+        def fetch_window(window):
+            return self.query_extractions_pages(category, window[0], window[1], page_size=page_size, tags=tags)
+
+        if ordered:
+            yield from self._ordered_shards(windows, fetch_window, max_workers)
+        else:
+            yield from self._unordered_shards(windows, fetch_window, max_workers)
+
+    @staticmethod
+    def _ordered_shards(windows, fetch_window, max_workers):
+        # the pages of each shard are streamed through a small queue of their own, only max_workers shards are
+        # paginated ahead of the consumer
+        stopped = threading.Event()
+        done = object()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            futures = []
+
+            def start(window):
+                pages = queue.Queue(maxsize=2)
+                futures.append(executor.submit(_fetch_shard, fetch_window, window, pages, stopped, done))
+                pending.append(pages)
+
+            for window in windows[:max_workers]:
+                start(window)
+            next_windows = iter(windows[max_workers:])
+            try:
+                while pending:
+                    item = pending[0].get()
+                    if item is done:
+                        pending.popleft()
+                        for window in itertools.islice(next_windows, 1):
+                            start(window)
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield item
+            finally:
+                # the workers stop at their next page, the executor then only waits for the requests in flight
+                stopped.set()
+                for future in futures:
+                    future.cancel()
+
+    @staticmethod
+    def _unordered_shards(windows, fetch_window, max_workers):
+        pages = queue.Queue(maxsize=max_workers * 2)
+        stopped = threading.Event()
+        done = object()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_fetch_shard, fetch_window, window, pages, stopped, done) for window in windows]
+            remaining = len(windows)
+            try:
+                while remaining:
+                    item = pages.get()
+                    if item is done:
+                        remaining -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield item
+            finally:
+                stopped.set()
+                for future in futures:
+                    future.cancel()
+
+
+def _fetch_shard(fetch_window, window, pages: queue.Queue, stopped: threading.Event, done):
+    """Put the pages of a shard in the queue, then `done`, or the exception which stopped the shard."""
+    window_pages = iter(())
+    try:
+        window_pages = fetch_window(window)
+        for page in window_pages:
+            if not put_until_stopped(pages, page, stopped):
+                return
+    except Exception as e:
+        put_until_stopped(pages, e, stopped)
+        return
+    finally:
+        if hasattr(window_pages, "close"):
+            window_pages.close()
+    put_until_stopped(pages, done, stopped)
+
+
+def _body_size(body, headers) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, str)) or hasattr(body, "__len__"):
+        return len(body)
+    return int(headers.get("Content-Length") or 0)
 
 
 class ServiceAccountClient(DocumentInsighter):
@@ -210,7 +854,7 @@ class ServiceAccountClient(DocumentInsighter):
 
     def _load_token(self):
         if self.token_json:
-            return self.token_json
+            return json.loads(self.token_json)
         if self.token_filename:
             with open(self.token_filename) as f:
                 return json.load(f)
@@ -223,6 +867,7 @@ class ServiceAccountClient(DocumentInsighter):
             token_filename: Optional[str] = None,
             token_json: Optional[str] = None,
             tenant: Optional[str] = None,
+            transport: Optional[TransportPolicy] = None,
     ):
         """
         The APIClient for communication with Document Insighter API.
@@ -233,6 +878,7 @@ class ServiceAccountClient(DocumentInsighter):
         :param token_filename name of file which used to store token json.
             env variable: INSIGHTER_CLIENT_TOKEN_PATH. init token can be passed
             with env variable INSIGHTER_CLIENT_TOKEN_JSON
+        :param transport: connection pool, timeout and retry policy of the session
         """
         client_id = client_id or os.getenv("INSIGHTER_SA_CLIENT_ID")
         client_secret = client_secret or os.getenv("INSIGHTER_SA_CLIENT_SECRET")
@@ -240,9 +886,12 @@ class ServiceAccountClient(DocumentInsighter):
         token_json = token_json or os.getenv("INSIGHTER_SA_CLIENT_TOKEN_JSON")
         tenant = tenant or os.getenv("INSIGHTER_TENANT")
 
-        super().__init__(env, client_id, client_secret, token_filename, token_json, tenant)
+        super().__init__(env, client_id, client_secret, token_filename, token_json, tenant, transport)
 
-        self.oauth = OAuth2Session(
+    def _create_session(self):
+        from requests_oauthlib import OAuth2Session
+
+        return OAuth2Session(
             self.client_id,
             token=self._load_token(),
             # scope=["openid", "profile", "offline_access"],
@@ -250,7 +899,6 @@ class ServiceAccountClient(DocumentInsighter):
             auto_refresh_url=self.env.service_account_token_url,
             token_updater=self._token_saver,
         )
-        self._append_default_headers()
 
     def fetch_token(self, force_fetch: bool = False):
         """
@@ -282,6 +930,7 @@ class OktaApplicationClient(DocumentInsighter):
             token_filename: Optional[str] = None,
             token_json: Optional[str] = None,
             tenant: Optional[str] = None,
+            transport: Optional[TransportPolicy] = None,
     ):
         """
         The APIClient for communication with Document Insighter API.
@@ -297,6 +946,7 @@ class OktaApplicationClient(DocumentInsighter):
         :param token_filename name of file which used to store token json.
             env variable: INSIGHTER_CLIENT_TOKEN_PATH. init token can be passed
             with env variable INSIGHTER_CLIENT_TOKEN_JSON
+        :param transport: connection pool, timeout and retry policy of the session
         """
         idp_id = idp_id or os.getenv("INSIGHTER_CLIENT_IDP")
         client_id = client_id or os.getenv("INSIGHTER_CLIENT_ID")
@@ -304,9 +954,13 @@ class OktaApplicationClient(DocumentInsighter):
         token_filename = token_filename or os.getenv("INSIGHTER_CLIENT_TOKEN_PATH")
         token_json = token_json or os.getenv("INSIGHTER_CLIENT_TOKEN_JSON")
         tenant = tenant or os.getenv("INSIGHTER_TENANT")
-        super().__init__(env, client_id, client_secret, token_filename, token_json, tenant)
+        super().__init__(env, client_id, client_secret, token_filename, token_json, tenant, transport)
         self.idp_id = idp_id
-        self.oauth = OAuth2Session(
+
+    def _create_session(self):
+        from requests_oauthlib import OAuth2Session
+
+        return OAuth2Session(
             self.client_id,
             token=self._load_token(),
             scope=["openid", "profile", "offline_access"],
@@ -314,7 +968,6 @@ class OktaApplicationClient(DocumentInsighter):
             auto_refresh_url=self.TOKEN_URL,
             token_updater=self._token_saver,
         )
-        self._append_default_headers()
 
     def fetch_token(self, force_fetch: bool = False):
         """
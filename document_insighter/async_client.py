@@ -0,0 +1,649 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import AsyncGenerator, Callable, Iterable, List, Optional, Union
+
+from document_insighter.api_client import (
+    SEARCH_DATE_FORMAT,
+    DocumentInsighter,
+    OktaApplicationClient,
+    ServiceAccountClient,
+)
+from document_insighter.exceptions import ChannelLogExistsError, ChannelLogTimeoutError
+from document_insighter.helpers import date_windows
+from document_insighter.metrics import PollEvent, RequestEvent, endpoint_name
+from document_insighter.multipart import UPLOAD_CHUNK_SIZE, MultipartEncoder
+from document_insighter.results import DuplicateCheck, UploadResult
+from document_insighter.streaming import JsonArrayParser
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# refresh the token a little before it expires, so that it does not expire in flight
+TOKEN_EXPIRY_MARGIN = 10
+
+
+class AsyncDocumentInsighter(DocumentInsighter):
+    """
+    The asyncio APIClient for communication with Document Insighter API.
+
+    It keeps the OAuth2 session of the sync client for token storage and refresh, and sends the api requests
+    with a shared httpx.AsyncClient, so that many uploads and polls can be in flight on one event loop.
+    Timeouts and retries follow the transport policy of the client. The session is created and the token is
+    refreshed in the default executor, so that reading and writing the token file does not block the event loop.
+    Use AsyncServiceAccountClient or AsyncOktaApplicationClient to create it.
+    """
+
+    _http = None
+    _token_lock = None
+
+    def _client(self) -> "httpx.AsyncClient":
+        if self._root is not None:
+            # tenant views share the connection pool of their client
+            return self._root._client()
+        if httpx is None:
+            raise ImportError(
+                "httpx is required for the async client, install it with `pip install document-insighter[async]`"
+            )
+        if self._http is None:
+            policy = self.transport
+            timeout = policy.timeout
+            if isinstance(timeout, tuple):
+                timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+            # like the pool of the sync session, pool_maxsize connections are kept alive, and more connections
+            # are only opened when the pool does not block
+            self._http = httpx.AsyncClient(
+                headers=dict(self.default_headers),
+                limits=httpx.Limits(max_connections=policy.pool_maxsize if policy.pool_block else None,
+                                    max_keepalive_connections=policy.pool_maxsize if policy.keep_alive else 0),
+                timeout=timeout,
+            )
+        return self._http
+
+    async def aclose(self):
+        if self._root is None and self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def _session(self):
+        """Return the session, it is created out of the event loop because it reads the token file."""
+        if self._oauth is None and self._root is None:
+            await asyncio.get_running_loop().run_in_executor(None, lambda: self.oauth)
+        return self.oauth
+
+    def _refresh_token(self):
+        """Refresh the token through the token manager, which adopts a token refreshed by another process."""
+        if self.token_manager is not None:
+            return self.token_manager.refresh()
+        token = self._refresh_access_token()
+        if self.oauth.token_updater:
+            self.oauth.token_updater(token)
+        return token
+
+    async def _authorization_headers(self):
+        root = self._root or self
+        if root._token_lock is None:
+            root._token_lock = asyncio.Lock()
+        async with root._token_lock:
+            oauth = await self._session()
+            token = oauth.token or {}
+            expires_at = token.get("expires_at")
+            if expires_at and float(expires_at) - TOKEN_EXPIRY_MARGIN < time.time() and oauth.auto_refresh_url:
+                logger.debug("Token is expired, refreshing at %s.", oauth.auto_refresh_url)
+                # the refresh is a blocking requests call which writes the token file, run it out of the event loop
+                await asyncio.get_running_loop().run_in_executor(None, self._refresh_token)
+        if not oauth.access_token:
+            return {}
+        return {"Authorization": f"Bearer {oauth.access_token}"}
+
+    async def _request(self, method: str, url: str, stream: bool = False, **kwargs) -> "httpx.Response":
+        """Send a request, retrying transport errors and retryable statuses of the allowed methods.
+
+        With stream, the body of the response is not read, the caller reads it and closes the response.
+        """
+        policy = self.transport
+        retryable = method.upper() in policy.allowed_methods
+        extra_headers = kwargs.pop("headers", None) or {}
+        # raises ImportError when httpx is not installed, before httpx.TransportError is needed
+        client = self._client()
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            headers = await self._authorization_headers()
+            headers.update(self.default_headers)
+            headers.update(extra_headers)
+            delay = None
+            try:
+                res = await client.send(client.build_request(method, url, headers=headers, **kwargs), stream=stream)
+            except httpx.TransportError as e:
+                if not retryable or attempt >= policy.max_retries:
+                    self._instrument(method, url, None, start, headers, attempt, error=repr(e))
+                    raise
+            else:
+                if not retryable or res.status_code not in policy.status_forcelist or attempt >= policy.max_retries:
+                    self._instrument(method, url, res, start, headers, attempt)
+                    return res
+                delay = policy.retry_after(res.headers)
+                await res.aclose()
+            attempt += 1
+            delay = policy.backoff(attempt) if delay is None else delay
+            logger.debug("Retrying %s %s in %.2fs (%s).", method, url, delay, attempt)
+            await asyncio.sleep(delay)
+
+    def _instrument(self, method, url, res, start, headers, retries, error=None):
+        if not self.instrumentation.enabled:
+            return
+        self.instrumentation.emit(RequestEvent(
+            endpoint_name(url),
+            method,
+            res.status_code if res is not None else None,
+            time.perf_counter() - start,
+            # httpx sets the Content-Length of bodies in memory, streamed uploads set it themselves
+            int((res.request.headers if res is not None else headers).get("Content-Length") or 0),
+            # the body of a streamed response is not read yet
+            (len(res.content) if res.is_stream_consumed else int(res.headers.get("Content-Length") or 0))
+            if res is not None else 0,
+            retries,
+            error,
+        ))
+
+    async def upload_document(
+            self,
+            category,
+            file_path,
+            metadata=None,
+            ignore_duplicate=False,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
+    ):
+        """
+        Upload document to Document Insighter. The file is streamed in chunks, it is never held in memory.
+
+        :param category: category of the document
+        :param file_path: path of the file
+        :param metadata: metadata of the document
+        :param ignore_duplicate: ignore duplicate check
+        :param progress_callback: called with the bytes sent and the total bytes of the request body
+        """
+        loop = asyncio.get_running_loop()
+        params = {"category": category, 'extracts[]': ['true']}
+
+        md5 = None
+        if not ignore_duplicate:
+            md5 = await loop.run_in_executor(None, self._md5_checksum, file_path)
+            existing_channel_log_uuids = await self.get_channel_log_uuids_by_md5(md5)
+            if existing_channel_log_uuids:
+                raise ChannelLogExistsError(md5, existing_channel_log_uuids)
+
+        files = {
+            'fields': (None, json.dumps([metadata or {}]), 'application/json'),
+            'files': (os.path.basename(file_path), file_path, 'application/octet-stream')
+        }
+        with MultipartEncoder(files, progress_callback=progress_callback,
+                              compute_md5=md5 is None and self.dedup_index is not None) as body:
+            async def stream():
+                # the file is read out of the event loop
+                while True:
+                    chunk = await loop.run_in_executor(None, body.read, UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+
+            res = await self._request(
+                "POST", f"{self.env.host}/api/documents/common/upload", content=stream(), params=params,
+                headers={"Content-Type": body.content_type, "Content-Length": str(len(body))},
+            )
+        md5 = md5 or body.md5
+        logger.info("Ends upload document.")
+        res.raise_for_status()
+        logs = res.json()
+        log = logs[0] if logs else None
+        if log and md5 and self.dedup_index is not None:
+            self.dedup_index.add(md5, log.get("uuid", log.get("id")))
+        return log
+
+    async def get_channel_log_uuids_by_md5(self, md5: str) -> List[str]:
+        """
+        Get the uuids of the channel logs which were uploaded with the md5 checksum, from the dedup index
+        when it is set and knows the md5.
+
+        :param md5: md5 checksum of the file
+        :return: channel log uuids, empty when the file was not uploaded
+        """
+        if self.dedup_index is not None:
+            uuids = self.dedup_index.get(md5)
+            if uuids is not None:
+                return uuids
+        res = await self._request("GET", f"{self.env.host}/api/document-channel-logs/md5-checksum/{md5}/uuids")
+        res.raise_for_status()
+        uuids = res.json() or []
+        if self.dedup_index is not None:
+            self.dedup_index.put(md5, uuids)
+        return uuids
+
+    async def check_duplicates(self, file_paths: Iterable[str], max_workers: int = 4) -> List[DuplicateCheck]:
+        """
+        Check a batch of files for duplicates before uploading them, like DocumentInsighter.check_duplicates.
+
+        :param file_paths: paths of the files
+        :param max_workers: max number of duplicate checks sent at the same time
+        :return: duplicate check of each file, in the order of file_paths
+        """
+        loop = asyncio.get_running_loop()
+        file_paths = list(file_paths)
+        md5s = await asyncio.gather(*(loop.run_in_executor(None, self._md5_checksum, x) for x in file_paths))
+        md5s = dict(zip(file_paths, md5s))
+
+        first_of = {}
+        for file_path in file_paths:
+            first_of.setdefault(md5s[file_path], file_path)
+
+        semaphore = asyncio.Semaphore(max(max_workers, 1))
+
+        async def check(md5):
+            async with semaphore:
+                return await self.get_channel_log_uuids_by_md5(md5)
+
+        unique_md5s = list(dict.fromkeys(md5s.values()))
+        uuids = dict(zip(unique_md5s, await asyncio.gather(*(check(md5) for md5 in unique_md5s))))
+        results = []
+        for file_path in file_paths:
+            first = first_of[md5s[file_path]]
+            results.append(DuplicateCheck(file_path, md5s[file_path], uuids[md5s[file_path]],
+                                          first if first != file_path else None))
+        return results
+
+    async def upload_documents(
+            self,
+            category: str,
+            file_paths: Iterable[str],
+            metadata_fn: Optional[Callable[[str], dict]] = None,
+            ignore_duplicate: bool = False,
+            max_in_flight: int = 8,
+    ) -> AsyncGenerator[UploadResult, None]:
+        """
+        Upload many documents concurrently on the event loop.
+
+        :param category: category of the documents
+        :param file_paths: paths of the files, consumed lazily
+        :param metadata_fn: function which returns the metadata of a file path
+        :param ignore_duplicate: ignore duplicate check
+        :param max_in_flight: max number of files uploading at the same time
+        :returns upload results in async generator, in the order the files finish.
+            Errors of metadata_fn, ChannelLogExistsError and HTTP failures are reported in UploadResult.error
+            instead of raised.
+        """
+        async def upload(file_path):
+            try:
+                metadata = metadata_fn(file_path) if metadata_fn else None
+            except Exception as e:
+                logger.warning("Failed to get the metadata of %s: %s", file_path, e)
+                return UploadResult(file_path, error=e)
+            try:
+                log = await self.upload_document(category, file_path, metadata, ignore_duplicate=ignore_duplicate)
+            except (ChannelLogExistsError, httpx.HTTPError, OSError) as e:
+                logger.warning("Failed to upload %s: %s", file_path, e)
+                return UploadResult(file_path, error=e)
+            return UploadResult(file_path, channel_log=log)
+
+        paths = iter(file_paths)
+        in_flight = set()
+        try:
+            while True:
+                for file_path in paths:
+                    in_flight.add(asyncio.ensure_future(upload(file_path)))
+                    if len(in_flight) >= max(max_in_flight, 1):
+                        break
+                if not in_flight:
+                    return
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def upload_and_poll(self, category: str, file_path: str, metadata: dict = None, timeout=600, step=1,
+                              poller=None):
+        """
+        Upload a document and poll the extractions until it is completed or failed.
+
+        :param category: extraction category
+        :param file_path: local file path
+        :param metadata: file metadata and channel log metadata
+        :param timeout: seconds to wait for the channel log, ChannelLogTimeoutError is raised after them
+        :param step: seconds between two status requests
+        :param poller: not supported, the channel log is polled on the event loop. ChannelLogPoller polls with
+            the sync client in its own thread.
+        :return: extraction list
+        """
+        if poller is not None:
+            raise ValueError("The async client polls on the event loop, ChannelLogPoller only works with the "
+                             "sync client.")
+        log = await self.upload_document(category, file_path, metadata)
+        log_id = log.get("id")
+        logger.info("Starts polling extractions.")
+        start = time.monotonic()
+        deadline = start + timeout
+        iterations = 0
+        while True:
+            iterations += 1
+            status = (await self.get_channel_log_status(log_id)).get("status")
+            if status in ['COMPLETED', 'FAILED']:
+                if self.instrumentation.enabled:
+                    self.instrumentation.emit(PollEvent(log_id, iterations, time.monotonic() - start, status))
+                break
+            if time.monotonic() + step > deadline:
+                raise ChannelLogTimeoutError(log_id, timeout, status)
+            await asyncio.sleep(step)
+        extractions = await self.get_channel_extractions_exporting(log_id, status)
+        logger.info("Ends polling extractions.")
+        return extractions
+
+    async def get_channel_log_status(self, channel_log_id):
+        """
+        Get channel log status. the status can be UPLOADING, PROCESSING, COMPLETED, FAILED
+
+        :param channel_log_id: channel log id
+        :return: status
+        """
+        res = await self._request("GET", f"{self.env.host}/api/document-channel-logs/{channel_log_id}/status")
+        res.raise_for_status()
+        return res.json()
+
+    async def get_channel_extractions_exporting(self, channel_log_id, status: Optional[str] = None):
+        """
+        Get channel extractions, one document may have multiple extractions. They are served from the
+        extraction cache when it is set and has them.
+
+        :param channel_log_id: channel log id
+        :param status: status of the channel log seen by the caller, the extractions are only cached when it
+            is COMPLETED
+        :return: extractions
+        """
+        entry = self._cached_extractions(channel_log_id)
+        if entry is not None and self.extraction_cache.servable(entry):
+            return json.loads(entry.body)
+        res = await self._request(
+            "GET", f"{self.env.host}/api/extraction-exporting/document-channel-logs/{channel_log_id}/extractions",
+            headers={"If-None-Match": entry.etag} if entry is not None else None,
+        )
+        if res.status_code == 304 and entry is not None:
+            self.extraction_cache.touch(self.tenant, channel_log_id)
+            return json.loads(entry.body)
+        res.raise_for_status()
+        extractions = res.json()
+        self._cache_extractions(channel_log_id, extractions, res.content, res.headers.get("ETag"), status)
+        return extractions
+
+    async def query_extractions_pages(
+            self,
+            category: str,
+            start_date: datetime,
+            end_date: datetime,
+            page_size: int = 50,
+            tags: List[str] = None,
+            prefetch: int = 0,
+            checkpoint: Optional[str] = None,
+            resume_from: Optional[str] = None,
+            checkpoint_every: int = 1,
+            raw: bool = False,
+    ) -> AsyncGenerator[list, None]:
+        """Query extraction pages by dates, like DocumentInsighter.query_extractions_pages.
+
+        :param category: extraction category, like NB_COA
+        :param start_date: filter extraction processed after this date,
+            start date is inclusive.
+        :param end_date: filter extraction processed after this date, exclusive
+        :param page_size: number of extraction in each page
+        :param tags: filter extractions which include any of the tags
+        :param prefetch: number of pages fetched in a background task ahead of the consumer, 0 disables read-ahead
+        :param checkpoint: path of the json file the position of the query is saved to
+        :param resume_from: path of a checkpoint file to continue the same query from
+        :param checkpoint_every: number of pages between two fsyncs of the checkpoint, the last page is always
+            flushed
+        :param raw: yield the json bytes of each page instead of parsing it. It cannot be checkpointed.
+        :returns pages in async generator. each page is a list of extraction
+        """
+        if checkpoint is None and resume_from is None:
+            pages = self._query_extractions_pages(category, start_date, end_date, page_size, tags, raw=raw)
+            async for page in (_read_ahead(pages, prefetch) if prefetch > 0 else pages):
+                yield page
+            return
+        if raw:
+            raise ValueError("Raw pages cannot be checkpointed, the extractions they deliver are not counted.")
+
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self._load_checkpoint, category, start_date, end_date, page_size,
+                                           tags, resume_from)
+        checkpoint = checkpoint or resume_from
+        if state.done:
+            return
+        pages = self._query_extractions_pages(category, start_date, end_date, page_size, tags,
+                                              start_url=state.next_url, with_cursor=True)
+        checkpoint_every = max(checkpoint_every, 1)
+        # the checkpoint is saved once the consumer asks for the next page, like the sync client does
+        async for page, next_url in (_read_ahead(pages, prefetch) if prefetch > 0 else pages):
+            yield page
+            state.advance(next_url, len(page))
+            fsync = state.done or state.pages % checkpoint_every == 0
+            await loop.run_in_executor(None, state.save, checkpoint, fsync)
+
+    async def _query_extractions_pages(self, category, start_date, end_date, page_size, tags, start_url=None,
+                                       with_cursor=False, raw=False):
+        async for res in self._extractions_responses(category, start_date, end_date, page_size, tags,
+                                                     start_url=start_url):
+            page = res.content if raw else res.json()
+            yield (page, self._next_url(res)) if with_cursor else page
+
+    async def query_extractions(
+            self,
+            category: str,
+            start_date: datetime,
+            end_date: datetime,
+            page_size: int = 500,
+            tags: List[str] = None,
+            decode: bool = False,
+            chunk_size: int = 64 * 1024,
+    ) -> AsyncGenerator:
+        """Query extractions by dates, one extraction at a time, like DocumentInsighter.query_extractions.
+        Each page is parsed incrementally while it is downloaded.
+
+        :param category: extraction category, like NB_COA
+        :param start_date: filter extraction processed after this date,
+            start date is inclusive.
+        :param end_date: filter extraction processed after this date, exclusive
+        :param page_size: number of extraction in each page
+        :param tags: filter extractions which include any of the tags
+        :param decode: yield Extraction objects instead of dicts
+        :param chunk_size: bytes read from the socket at a time
+        :returns extractions in async generator
+        """
+        decode_extraction = None
+        if decode:
+            from document_insighter.codec import decoder
+            from document_insighter.model import Extraction
+
+            decode_extraction = decoder(Extraction)
+        async for res in self._extractions_responses(category, start_date, end_date, page_size, tags, stream=True):
+            try:
+                parser = JsonArrayParser()
+                async for chunk in res.aiter_bytes(chunk_size):
+                    for extraction in parser.feed(chunk):
+                        yield decode_extraction(extraction) if decode_extraction else extraction
+                for extraction in parser.close():
+                    yield decode_extraction(extraction) if decode_extraction else extraction
+            finally:
+                await res.aclose()
+
+    async def _extractions_responses(self, category, start_date, end_date, page_size, tags, stream=False,
+                                     start_url=None):
+        """Request the extraction pages one after another, following the next links from start_url when it is
+        given, or from the first page."""
+        params = {
+            "category": category,
+            "startDate": start_date.strftime(SEARCH_DATE_FORMAT),
+            "endDate": end_date.strftime(SEARCH_DATE_FORMAT),
+            "page": 0,
+            "size": page_size,
+        }
+
+        if tags:
+            params["tags"] = tags or []
+
+        url = f"{self.env.host}/api/extraction-exporting/extractions"
+        if start_url is not None:
+            url, params = start_url, None
+        while url is not None:
+            res = await self._request("GET", url, params=params, stream=stream)
+            if res.is_error and stream:
+                await res.aread()
+            res.raise_for_status()
+            yield res
+
+            params = None
+            url = self._next_url(res)
+
+    async def query_extractions_pages_sharded(
+            self,
+            category: str,
+            start_date: datetime,
+            end_date: datetime,
+            page_size: int = 50,
+            tags: List[str] = None,
+            shard: Union[str, timedelta] = "day",
+            max_workers: int = 4,
+            ordered: bool = True,
+    ) -> AsyncGenerator[list, None]:
+        """Query extraction pages by dates, the date range is split into shards which are paginated concurrently
+        on the event loop, like DocumentInsighter.query_extractions_pages_sharded.
+
+        :param category: extraction category, like NB_COA
+        :param start_date: filter extraction processed after this date,
+            start date is inclusive.
+        :param end_date: filter extraction processed after this date, exclusive
+        :param page_size: number of extraction in each page
+        :param tags: filter extractions which include any of the tags
+        :param shard: size of each date window, "day", "week" or a timedelta of whole days
+        :param max_workers: number of shards paginated at the same time
+        :param ordered: yield pages in date window order then page order. When it is False, pages are yielded
+            as soon as they are downloaded.
+        :returns pages in async generator. each page is a list of extraction
+        """
+        windows = date_windows(start_date, end_date, shard)
+        max_workers = max(min(max_workers, len(windows)), 1)
+        done = object()
+        tasks = []
+
+        async def fetch_window(window, pages):
+            try:
+                async for page in self.query_extractions_pages(category, window[0], window[1], page_size=page_size,
+                                                               tags=tags):
+                    await pages.put(page)
+            except Exception as e:
+                await pages.put(e)
+            else:
+                await pages.put(done)
+
+        async def drain(pages, windows_left):
+            # yield the pages of the queue until windows_left windows are done
+            while windows_left:
+                item = await pages.get()
+                if item is done:
+                    windows_left -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+
+        try:
+            if ordered:
+                # each window has its own small queue, only max_workers windows are paginated ahead of the consumer
+                queues = deque()
+                next_windows = iter(windows)
+
+                def start(window):
+                    queues.append(asyncio.Queue(maxsize=2))
+                    tasks.append(asyncio.ensure_future(fetch_window(window, queues[-1])))
+
+                for window in itertools.islice(next_windows, max_workers):
+                    start(window)
+                while queues:
+                    async for page in drain(queues[0], 1):
+                        yield page
+                    queues.popleft()
+                    for window in itertools.islice(next_windows, 1):
+                        start(window)
+            else:
+                pages = asyncio.Queue(maxsize=max_workers * 2)
+                remaining = iter(windows)
+
+                async def worker():
+                    for window in remaining:
+                        await fetch_window(window, pages)
+
+                tasks.extend(asyncio.ensure_future(worker()) for _ in range(max_workers))
+                async for page in drain(pages, len(windows)):
+                    yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _read_ahead(pages: AsyncGenerator, depth: int) -> AsyncGenerator:
+    """Iterate `pages` in a background task, keeping up to `depth` items buffered ahead of the consumer, like
+    document_insighter.helpers.read_ahead."""
+    buffer = asyncio.Queue(maxsize=max(depth, 1))
+    end = object()
+
+    async def produce():
+        try:
+            async for item in pages:
+                await buffer.put((item, None))
+        except Exception as e:
+            await buffer.put((end, e))
+        else:
+            await buffer.put((end, None))
+        finally:
+            await pages.aclose()
+
+    task = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item, error = await buffer.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+class AsyncServiceAccountClient(AsyncDocumentInsighter, ServiceAccountClient):
+    """
+    The asyncio version of ServiceAccountClient, it is configured with the same arguments and env variables.
+    """
+
+
+class AsyncOktaApplicationClient(AsyncDocumentInsighter, OktaApplicationClient):
+    """
+    The asyncio version of OktaApplicationClient, it is configured with the same arguments and env variables.
+    fetch_token is interactive, so it stays synchronous and should be called before the event loop starts.
+    """
@@ -0,0 +1,35 @@
+import json
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from document_insighter.helpers import write_json_atomic
+
+
+@dataclass
+class PaginationCheckpoint:
+    """
+    PaginationCheckpoint model, contains the position of a paginated extraction query.
+
+    The cursor is the url of the next page, as given by the Link header of the last page delivered. `query` holds
+    the arguments of the query, so that a checkpoint is not resumed by a different query.
+    """
+    query: dict
+    next_url: Optional[str] = None
+    pages: int = 0
+    delivered: int = 0
+    done: bool = False
+
+    @classmethod
+    def load(cls, path: str) -> "PaginationCheckpoint":
+        with open(path) as fp:
+            return cls(**json.load(fp))
+
+    def save(self, path: str, fsync: bool = True):
+        write_json_atomic(path, asdict(self), fsync=fsync)
+
+    def advance(self, next_url: Optional[str], items: int):
+        """Move the cursor after a page of `items` extractions was delivered."""
+        self.next_url = next_url
+        self.pages += 1
+        self.delivered += items
+        self.done = next_url is None
@@ -0,0 +1,98 @@
+"""
+Command line interface of the Document Insighter client.
+
+    document-insighter ingest drop/ --category BR --output extractions --workers 16
+
+The credentials are read from the environment variables of the client, see ServiceAccountClient and
+OktaApplicationClient.
+"""
+import argparse
+import logging
+import os
+import sys
+from typing import List, Optional
+
+from document_insighter.env import Env
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="document-insighter", description="Document Insighter client")
+    parser.add_argument("--env", default="production", choices=["production", "staging", "dev"], help="Environment")
+    parser.add_argument("--auth", default="service-account", choices=["service-account", "okta"],
+                        help="Service account token, or okta authentication on behalf of a user")
+    parser.add_argument("--tenant", default=None, help="Tenant name, env variable: INSIGHTER_TENANT")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log the progress of each file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Upload the documents of a directory and write their extractions")
+    ingest.add_argument("directory", help="Directory of the documents, scanned recursively")
+    ingest.add_argument("--category", required=True, help="Document Category")
+    ingest.add_argument("--output", default="extractions", help="Directory of the extraction files")
+    ingest.add_argument("--manifest", default=None, help="Manifest database, <output>/manifest.db by default")
+    ingest.add_argument("--pattern", dest="patterns", default=["*"], nargs="+", help="Glob patterns of file names")
+    ingest.add_argument("--workers", default=8, type=int, help="Upload threads")
+    ingest.add_argument("--hash-workers", default=4, type=int, help="md5 checksum threads")
+    ingest.add_argument("--dedup-workers", default=8, type=int, help="Duplicate check threads")
+    ingest.add_argument("--poll-workers", default=4, type=int, help="Status request threads")
+    ingest.add_argument("--write-workers", default=2, type=int, help="Extraction file writing threads")
+    ingest.add_argument("--max-polling", default=1000, type=int, help="Channel logs polled at the same time")
+    ingest.add_argument("--timeout", default=3600, type=float, help="Seconds to wait for the extractions of a file")
+    ingest.add_argument("--ignore-duplicate", action="store_true", help="Upload without duplicate check")
+    ingest.add_argument("--no-wait", dest="wait", action="store_false",
+                        help="Upload only, the extractions are polled by the next run without --no-wait")
+    return parser
+
+
+def make_client(args):
+    """Return the client of the environment and authentication of the arguments."""
+    from document_insighter.api_client import OktaApplicationClient, ServiceAccountClient
+
+    env = getattr(Env, args.env.upper())
+    if args.auth == "okta":
+        client = OktaApplicationClient(env, tenant=args.tenant)
+    else:
+        client = ServiceAccountClient(env, tenant=args.tenant)
+    client.fetch_token()
+    return client
+
+
+def ingest(args) -> int:
+    from document_insighter.ingest import DirectoryIngestor, IngestManifest
+
+    manifest_path = args.manifest or os.path.join(args.output, "manifest.db")
+    with make_client(args) as client, IngestManifest(manifest_path) as manifest:
+        ingestor = DirectoryIngestor(
+            client,
+            args.category,
+            manifest,
+            output=args.output,
+            patterns=args.patterns,
+            ignore_duplicate=args.ignore_duplicate,
+            wait=args.wait,
+            hash_workers=args.hash_workers,
+            dedup_workers=args.dedup_workers,
+            upload_workers=args.workers,
+            poll_workers=args.poll_workers,
+            write_workers=args.write_workers,
+            max_polling=args.max_polling,
+            timeout=args.timeout,
+        )
+        outcomes = ingestor.run(args.directory)
+        states = manifest.counts()
+    print("This run: " + ", ".join(f"{outcome} {outcomes[outcome]}"
+                                   for outcome in ("done", "duplicate", "uploaded", "failed", "skipped")))
+    print("Manifest: " + ", ".join(f"{state} {count}" for state, count in sorted(states.items())))
+    return 1 if outcomes["failed"] else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.command == "ingest":
+        return ingest(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
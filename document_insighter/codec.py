@@ -0,0 +1,234 @@
+"""
+Fast decoding and encoding of the extraction models.
+
+dataclasses_json resolves type hints and letter case overrides again for every nested object it decodes.
+The decoders and encoders in this module are generated once per model class from the same type hints and
+letter case configuration, and compiled into plain functions, so that decoding an extraction only builds
+dicts, lists and dataclass instances:
+
+    extraction = from_dict(Extraction, extraction_dict)
+    assert extraction == Extraction.from_dict(extraction_dict)
+    assert to_dict(extraction) == extraction.to_dict()
+
+Lists of the `lazy` classes are decoded into LazyList, which decodes each item when it is first accessed, so
+that reading a few header fields does not pay for decoding every table:
+
+    extraction = from_dict(Extraction, extraction_dict, lazy=LAZY_TABLES)
+"""
+import threading
+from dataclasses import MISSING, fields, is_dataclass
+from typing import Any, Callable, Dict, Tuple, Type, TypeVar, Union, get_type_hints
+
+from document_insighter.model import Table
+
+T = TypeVar("T")
+
+LAZY_TABLES = (Table,)
+
+_decoders: Dict[Tuple[type, tuple], Callable[[Any], Any]] = {}
+_encoders: Dict[type, Callable[[Any], Any]] = {}
+_lock = threading.RLock()
+
+
+class LazyList(list):
+    """
+    A list of dataclass instances, which are kept as dicts until they are accessed.
+
+    Indexing and iteration decode the accessed items only, other list operations decode all items first.
+    """
+
+    __slots__ = ("_decode",)
+
+    def __init__(self, items, decode):
+        super().__init__(items)
+        self._decode = decode
+
+    def _item(self, i):
+        item = list.__getitem__(self, i)
+        if item.__class__ is dict:
+            item = self._decode(item)
+            list.__setitem__(self, i, item)
+        return item
+
+    def _materialize(self):
+        for i in range(len(self)):
+            self._item(i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            self._materialize()
+            return list.__getitem__(self, i)
+        return self._item(i)
+
+    def __iter__(self):
+        i = 0
+        while i < len(self):
+            yield self._item(i)
+            i += 1
+
+    def __reduce_ex__(self, protocol):
+        # pickle and copy as a plain list
+        self._materialize()
+        return list, (list(list.__iter__(self)),)
+
+
+def _materializing(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._materialize()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ("__contains__", "__eq__", "__ne__", "__lt__", "__le__", "__gt__", "__ge__", "__repr__",
+              "__reversed__", "__add__", "__mul__", "__rmul__", "copy", "count", "index", "pop", "remove", "sort"):
+    setattr(LazyList, _name, _materializing(_name))
+
+
+def _type_args(tp):
+    return getattr(tp, "__args__", None) or ()
+
+
+def _type_origin(tp):
+    return getattr(tp, "__origin__", None)
+
+
+def _unwrap_optional(tp):
+    if _type_origin(tp) is Union:
+        args = [arg for arg in _type_args(tp) if arg is not type(None)]  # noqa: E721
+        if len(args) == 1:
+            return args[0]
+    return tp
+
+
+def _letter_case(cls):
+    config = getattr(cls, "dataclass_json_config", None) or {}
+    return config.get("letter_case")
+
+
+def _field_keys(cls):
+    """Return (field, json key) of each init field of the class."""
+    letter_case = _letter_case(cls)
+    result = []
+    for f in fields(cls):
+        if not f.init:
+            continue
+        override = f.metadata.get("dataclasses_json", {}).get("letter_case", letter_case)
+        result.append((f, override(f.name) if override else f.name))
+    return result
+
+
+def _convert_expr(tp, var, namespace, factory, depth=0, lazy=()):
+    """Return the python expression which converts the value in `var` to the type `tp`.
+
+    `factory` returns the decoder or encoder function of a dataclass.
+    """
+    tp = _unwrap_optional(tp)
+    if is_dataclass(tp):
+        name = f"convert_{tp.__name__}"
+        namespace[name] = factory(tp)
+        return f"(None if {var} is None else {name}({var}))"
+
+    origin = _type_origin(tp)
+    item = f"x{depth}"
+    if origin is list and _type_args(tp) and _unwrap_optional(_type_args(tp)[0]) in lazy:
+        name = f"convert_{_unwrap_optional(_type_args(tp)[0]).__name__}"
+        namespace[name] = factory(_unwrap_optional(_type_args(tp)[0]))
+        namespace["LazyList"] = LazyList
+        return f"(None if {var} is None else LazyList({var}, {name}))"
+    if origin in (list, tuple, set, frozenset):
+        args = _type_args(tp)
+        item_expr = _convert_expr(args[0], item, namespace, factory, depth + 1) if args else item
+        cons = origin.__name__
+        if item_expr == item:
+            return f"(None if {var} is None else {cons}({var}))"
+        if origin is list:
+            return f"(None if {var} is None else [{item_expr} for {item} in {var}])"
+        return f"(None if {var} is None else {cons}({item_expr} for {item} in {var}))"
+    if origin is dict:
+        args = _type_args(tp)
+        value_expr = _convert_expr(args[1], item, namespace, factory, depth + 1) if args else item
+        if value_expr == item:
+            return f"(None if {var} is None else dict({var}))"
+        return f"(None if {var} is None else {{k{depth}: {value_expr} for k{depth}, {item} in {var}.items()}})"
+    return var
+
+
+def _compile(name, source, namespace):
+    exec(compile(source, f"<document_insighter.codec {name}>", "exec"), namespace)
+    return namespace[name]
+
+
+def _build_decoder(cls, lazy):
+    hints = get_type_hints(cls)
+    namespace = {"cls": cls}
+    lines = ["def decode(d):", "    if d.__class__ is cls:", "        return d"]
+    args = []
+    for i, (f, key) in enumerate(_field_keys(cls)):
+        if f.default is not MISSING:
+            namespace[f"default_{i}"] = f.default
+            missing = f"default_{i}"
+        elif f.default_factory is not MISSING:
+            namespace[f"factory_{i}"] = f.default_factory
+            missing = f"factory_{i}()"
+        else:
+            missing = None
+
+        # like dataclasses_json, both the json key and the field name are accepted
+        candidates = [key] if key == f.name else [key, f.name]
+        expr = f"d[{candidates[-1]!r}]" if missing is None else missing
+        for candidate in reversed(candidates if missing is not None else candidates[:-1]):
+            expr = f"d[{candidate!r}] if {candidate!r} in d else {expr}"
+        lines.append(f"    v{i} = {expr}")
+        args.append(_convert_expr(hints[f.name], f"v{i}", namespace, lambda tp: decoder(tp, lazy), lazy=lazy))
+    lines.append(f"    return cls({', '.join(args)})")
+    return _compile("decode", "\n".join(lines), namespace)
+
+
+def _build_encoder(cls):
+    hints = get_type_hints(cls)
+    namespace = {}
+    items = []
+    for f, key in _field_keys(cls):
+        items.append(f"{key!r}: {_convert_expr(hints[f.name], 'o.' + f.name, namespace, encoder)}")
+    source = "def encode(o):\n    return {" + ", ".join(items) + "}"
+    return _compile("encode", source, namespace)
+
+
+def decoder(cls: Type[T], lazy: Tuple[type, ...] = ()) -> Callable[[dict], T]:
+    """Return the compiled decoder of a dataclass, which converts a dict like cls.from_dict.
+
+    :param lazy: classes whose lists are decoded lazily into LazyList, like LAZY_TABLES
+    """
+    key = (cls, tuple(lazy))
+    try:
+        return _decoders[key]
+    except KeyError:
+        with _lock:
+            if key not in _decoders:
+                _decoders[key] = _build_decoder(cls, key[1])
+            return _decoders[key]
+
+
+def encoder(cls: Type[T]) -> Callable[[T], dict]:
+    """Return the compiled encoder of a dataclass, which converts an instance like to_dict."""
+    try:
+        return _encoders[cls]
+    except KeyError:
+        with _lock:
+            if cls not in _encoders:
+                _encoders[cls] = _build_encoder(cls)
+            return _encoders[cls]
+
+
+def from_dict(cls: Type[T], kvs: dict, lazy: Tuple[type, ...] = ()) -> T:
+    """Decode a dict to a model instance, the result equals cls.from_dict(kvs)."""
+    return decoder(cls, lazy)(kvs)
+
+
+def to_dict(obj) -> dict:
+    """Encode a model instance to a dict, the result equals obj.to_dict()."""
+    return encoder(type(obj))(obj)
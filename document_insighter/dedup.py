@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+
+class DedupIndex:
+    """
+    In-memory index of md5 checksum to the uuids of the channel logs uploaded with it.
+
+    It is filled from duplicate checks and uploads, so that files which were already checked are not checked
+    again against the server. Entries expire after `ttl` seconds, "not seen" entries after `negative_ttl`
+    seconds because another client may upload the same file meanwhile, and the least recently used entries
+    are evicted above `max_entries`. The index can be shared by threads.
+    """
+
+    def __init__(self, ttl: float = 3600, negative_ttl: float = 300, max_entries: int = 100_000):
+        """
+        :param ttl: seconds an md5 with channel logs is kept
+        :param negative_ttl: seconds an md5 without channel logs is kept
+        :param max_entries: max number of md5 kept
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, md5: str) -> Optional[List[str]]:
+        """Return the channel log uuids of the md5, an empty list when it was not seen by the server,
+        or None when it is unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(md5)
+            if entry is None:
+                return None
+            expires_at, uuids = entry
+            if expires_at < time.monotonic():
+                del self._entries[md5]
+                return None
+            self._entries.move_to_end(md5)
+            return list(uuids)
+
+    def put(self, md5: str, uuids: List[str]):
+        """Record the channel log uuids of the md5, as returned by the duplicate check."""
+        ttl = self.ttl if uuids else self.negative_ttl
+        with self._lock:
+            self._entries[md5] = (time.monotonic() + ttl, list(uuids))
+            self._entries.move_to_end(md5)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, md5: str, uuid: str):
+        """Record a channel log which was uploaded with the md5."""
+        uuids = self.get(md5) or []
+        if uuid not in uuids:
+            uuids.append(uuid)
+        self.put(md5, uuids)
+
+    def invalidate(self, md5: Optional[str] = None):
+        """Forget one md5, or every md5 when it is None."""
+        with self._lock:
+            if md5 is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(md5, None)
@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class EnvType:
+    """
+    EnvType model, contains the host and service account token url
+
+    The service account token url is used for AWS Cognito based authentication.
+    """
+    host: str
+    service_account_token_url: str
+
+
+class Env:
+    PRODUCTION = EnvType("https://document-insighter.godeepsite.com", "https://prod-document-insighter-id.auth.us-east-1.amazoncognito.com/oauth2/token")
+    STAGING = EnvType("https://document-insighter-staging.godeepsite.com", "https://staging-document-insighter-id.auth.us-east-1.amazoncognito.com/oauth2/token")
+    DEV = EnvType("https://65-181-89-178.ap.ngrok.io", "https://dev-document-insighter-id.auth.us-east-1.amazoncognito.com/oauth2/token")
@@ -3,4 +3,13 @@ class ChannelLogExistsError(Exception):
     def __init__(self, md5_hash, existing_channel_ids):
         self.md5_hash = md5_hash
         self.existing_channel_ids = existing_channel_ids
-        super().__init__(f"Channel log with md5 hash {md5_hash} already exists for channel ids {existing_channel_ids}")
\ No newline at end of file
+        super().__init__(f"Channel log with md5 hash {md5_hash} already exists for channel ids {existing_channel_ids}")
+
+
+class ChannelLogTimeoutError(Exception):
+
+    def __init__(self, channel_log_id, timeout, last_status=None):
+        self.channel_log_id = channel_log_id
+        self.timeout = timeout
+        self.last_status = last_status
+        super().__init__(f"Channel log {channel_log_id} is still {last_status} after {timeout} seconds")
@@ -0,0 +1,163 @@
+"""
+Streaming columnar export of extractions.
+
+Fields and table cells are flattened into two long tables, keyed by extraction id, section and table name:
+
+    fields: extraction_id, section_index, section_category, field_name, value, standard_value
+    tables: extraction_id, section_index, section_category, table_name, row_index, column_name,
+            value, standard_value
+
+Rows are collected in column lists and flushed every `chunk_size` rows, so memory stays flat no matter how
+many pages are exported. pyarrow and numpy are optional dependencies, install them with
+`pip install document-insighter[arrow]` or `pip install document-insighter[numpy]`.
+"""
+import importlib
+from typing import Dict, Generator, Iterable, Tuple
+
+from document_insighter.codec import to_dict
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+FIELD_COLUMNS = ("extraction_id", "section_index", "section_category", "field_name", "value", "standard_value")
+TABLE_COLUMNS = ("extraction_id", "section_index", "section_category", "table_name", "row_index", "column_name",
+                 "value", "standard_value")
+INDEX_COLUMNS = ("section_index", "row_index")
+
+
+def _require(module, extra):
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(
+            f"{module} is required for this export, install it with `pip install document-insighter[{extra}]`"
+        ) from e
+
+
+def _new_columns(names):
+    return {name: [] for name in names}
+
+
+def _flatten(extraction, fields, tables):
+    if not isinstance(extraction, dict):
+        extraction = to_dict(extraction)
+    extraction_id = extraction["id"]
+    for section_index, section in enumerate((extraction.get("data") or {}).get("sections") or []):
+        category = section.get("category")
+        for f in section.get("fields") or []:
+            fields["extraction_id"].append(extraction_id)
+            fields["section_index"].append(section_index)
+            fields["section_category"].append(category)
+            fields["field_name"].append(f.get("name"))
+            fields["value"].append(f.get("value"))
+            fields["standard_value"].append(f.get("standardValue"))
+        for table in section.get("tables") or []:
+            table_name = table.get("name")
+            for column_name, column in (table.get("columns") or {}).items():
+                values = column.get("values") or []
+                standard_values = column.get("standardValues") or []
+                n = len(values)
+                tables["extraction_id"].extend([extraction_id] * n)
+                tables["section_index"].extend([section_index] * n)
+                tables["section_category"].extend([category] * n)
+                tables["table_name"].extend([table_name] * n)
+                tables["row_index"].extend(range(n))
+                tables["column_name"].extend([column_name] * n)
+                tables["value"].extend(values)
+                tables["standard_value"].extend(standard_values[:n])
+                if len(standard_values) < n:
+                    tables["standard_value"].extend([None] * (n - len(standard_values)))
+
+
+def iter_column_batches(
+        pages: Iterable[list],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Generator[Tuple[str, Dict[str, list]], None, None]:
+    """Flatten pages of extractions into column batches.
+
+    :param pages: pages of extraction dicts or Extraction objects, like the output of query_extractions_pages
+    :param chunk_size: max rows buffered before a batch is yielded
+    :returns ("fields", columns) or ("tables", columns) in generator, columns maps column name to values
+    """
+    fields = _new_columns(FIELD_COLUMNS)
+    tables = _new_columns(TABLE_COLUMNS)
+    for page in pages:
+        for extraction in page:
+            _flatten(extraction, fields, tables)
+            if len(fields["extraction_id"]) >= chunk_size:
+                yield "fields", fields
+                fields = _new_columns(FIELD_COLUMNS)
+            if len(tables["extraction_id"]) >= chunk_size:
+                yield "tables", tables
+                tables = _new_columns(TABLE_COLUMNS)
+    if fields["extraction_id"]:
+        yield "fields", fields
+    if tables["extraction_id"]:
+        yield "tables", tables
+
+
+def iter_numpy_batches(
+        pages: Iterable[list],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Generator[Tuple[str, Dict[str, "numpy.ndarray"]], None, None]:
+    """Like iter_column_batches, but each column is a numpy array, int32 for the indexes and object otherwise."""
+    np = _require("numpy", "numpy")
+    for kind, columns in iter_column_batches(pages, chunk_size):
+        yield kind, {
+            name: np.array(values, dtype=np.int32 if name in INDEX_COLUMNS else object)
+            for name, values in columns.items()
+        }
+
+
+def _arrow_schema(pa, names):
+    return pa.schema([(name, pa.int32() if name in INDEX_COLUMNS else pa.string()) for name in names])
+
+
+def _write_arrow(pages, paths, chunk_size, open_writer):
+    pa = _require("pyarrow", "arrow")
+    schemas = {"fields": _arrow_schema(pa, FIELD_COLUMNS), "tables": _arrow_schema(pa, TABLE_COLUMNS)}
+    writers = {}
+    rows = {"fields": 0, "tables": 0}
+    try:
+        for kind, columns in iter_column_batches(pages, chunk_size):
+            if kind not in writers:
+                writers[kind] = open_writer(paths[kind], schemas[kind])
+            writers[kind].write_batch(pa.RecordBatch.from_pydict(columns, schema=schemas[kind]))
+            rows[kind] += len(columns["extraction_id"])
+        # always write both files, an empty file keeps the schema for readers
+        for kind, schema in schemas.items():
+            if kind not in writers:
+                writers[kind] = open_writer(paths[kind], schema)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows["fields"], rows["tables"]
+
+
+def write_parquet(
+        pages: Iterable[list],
+        fields_path: str,
+        tables_path: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        compression: str = "zstd",
+) -> Tuple[int, int]:
+    """Export pages of extractions to a fields and a tables Parquet file, one row group per chunk.
+
+    :return: number of field rows and table rows written
+    """
+    pq = _require("pyarrow.parquet", "arrow")
+    return _write_arrow(pages, {"fields": fields_path, "tables": tables_path}, chunk_size,
+                        lambda path, schema: pq.ParquetWriter(path, schema, compression=compression))
+
+
+def write_arrow_ipc(
+        pages: Iterable[list],
+        fields_path: str,
+        tables_path: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Tuple[int, int]:
+    """Export pages of extractions to a fields and a tables Arrow IPC file, one record batch per chunk.
+
+    :return: number of field rows and table rows written
+    """
+    ipc = _require("pyarrow.ipc", "arrow")
+    return _write_arrow(pages, {"fields": fields_path, "tables": tables_path}, chunk_size, ipc.new_file)
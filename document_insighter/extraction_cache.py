@@ -0,0 +1,191 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cached_extractions (
+    tenant TEXT NOT NULL,
+    channel_log_id TEXT NOT NULL,
+    etag TEXT,
+    stored_at REAL NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (tenant, channel_log_id)
+);
+"""
+
+# channel log statuses of extractions which may still change
+PENDING_STATUSES = ("UPLOADING", "PROCESSING")
+
+
+class CacheEntry(NamedTuple):
+    body: bytes
+    etag: Optional[str]
+    stored_at: float
+
+
+class ExtractionCache:
+    """
+    Cache of the extractions of completed channel logs, keyed by tenant and channel log id. Extractions are only
+    stored when the caller has seen their channel log COMPLETED, see get_channel_extractions_exporting.
+
+    The response bodies are kept in an in-memory LRU limited by number of entries and bytes, and optionally in a
+    SQLite file where they are compressed with zlib, so that they are shared by processes and runs. An entry is
+    served without a request while it is younger than `max_age`, or at any age when the server did not send an
+    ETag. An older entry with an ETag is revalidated with If-None-Match, and a 304 response serves it again.
+    Each read decodes the body again, so callers can modify the extractions they get. The cache can be shared
+    by threads.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 1024,
+            max_bytes: int = 64 * 1024 * 1024,
+            path: Optional[str] = None,
+            max_age: float = 300,
+            compress_level: int = 6,
+    ):
+        """
+        :param max_entries: max number of channel logs kept in memory
+        :param max_bytes: max size of the response bodies kept in memory
+        :param path: path of the SQLite database file of the on-disk tier, None keeps the cache in memory only
+        :param max_age: seconds an entry with an ETag is served before it is revalidated
+        :param compress_level: zlib level of the bodies stored on disk
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_age = max_age
+        self.compress_level = compress_level
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path is not None:
+            if path != ":memory:":
+                os.makedirs(os.path.abspath(os.path.dirname(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def servable(self, entry: CacheEntry) -> bool:
+        """Whether the entry can be served without asking the server."""
+        return not entry.etag or time.time() - entry.stored_at < self.max_age
+
+    def get(self, tenant: Optional[str], channel_log_id) -> Optional[CacheEntry]:
+        key = (tenant or "", str(channel_log_id))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT body, etag, stored_at FROM cached_extractions WHERE tenant = ? AND channel_log_id = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            entry = CacheEntry(zlib.decompress(row[0]), row[1], row[2])
+            self._remember(key, entry)
+            return entry
+
+    def put(self, tenant: Optional[str], channel_log_id, body: bytes, etag: Optional[str] = None):
+        """Store the response body of the extractions of a channel log."""
+        key = (tenant or "", str(channel_log_id))
+        entry = CacheEntry(bytes(body), etag, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO cached_extractions (tenant, channel_log_id, etag, stored_at, body) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (*key, etag, entry.stored_at, zlib.compress(entry.body, self.compress_level)),
+                    )
+
+    def touch(self, tenant: Optional[str], channel_log_id):
+        """Mark an entry as fresh, after the server answered its revalidation with 304 Not Modified."""
+        entry = self.get(tenant, channel_log_id)
+        if entry is None:
+            return
+        key = (tenant or "", str(channel_log_id))
+        entry = entry._replace(stored_at=time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE cached_extractions SET stored_at = ? WHERE tenant = ? AND channel_log_id = ?",
+                        (entry.stored_at, *key),
+                    )
+
+    def invalidate(self, tenant: Optional[str] = None, channel_log_id=None):
+        """Forget the extractions of one channel log, of every channel log of a tenant, or everything when
+        neither is given."""
+        with self._lock:
+            if channel_log_id is not None:
+                keys = [(tenant or "", str(channel_log_id))]
+            elif tenant is not None:
+                keys = [key for key in self._entries if key[0] == tenant]
+            else:
+                keys = list(self._entries)
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self.size -= len(entry.body)
+            if self._conn is not None:
+                with self._conn:
+                    if channel_log_id is not None:
+                        self._conn.execute(
+                            "DELETE FROM cached_extractions WHERE tenant = ? AND channel_log_id = ?", keys[0]
+                        )
+                    elif tenant is not None:
+                        self._conn.execute("DELETE FROM cached_extractions WHERE tenant = ?", (tenant,))
+                    else:
+                        self._conn.execute("DELETE FROM cached_extractions")
+
+    def _remember(self, key, entry):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous.body)
+        if len(entry.body) > self.max_bytes:
+            # too large for the memory tier, it is only kept on disk
+            return
+        self._entries[key] = entry
+        self.size += len(entry.body)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+
+def cacheable(extractions, status: Optional[str] = None) -> bool:
+    """Whether the extractions are final. They are only final once their channel log was seen COMPLETED, and
+    an empty list or an extraction in progress may still change.
+
+    :param extractions: extractions of the channel log
+    :param status: status of the channel log, as last seen by the caller
+    """
+    if status != "COMPLETED" or not extractions or not isinstance(extractions, list):
+        return False
+    return not any(isinstance(x, dict) and x.get("status") in PENDING_STATUSES for x in extractions)
@@ -0,0 +1,383 @@
+"""
+Columnar, vectorized queries across many extractions.
+
+An ExtractionSet flattens a stream of extractions once into numpy arrays: one row per extraction, per field and per
+table row, and one cell per table row and column. Names of categories, tags, statuses, sections, fields, tables and
+columns are interned into int32 codes, values are kept as object arrays next to their float64 parse, NaN when a
+value is not a number. Indexes by category, tag, section category, field, table and column name select the rows of a
+query without scanning the whole set:
+
+    extractions = ExtractionSet.from_pages(client.query_extractions_pages("NB_COA", start_date, end_date))
+    rows = extractions.table("test_parameters", section_category="coa_batch")
+    out_of_spec = rows.filter(rows.numbers("result") > rows.numbers("specification", standard=True))
+    names, counts = group_by(out_of_spec.values("name"))
+
+numpy is an optional dependency, install it with `pip install document-insighter[numpy]`.
+"""
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError as e:  # pragma: no cover
+    raise ImportError(
+        "numpy is required for ExtractionSet, install it with `pip install document-insighter[numpy]`"
+    ) from e
+
+AGGREGATIONS = ("count", "sum", "mean", "min", "max")
+
+
+def _number(value, cache) -> float:
+    try:
+        return cache[value]
+    except KeyError:
+        pass
+    except TypeError:
+        # unhashable values are not numbers
+        return float("nan")
+    try:
+        number = float(value) if value is not None else float("nan")
+    except (TypeError, ValueError):
+        number = float("nan")
+    cache[value] = number
+    return number
+
+
+def _index(codes: np.ndarray) -> Dict[int, np.ndarray]:
+    """Return the positions of each code, in ascending order."""
+    if not len(codes):
+        return {}
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    return {int(code): positions for code, positions in zip(sorted_codes[starts], np.split(order, starts[1:]))}
+
+
+def _factorize(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the sorted unique keys and the position of each key in them. None keys, like the values of missing
+    cells, are grouped last instead of being compared with the other keys."""
+    keys = np.asarray(keys)
+    if keys.dtype != object:
+        unique, inverse = np.unique(keys, return_inverse=True)
+        return unique, inverse.reshape(-1)
+    missing = np.equal(keys, None)
+    unique, present_inverse = np.unique(keys[~missing], return_inverse=True)
+    inverse = np.full(len(keys), len(unique), dtype=np.intp)
+    inverse[~missing] = present_inverse.reshape(-1)
+    if missing.any():
+        unique = np.append(unique, np.array([None], dtype=object))
+    return unique, inverse
+
+
+def group_by(
+        keys: np.ndarray,
+        values: Optional[np.ndarray] = None,
+        func: str = "count",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aggregate values by key.
+
+    :param keys: key of each row
+    :param values: numbers of each row, NaN are ignored. not needed to count rows
+    :param func: count, sum, mean, min or max. count counts the rows, or the numbers when values are given
+    :return: sorted unique keys, None last, and the aggregate of each key
+    """
+    if func not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation {func}, use one of {AGGREGATIONS}")
+    unique, inverse = _factorize(keys)
+    if values is None:
+        if func != "count":
+            raise ValueError(f"values are required for {func}")
+        return unique, np.bincount(inverse, minlength=len(unique))
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    counts = np.bincount(inverse[valid], minlength=len(unique))
+    if func == "count":
+        return unique, counts
+    if func in ("sum", "mean"):
+        sums = np.bincount(inverse[valid], weights=values[valid], minlength=len(unique))
+        if func == "sum":
+            return unique, sums
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return unique, sums / counts
+    result = np.full(len(unique), np.inf if func == "min" else -np.inf)
+    (np.minimum if func == "min" else np.maximum).at(result, inverse[valid], values[valid])
+    result[counts == 0] = np.nan
+    return unique, result
+
+
+class _Rows:
+    """Rows of a query, positions into the arrays of an ExtractionSet."""
+
+    def __init__(self, extraction_set: "ExtractionSet", positions: np.ndarray, row_extractions: np.ndarray,
+                 row_sections: np.ndarray):
+        """
+        :param extraction_set: the set the rows are selected from
+        :param positions: positions of the rows in the arrays of the set
+        :param row_extractions: position of the extraction of each row of the set, like field_extractions
+        :param row_sections: index of the section of each row of the set in its extraction
+        """
+        self.extraction_set = extraction_set
+        self.positions = positions
+        self._row_extractions = row_extractions
+        self._row_sections = row_sections
+
+    def __len__(self):
+        return len(self.positions)
+
+    def filter(self, mask: np.ndarray):
+        """Return the rows where the mask, of the length of the rows, is true."""
+        return type(self)(self.extraction_set, self.positions[np.asarray(mask, dtype=bool)])
+
+    @property
+    def extractions(self) -> np.ndarray:
+        """Positions of the extractions of the rows in the set."""
+        return self._row_extractions[self.positions]
+
+    @property
+    def sections(self) -> np.ndarray:
+        """Index of the section of each row in its extraction."""
+        return self._row_sections[self.positions]
+
+    @property
+    def extraction_ids(self) -> np.ndarray:
+        return self.extraction_set.ids[self.extractions]
+
+    @property
+    def categories(self) -> np.ndarray:
+        """Extraction category of each row."""
+        return self.extraction_set.names(self.extraction_set.categories[self.extractions])
+
+
+class FieldRows(_Rows):
+    """Fields selected from an ExtractionSet, one row per field."""
+
+    def __init__(self, extraction_set: "ExtractionSet", positions: np.ndarray):
+        super().__init__(extraction_set, positions, extraction_set.field_extractions, extraction_set.field_sections)
+
+    def values(self, standard: bool = False) -> np.ndarray:
+        s = self.extraction_set
+        return (s.field_standard_values if standard else s.field_values)[self.positions]
+
+    def numbers(self, standard: bool = False) -> np.ndarray:
+        s = self.extraction_set
+        return (s.field_standard_numbers if standard else s.field_numbers)[self.positions]
+
+
+class TableRows(_Rows):
+    """Table rows selected from an ExtractionSet, the cells of a row are read by column name."""
+
+    def __init__(self, extraction_set: "ExtractionSet", positions: np.ndarray):
+        super().__init__(extraction_set, positions, extraction_set.row_extractions, extraction_set.row_sections)
+
+    @property
+    def rows(self) -> np.ndarray:
+        """Index of each row in its table."""
+        return self.extraction_set.row_indexes[self.positions]
+
+    def values(self, column: str, standard: bool = False) -> np.ndarray:
+        """Values of the column, None where a row has no such cell."""
+        return self.extraction_set._table_column(column, "standard_values" if standard else "values")[self.positions]
+
+    def numbers(self, column: str, standard: bool = False) -> np.ndarray:
+        """Numbers of the column, NaN where a cell is missing or not a number."""
+        return self.extraction_set._table_column(column, "standard_numbers" if standard else "numbers")[self.positions]
+
+
+class ExtractionSet:
+    """
+    Extractions flattened into numpy arrays, see the module documentation.
+
+    Extractions, fields, table rows and cells are numbered in the order they were added. The arrays are public
+    and read only: `ids`, `category_keys`, `categories`, `statuses`, `tag_offsets` and `tag_codes` per extraction,
+    `field_*` per field, `row_*` per table row and `cell_*` per cell. Codes are turned back to names by `names`.
+    """
+
+    def __init__(self, extractions: Iterable = ()):
+        """
+        :param extractions: extraction dicts or Extraction objects
+        """
+        self._strings: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._build(extractions)
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[list]) -> "ExtractionSet":
+        """Build the set from pages of extractions, like the output of query_extractions_pages."""
+        return cls(extraction for page in pages for extraction in page)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def code(self, name: Optional[str]) -> int:
+        """Return the code of a name, -1 when no extraction has it."""
+        return self._codes.get(name, -1)
+
+    def names(self, codes: np.ndarray) -> np.ndarray:
+        """Return the names of the codes, None for -1."""
+        return self._names[np.asarray(codes)]
+
+    def _intern(self, name) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._strings)
+            self._strings.append(name)
+        return code
+
+    def _build(self, extractions):
+        intern, numbers = self._intern, {}
+        ids, keys, categories, statuses, tag_offsets, tag_codes = [], [], array("i"), array("i"), array("q", [0]), \
+            array("i")
+        f_extraction, f_section, f_section_category, f_name = array("i"), array("i"), array("i"), array("i")
+        f_values, f_standard_values = [], []
+        r_extraction, r_section, r_section_category, r_table, r_row = \
+            array("i"), array("i"), array("i"), array("i"), array("i")
+        c_row, c_column, c_values, c_standard_values = array("q"), array("i"), [], []
+        for i, extraction in enumerate(extractions):
+            if not isinstance(extraction, dict):
+                from document_insighter.codec import to_dict
+
+                extraction = to_dict(extraction)
+            ids.append(extraction.get("id"))
+            keys.append(extraction.get("categoryKey"))
+            categories.append(intern(extraction.get("category")))
+            statuses.append(intern(extraction.get("status")))
+            tags = extraction.get("tags") or []
+            tag_codes.extend(intern(tag) for tag in tags)
+            tag_offsets.append(len(tag_codes))
+            for s, section in enumerate((extraction.get("data") or {}).get("sections") or []):
+                section_category = intern(section.get("category"))
+                for f in section.get("fields") or []:
+                    f_extraction.append(i)
+                    f_section.append(s)
+                    f_section_category.append(section_category)
+                    f_name.append(intern(f.get("name")))
+                    f_values.append(f.get("value"))
+                    f_standard_values.append(f.get("standardValue"))
+                for table in section.get("tables") or []:
+                    table_code = intern(table.get("name"))
+                    first_row = len(r_extraction)
+                    rows = 0
+                    for column_name, column in (table.get("columns") or {}).items():
+                        values = column.get("values") or []
+                        standard_values = column.get("standardValues") or []
+                        n = len(values)
+                        rows = max(rows, n)
+                        c_row.extend(range(first_row, first_row + n))
+                        c_column.extend([intern(column_name)] * n)
+                        c_values.extend(values)
+                        c_standard_values.extend(standard_values[:n])
+                        if len(standard_values) < n:
+                            c_standard_values.extend([None] * (n - len(standard_values)))
+                    r_extraction.extend([i] * rows)
+                    r_section.extend([s] * rows)
+                    r_section_category.extend([section_category] * rows)
+                    r_table.extend([table_code] * rows)
+                    r_row.extend(range(rows))
+
+        self._names = np.array(self._strings + [None], dtype=object)
+        self.ids = _objects(ids)
+        self.category_keys = _objects(keys)
+        self.categories = np.frombuffer(categories, dtype=np.intc)
+        self.statuses = np.frombuffer(statuses, dtype=np.intc)
+        self.tag_offsets = np.frombuffer(tag_offsets, dtype=np.longlong)
+        self.tag_codes = np.frombuffer(tag_codes, dtype=np.intc)
+
+        self.field_extractions = np.frombuffer(f_extraction, dtype=np.intc)
+        self.field_sections = np.frombuffer(f_section, dtype=np.intc)
+        self.field_section_categories = np.frombuffer(f_section_category, dtype=np.intc)
+        self.field_names = np.frombuffer(f_name, dtype=np.intc)
+        self.field_values = _objects(f_values)
+        self.field_standard_values = _objects(f_standard_values)
+        self.field_numbers = np.array([_number(v, numbers) for v in f_values], dtype=np.float64)
+        self.field_standard_numbers = np.array([_number(v, numbers) for v in f_standard_values], dtype=np.float64)
+
+        self.row_extractions = np.frombuffer(r_extraction, dtype=np.intc)
+        self.row_sections = np.frombuffer(r_section, dtype=np.intc)
+        self.row_section_categories = np.frombuffer(r_section_category, dtype=np.intc)
+        self.row_tables = np.frombuffer(r_table, dtype=np.intc)
+        self.row_indexes = np.frombuffer(r_row, dtype=np.intc)
+
+        self.cell_rows = np.frombuffer(c_row, dtype=np.longlong)
+        self.cell_columns = np.frombuffer(c_column, dtype=np.intc)
+        self.cell_values = _objects(c_values)
+        self.cell_standard_values = _objects(c_standard_values)
+        self.cell_numbers = np.array([_number(v, numbers) for v in c_values], dtype=np.float64)
+        self.cell_standard_numbers = np.array([_number(v, numbers) for v in c_standard_values], dtype=np.float64)
+
+        tag_extractions = np.repeat(np.arange(len(ids), dtype=np.int32), np.diff(self.tag_offsets))
+        self._extractions_by_category = _index(self.categories)
+        self._extractions_by_tag = {code: np.unique(tag_extractions[positions])
+                                    for code, positions in _index(self.tag_codes).items()}
+        self._fields_by_name = _index(self.field_names)
+        self._rows_by_table = _index(self.row_tables)
+        self._cells_by_column = _index(self.cell_columns)
+        self._table_columns = {}
+
+    def select(self, category: Optional[str] = None, tag: Optional[str] = None,
+               status: Optional[str] = None) -> np.ndarray:
+        """Return the mask of the extractions of the category, with the tag and in the status."""
+        mask = np.ones(len(self), dtype=bool)
+        if category is not None:
+            mask &= self._mask(self._extractions_by_category.get(self.code(category)))
+        if tag is not None:
+            mask &= self._mask(self._extractions_by_tag.get(self.code(tag)))
+        if status is not None:
+            mask &= self.statuses == self.code(status)
+        return mask
+
+    def _mask(self, positions: Optional[np.ndarray]) -> np.ndarray:
+        mask = np.zeros(len(self), dtype=bool)
+        if positions is not None:
+            mask[positions] = True
+        return mask
+
+    def _selected(self, positions, extractions, section_categories, section_category, category, tag, status):
+        if positions is None:
+            return np.zeros(0, dtype=np.int64)
+        if section_category is not None:
+            positions = positions[section_categories[positions] == self.code(section_category)]
+        if category is not None or tag is not None or status is not None:
+            positions = positions[self.select(category, tag, status)[extractions[positions]]]
+        return positions
+
+    def fields(self, name: str, section_category: Optional[str] = None, category: Optional[str] = None,
+               tag: Optional[str] = None, status: Optional[str] = None) -> FieldRows:
+        """
+        Return the fields of the name, in the sections of the section category, of the extractions of the
+        category, with the tag and in the status.
+        """
+        positions = self._selected(self._fields_by_name.get(self.code(name)), self.field_extractions,
+                                   self.field_section_categories, section_category, category, tag, status)
+        return FieldRows(self, positions)
+
+    def table(self, name: str, section_category: Optional[str] = None, category: Optional[str] = None,
+              tag: Optional[str] = None, status: Optional[str] = None) -> TableRows:
+        """
+        Return the rows of the tables of the name, in the sections of the section category, of the extractions of
+        the category, with the tag and in the status.
+        """
+        positions = self._selected(self._rows_by_table.get(self.code(name)), self.row_extractions,
+                                   self.row_section_categories, section_category, category, tag, status)
+        return TableRows(self, positions)
+
+    def _table_column(self, column: str, kind: str) -> np.ndarray:
+        """Return the cells of the column of every table row, built once per column."""
+        key = (column, kind)
+        result = self._table_columns.get(key)
+        if result is None:
+            numeric = kind.endswith("numbers")
+            result = np.full(len(self.row_extractions), np.nan if numeric else None,
+                             dtype=np.float64 if numeric else object)
+            cells = self._cells_by_column.get(self.code(column))
+            if cells is not None:
+                result[self.cell_rows[cells]] = getattr(self, "cell_" + kind)[cells]
+            self._table_columns[key] = result
+        return result
+
+
+def _objects(values: list) -> np.ndarray:
+    # np.array would make a 2d array of list values, or a string array
+    result = np.empty(len(values), dtype=object)
+    result[:] = values
+    return result
@@ -0,0 +1,68 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from document_insighter.helpers import md5_checksum
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    md5 TEXT NOT NULL
+);
+"""
+
+
+class FileHashCache:
+    """
+    On-disk cache of file md5 checksums, keyed by path, size, mtime and inode.
+
+    A file is only hashed again when one of them changed, so re-running an ingestion over a mostly
+    unchanged directory skips rehashing. The cache can be shared by threads.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path of the SQLite database file, ":memory:" for an in-memory cache
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.abspath(os.path.dirname(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def md5(self, file_path: str) -> str:
+        """Return the md5 checksum of the file, from the cache when the file did not change."""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, inode, md5 FROM file_hashes WHERE path = ?", (path,)
+            ).fetchone()
+        if row is not None and tuple(row[:3]) == key:
+            return row[3]
+
+        md5 = md5_checksum(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, inode, md5) VALUES (?, ?, ?, ?, ?)",
+                (path, *key, md5),
+            )
+        return md5
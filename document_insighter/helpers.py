@@ -1,7 +1,116 @@
+import contextlib
 import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Generator, Iterable, List, Tuple, TypeVar, Union
 
+T = TypeVar("T")
 
-def md5_checksum(file_path):
+SHARD_SIZES = {
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def md5_checksum(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """Return the md5 hex digest of a file, which is read in chunks so that memory does not grow with it."""
+    md5 = hashlib.md5()
     with open(file_path, 'rb') as f:
-        data = f.read()
-    return hashlib.md5(data).hexdigest()
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def write_json_atomic(path: str, obj, fsync: bool = True):
+    """Write a json file atomically, so that other processes, or a run after a crash, never read a partial file.
+
+    Without fsync the file survives a crash of the process, but it may be lost or older after a power failure.
+    """
+    directory = os.path.abspath(os.path.dirname(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            json.dump(obj, fp)
+            fp.flush()
+            if fsync:
+                os.fsync(fp.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def date_windows(start_date: datetime, end_date: datetime, shard: Union[str, timedelta]) -> List[Tuple[datetime, datetime]]:
+    """Split [start_date, end_date) into consecutive windows of the shard size, the last window is clipped.
+
+    :param shard: "day", "week" or a timedelta of whole days
+    """
+    step = SHARD_SIZES[shard] if isinstance(shard, str) else shard
+    if step < timedelta(days=1) or step % timedelta(days=1):
+        raise ValueError("Shard size must be whole days, the api filters extractions by date.")
+    windows = []
+    window_start = start_date
+    while window_start < end_date:
+        window_end = min(window_start + step, end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
+
+
+def put_until_stopped(buffer: queue.Queue, item, stopped: threading.Event) -> bool:
+    """Put an item in a bounded queue, waiting while it is full. Return False, without putting the item, once
+    the consumer has set `stopped`."""
+    while not stopped.is_set():
+        try:
+            buffer.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def read_ahead(iterable: Iterable[T], depth: int) -> Generator[T, None, None]:
+    """Iterate `iterable` in a background thread, keeping up to `depth` items buffered ahead of the consumer.
+
+    The background thread blocks when the buffer is full. An exception raised by `iterable` is raised to the
+    consumer after the items before it, and closing the generator stops the background thread.
+    """
+    buffer = queue.Queue(maxsize=max(depth, 1))
+    stopped = threading.Event()
+    end = object()
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put_until_stopped(buffer, (item, None), stopped):
+                    return
+        except BaseException as e:
+            put_until_stopped(buffer, (end, e), stopped)
+            return
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+        put_until_stopped(buffer, (end, None), stopped)
+
+    thread = threading.Thread(target=produce, name="read-ahead", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stopped.set()
@@ -0,0 +1,439 @@
+"""
+Resumable ingestion of a directory of documents.
+
+The files flow through a pipeline of stages, scan → hash → dedup → upload → poll → write, each stage with its own
+worker threads and a bounded queue in front of it, so that hashing, duplicate checks, uploads and polling overlap
+and a slow stage holds back the stages before it instead of buffering the whole directory:
+
+    with IngestManifest("extractions/manifest.db") as manifest:
+        outcomes = DirectoryIngestor(client, "BR", manifest, output="extractions", upload_workers=16).run("drop/")
+
+The manifest records the state of each file as soon as it changes, so a re-run after a crash skips the files which
+are done, and polls the channel logs of uploaded files instead of uploading them again.
+"""
+import fnmatch
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import CancelledError
+from dataclasses import astuple, dataclass, fields
+from typing import Callable, Dict, Iterable, Optional
+
+from document_insighter.helpers import write_json_atomic
+from document_insighter.poller import ChannelLogPoller
+
+logger = logging.getLogger(__name__)
+
+# states of a file in the manifest
+HASHED = "HASHED"
+# recorded before the upload request, so that a crash during the upload is recognized by the next run
+UPLOADING = "UPLOADING"
+UPLOADED = "UPLOADED"
+DONE = "DONE"
+DUPLICATE = "DUPLICATE"
+FAILED = "FAILED"
+FINAL_STATES = (DONE, DUPLICATE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    state TEXT,
+    md5 TEXT,
+    channel_log_id TEXT,
+    duplicate_of TEXT,
+    output TEXT,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS files_md5 ON files (md5);
+"""
+
+
+@dataclass
+class ManifestEntry:
+    """
+    ManifestEntry model, contains the state of one file of an ingestion.
+    the path is relative to the ingested directory, size and mtime_ns tell whether the file changed since.
+    the channel_log_id is the channel log of the upload, or an existing channel log of a duplicate.
+    the duplicate_of is the path of an ingested file with the same content.
+    """
+    path: str
+    size: int
+    mtime_ns: int
+    state: Optional[str] = None
+    md5: Optional[str] = None
+    channel_log_id: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    output: Optional[str] = None
+    error: Optional[str] = None
+    updated_at: Optional[float] = None
+
+
+class IngestManifest:
+    """
+    SQLite manifest of the files of a directory ingestion, keyed by their path relative to the directory.
+
+    Each state change is committed at once, in WAL mode so that a crash loses at most the changes in flight.
+    The manifest can be shared by threads.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path of the SQLite database file, ":memory:" for an in-memory manifest
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.abspath(os.path.dirname(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def entries(self) -> Dict[str, ManifestEntry]:
+        """Return all entries by path."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS} FROM files").fetchall()
+        return {row[0]: ManifestEntry(*row) for row in rows}
+
+    def get(self, path: str) -> Optional[ManifestEntry]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM files WHERE path = ?", (path,)).fetchone()
+        return ManifestEntry(*row) if row else None
+
+    def update(self, entry: ManifestEntry, state: str, **changes):
+        """Set the state and the given fields of the entry, and commit them."""
+        for name, value in changes.items():
+            setattr(entry, name, value)
+        entry.state = state
+        entry.updated_at = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT OR REPLACE INTO files ({_COLUMNS}) VALUES ({_PLACEHOLDERS})",
+                               astuple(entry))
+
+    def uploaded_path(self, md5: str) -> Optional[str]:
+        """Return the path of a file with the md5 checksum which was uploaded, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM files WHERE md5 = ? AND state IN (?, ?) LIMIT 1", (md5, UPLOADED, DONE)
+            ).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> Counter:
+        """Return the number of files in each state."""
+        with self._lock:
+            return Counter(dict(self._conn.execute("SELECT state, COUNT(*) FROM files GROUP BY state")))
+
+
+_COLUMNS = ", ".join(f.name for f in fields(ManifestEntry))
+_PLACEHOLDERS = ", ".join("?" for _ in fields(ManifestEntry))
+_STOP = object()
+
+
+class _Stage:
+    """
+    Worker threads which take items from a bounded queue and pass the results of `fn` to the next stage.
+    An exception raised by `fn` is passed to `on_error` with the item, the worker goes on with the next item.
+    """
+
+    def __init__(self, name: str, fn: Callable, workers: int, next_stage: Optional["_Stage"] = None,
+                 maxsize: Optional[int] = None, on_error: Optional[Callable] = None):
+        self.fn = fn
+        self.next_stage = next_stage
+        self.on_error = on_error
+        self.queue = queue.Queue(maxsize or workers * 2)
+        self._threads = [threading.Thread(target=self._run, name=f"ingest-{name}-{i}", daemon=True)
+                         for i in range(max(workers, 1))]
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def finish(self):
+        """Wait until the queued items are processed and stop the workers."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            try:
+                result = self.fn(item)
+            except Exception as e:
+                try:
+                    if self.on_error is None:
+                        raise
+                    self.on_error(item, e)
+                except Exception:
+                    logger.exception("Failed to process %r.", item)
+                continue
+            if result is not None and self.next_stage is not None:
+                self.next_stage.put(result)
+
+
+class DirectoryIngestor:
+    """
+    Upload the documents of a directory, and write the extractions of each one to `output` as
+    `<relative path>.json`.
+
+    A file is skipped when the manifest has it DONE or DUPLICATE with the same size and mtime. A file is a
+    DUPLICATE when a file with the same content was uploaded in this or an earlier run, or when the api already
+    has a channel log with its md5 checksum. Files which FAILED are ingested again on the next run, the ones
+    which were uploaded are polled again instead of uploaded again. A file left UPLOADING or HASHED by an
+    earlier run, whose md5 checksum the api knows, was uploaded before the run stopped: the channel log found
+    is its own and it is polled. A DUPLICATE of a file which did not reach UPLOADED is ingested again.
+
+    md5 checksums are computed by the client, with its hash cache when it is set.
+    """
+
+    def __init__(
+            self,
+            client,
+            category: str,
+            manifest: IngestManifest,
+            output: Optional[str] = None,
+            patterns: Iterable[str] = ("*",),
+            metadata_fn: Optional[Callable[[str], dict]] = None,
+            ignore_duplicate: bool = False,
+            wait: bool = True,
+            hash_workers: int = 4,
+            dedup_workers: int = 8,
+            upload_workers: int = 8,
+            poll_workers: int = 4,
+            write_workers: int = 2,
+            max_polling: int = 1000,
+            poll_step: float = 1,
+            timeout: float = 3600,
+    ):
+        """
+        :param client: DocumentInsighter client
+        :param category: category of the documents
+        :param manifest: manifest of the ingestion
+        :param output: directory of the extraction files, required when wait is set
+        :param patterns: glob patterns of the file names to ingest
+        :param metadata_fn: function which returns the metadata of a file path
+        :param ignore_duplicate: upload the files without duplicate check
+        :param wait: poll the channel logs and write their extractions, otherwise files are left UPLOADED and
+            polled by the next run with wait
+        :param hash_workers: number of threads computing md5 checksums
+        :param dedup_workers: number of threads checking md5 checksums with the api
+        :param upload_workers: number of threads uploading files
+        :param poll_workers: number of threads sending status requests
+        :param write_workers: number of threads writing extraction files
+        :param max_polling: max number of channel logs polled at the same time, uploads wait beyond it
+        :param poll_step: seconds before the first status request of a channel log, see ChannelLogPoller
+        :param timeout: seconds to wait for the extractions of a channel log
+        """
+        if wait and not output:
+            raise ValueError("output is required to write the extractions.")
+        self.client = client
+        self.category = category
+        self.manifest = manifest
+        self.output = output
+        self.patterns = list(patterns)
+        self.metadata_fn = metadata_fn
+        self.ignore_duplicate = ignore_duplicate
+        self.wait = wait
+        self.hash_workers = hash_workers
+        self.dedup_workers = dedup_workers
+        self.upload_workers = upload_workers
+        self.poll_workers = poll_workers
+        self.write_workers = write_workers
+        self.max_polling = max_polling
+        self.poll_step = poll_step
+        self.timeout = timeout
+        self._root = None
+        self._claimed = {}
+        self._resumed = set()
+        self._lock = threading.Lock()
+        self._outcomes = Counter()
+        self._polling = threading.BoundedSemaphore(max_polling)
+        self._poller = None
+        self._write = None
+
+    def run(self, directory: str) -> Counter:
+        """
+        Ingest the files of the directory.
+
+        :param directory: directory of the documents, scanned recursively
+        :return: number of files by outcome of this run: done, duplicate, uploaded, failed and skipped
+        """
+        self._root = os.path.abspath(directory)
+        self._outcomes = Counter()
+        self._claimed = {}
+        self._resumed = set()
+        self.client._ensure_pool_size(self.dedup_workers + self.upload_workers + self.poll_workers)
+        self._poller = ChannelLogPoller(self.client, initial_step=self.poll_step, timeout=self.timeout,
+                                        max_workers=self.poll_workers) if self.wait else None
+        self._write = _Stage("write", self._write_extractions, self.write_workers,
+                             on_error=self._stage_error) if self.wait else None
+        upload = _Stage("upload", self._upload, self.upload_workers, on_error=self._stage_error)
+        dedup = _Stage("dedup", self._dedup, self.dedup_workers, upload, on_error=self._stage_error)
+        hashing = _Stage("hash", self._hash, self.hash_workers, dedup, on_error=self._stage_error)
+        start = time.perf_counter()
+        try:
+            for entry in self._scan():
+                if entry.state == UPLOADED or (entry.state == FAILED and entry.channel_log_id):
+                    upload.put(entry)
+                elif entry.md5 is not None:
+                    dedup.put(entry)
+                else:
+                    hashing.put(entry)
+            hashing.finish()
+            dedup.finish()
+            upload.finish()
+            if self.wait:
+                # every channel log in flight holds the semaphore until its extractions are written
+                for _ in range(self.max_polling):
+                    self._polling.acquire()
+                for _ in range(self.max_polling):
+                    self._polling.release()
+                self._write.finish()
+        finally:
+            if self._poller is not None:
+                self._poller.close(wait=False)
+        logger.info("Ingested %s in %.1f seconds: %s", directory, time.perf_counter() - start, dict(self._outcomes))
+        return self._outcomes
+
+    def _path(self, entry: ManifestEntry) -> str:
+        return os.path.join(self._root, entry.path)
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self._outcomes[outcome] += 1
+
+    def _fail(self, entry: ManifestEntry, error: BaseException):
+        logger.warning("Failed to ingest %s: %r", entry.path, error)
+        with self._lock:
+            # later copies of the content are uploaded instead of marked duplicates of a failed file
+            if entry.md5 is not None and self._claimed.get(entry.md5) == entry.path:
+                del self._claimed[entry.md5]
+        self._count("failed")
+        self.manifest.update(entry, FAILED, error=repr(error))
+
+    def _stage_error(self, item, error: Exception):
+        # an error which a stage did not handle, items of the write stage are (entry, future)
+        self._fail(item[0] if isinstance(item, tuple) else item, error)
+
+    def _scan(self):
+        known = self.manifest.entries()
+        manifest_path = os.path.abspath(self.manifest.path)
+        output = os.path.abspath(self.output) if self.output else None
+        for dir_path, dir_names, file_names in os.walk(self._root):
+            dir_names.sort()
+            if output is not None:
+                dir_names[:] = [name for name in dir_names if os.path.join(dir_path, name) != output]
+            for name in sorted(file_names):
+                path = os.path.join(dir_path, name)
+                if not any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns) or \
+                        path.startswith(manifest_path):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError as e:
+                    logger.warning("Failed to stat %s: %s", path, e)
+                    continue
+                relative = os.path.relpath(path, self._root)
+                entry = known.get(relative)
+                if entry is None or (entry.size, entry.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                    yield ManifestEntry(relative, stat.st_size, stat.st_mtime_ns)
+                elif entry.state == DUPLICATE and entry.duplicate_of is not None and \
+                        getattr(known.get(entry.duplicate_of), "state", None) not in (UPLOADED, DONE):
+                    # the file it duplicates failed or is gone, the content may never have been uploaded
+                    yield entry
+                elif entry.state in FINAL_STATES or (entry.state == UPLOADED and not self.wait):
+                    self._count("skipped")
+                else:
+                    if entry.state in (HASHED, UPLOADING):
+                        self._resumed.add(entry.path)
+                    yield entry
+
+    def _hash(self, entry: ManifestEntry) -> Optional[ManifestEntry]:
+        try:
+            self.manifest.update(entry, HASHED, md5=self.client._md5_checksum(self._path(entry)), error=None)
+        except Exception as e:
+            self._fail(entry, e)
+            return None
+        return entry
+
+    def _dedup(self, entry: ManifestEntry) -> Optional[ManifestEntry]:
+        if self.ignore_duplicate and entry.path not in self._resumed:
+            return entry
+        with self._lock:
+            owner = self._claimed.get(entry.md5) or self.manifest.uploaded_path(entry.md5)
+            if owner is None or owner == entry.path:
+                self._claimed[entry.md5] = entry.path
+        if owner is not None and owner != entry.path:
+            self.manifest.update(entry, DUPLICATE, duplicate_of=owner)
+            self._count("duplicate")
+            return None
+        try:
+            uuids = self.client.get_channel_log_uuids_by_md5(entry.md5)
+        except Exception as e:
+            self._fail(entry, e)
+            return None
+        if uuids and entry.path in self._resumed:
+            # uploaded by the run which stopped before it recorded the channel log
+            self.manifest.update(entry, UPLOADED, channel_log_id=uuids[0], error=None)
+            return entry
+        if uuids:
+            self.manifest.update(entry, DUPLICATE, channel_log_id=uuids[0])
+            self._count("duplicate")
+            return None
+        return entry
+
+    def _upload(self, entry: ManifestEntry):
+        if entry.state != UPLOADED and not (entry.state == FAILED and entry.channel_log_id):
+            path = self._path(entry)
+            try:
+                metadata = self.metadata_fn(path) if self.metadata_fn else None
+                self.manifest.update(entry, UPLOADING)
+                log = self.client.upload_document(self.category, path, metadata, ignore_duplicate=True)
+                if not log:
+                    raise ValueError(f"The upload of {entry.path} returned no channel log")
+                self.manifest.update(entry, UPLOADED, channel_log_id=log.get("id"), error=None)
+            except Exception as e:
+                self._fail(entry, e)
+                return
+        if not self.wait:
+            self._count("uploaded")
+            return
+        self._polling.acquire()
+        try:
+            self._poller.submit(entry.channel_log_id, callback=lambda future: self._write.put((entry, future)))
+        except BaseException:
+            self._polling.release()
+            raise
+
+    def _write_extractions(self, item):
+        entry, future = item
+        try:
+            extractions = future.result()
+            output = os.path.join(self.output, entry.path + ".json")
+            write_json_atomic(output, extractions)
+            self.manifest.update(entry, DONE, output=output, error=None)
+            self._count("done")
+        except (Exception, CancelledError) as e:
+            self._fail(entry, e)
+        finally:
+            self._polling.release()
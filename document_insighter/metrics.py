@@ -0,0 +1,222 @@
+"""
+Instrumentation events of the client, and an in-process aggregator of them.
+
+    collector = MetricsCollector()
+    client.instrumentation.add_listener(collector)
+    ...
+    print(collector.prometheus())
+
+Events are only built when a listener is registered, so the instrumentation costs one attribute check per request
+when it is not used.
+"""
+import bisect
+import logging
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+ENDPOINTS = [
+    (re.compile(r"/api/documents/common/upload$"), "upload"),
+    (re.compile(r"/api/document-channel-logs/md5-checksum/[^/]+/uuids$"), "md5_uuids"),
+    (re.compile(r"/api/document-channel-logs/[^/]+/status$"), "channel_log_status"),
+    (re.compile(r"/api/extraction-exporting/document-channel-logs/[^/]+/extractions$"), "channel_extractions"),
+    (re.compile(r"/api/extraction-exporting/extractions$"), "extractions"),
+    (re.compile(r"/token$"), "token"),
+]
+
+
+def endpoint_name(url: str) -> str:
+    """Name of the api endpoint of a url, without its ids, so that the metrics of an endpoint are aggregated."""
+    path = urlparse(url).path
+    for pattern, name in ENDPOINTS:
+        if pattern.search(path):
+            return name
+    return "other"
+
+
+@dataclass
+class RequestEvent:
+    endpoint: str
+    method: str
+    status: Optional[int]
+    elapsed: float
+    bytes_sent: int
+    bytes_received: int
+    retries: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class TokenRefreshEvent:
+    elapsed: float
+    error: Optional[str] = None
+
+
+@dataclass
+class PollEvent:
+    channel_log_id: str
+    iterations: int
+    elapsed: float
+    status: Optional[str]
+
+
+class Instrumentation:
+    """
+    Registry of the listeners of the client events. A listener is called with each event, in the thread of the
+    request, so it should be fast. Its errors are logged and ignored.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._listeners)
+
+    def add_listener(self, listener: Callable):
+        self._listeners = self._listeners + [listener]
+
+    def remove_listener(self, listener: Callable):
+        self._listeners = [x for x in self._listeners if x is not listener]
+
+    def emit(self, event):
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Instrumentation listener %r failed.", listener)
+
+
+class Histogram:
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket of the q quantile."""
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            if cumulative >= rank and cumulative:
+                return bound
+        return 0.0
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "sum": self.sum, "buckets": dict(zip(self.buckets, self.counts)),
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99)}
+
+
+class MetricsCollector:
+    """
+    Listener which aggregates the events in histograms and counters, labelled by endpoint. It can be shared by
+    clients and threads.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._latency: Dict[str, Histogram] = defaultdict(lambda: Histogram(self.buckets))
+        self._requests: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._bytes_sent: Dict[str, int] = defaultdict(int)
+        self._bytes_received: Dict[str, int] = defaultdict(int)
+        self._retries: Dict[str, int] = defaultdict(int)
+        self._token_refresh = Histogram(self.buckets)
+        self._token_refresh_errors = 0
+        self._poll_iterations = Histogram((1, 2, 3, 5, 10, 20, 50, 100))
+        self._poll_time = Histogram(self.buckets)
+
+    def __call__(self, event):
+        with self._lock:
+            if isinstance(event, RequestEvent):
+                status = str(event.status) if event.status is not None else "error"
+                self._latency[event.endpoint].observe(event.elapsed)
+                self._requests[(event.endpoint, status)] += 1
+                self._bytes_sent[event.endpoint] += event.bytes_sent
+                self._bytes_received[event.endpoint] += event.bytes_received
+                self._retries[event.endpoint] += event.retries
+            elif isinstance(event, TokenRefreshEvent):
+                self._token_refresh.observe(event.elapsed)
+                self._token_refresh_errors += event.error is not None
+            elif isinstance(event, PollEvent):
+                self._poll_iterations.observe(event.iterations)
+                self._poll_time.observe(event.elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            endpoints = {}
+            for endpoint, histogram in self._latency.items():
+                endpoints[endpoint] = {
+                    "latency": histogram.snapshot(),
+                    "statuses": {status: count for (name, status), count in self._requests.items()
+                                 if name == endpoint},
+                    "bytes_sent": self._bytes_sent[endpoint],
+                    "bytes_received": self._bytes_received[endpoint],
+                    "retries": self._retries[endpoint],
+                }
+            return {
+                "endpoints": endpoints,
+                "token_refresh": dict(self._token_refresh.snapshot(), errors=self._token_refresh_errors),
+                "poll_iterations": self._poll_iterations.snapshot(),
+                "poll_time": self._poll_time.snapshot(),
+            }
+
+    def prometheus(self, prefix: str = "document_insighter") -> str:
+        """Export the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def sample(name, labels, value):
+            lines.append(f"{prefix}_{name}{{{labels}}} {value}" if labels else f"{prefix}_{name} {value}")
+
+        def header(name, help_text, kind):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        def histogram(name, help_text, histograms):
+            header(name, help_text, "histogram")
+            for labels, hist in histograms:
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ("+Inf",), hist.counts):
+                    cumulative += count
+                    sample(f"{name}_bucket", ",".join(filter(None, [labels, f'le="{bound}"'])), cumulative)
+                sample(f"{name}_sum", labels, hist.sum)
+                sample(f"{name}_count", labels, hist.count)
+
+        def counter(name, help_text, values):
+            header(name, help_text, "counter")
+            for labels, value in values:
+                sample(name, labels, value)
+
+        with self._lock:
+            histogram("request_duration_seconds", "Duration of the api requests.",
+                      [(f'endpoint="{endpoint}"', hist) for endpoint, hist in sorted(self._latency.items())])
+            counter("requests_total", "Api requests by endpoint and status.",
+                    [(f'endpoint="{endpoint}",status="{status}"', count)
+                     for (endpoint, status), count in sorted(self._requests.items())])
+            counter("request_bytes_sent_total", "Bytes sent in the request bodies.",
+                    [(f'endpoint="{endpoint}"', value) for endpoint, value in sorted(self._bytes_sent.items())])
+            counter("request_bytes_received_total", "Bytes received in the response bodies.",
+                    [(f'endpoint="{endpoint}"', value) for endpoint, value in sorted(self._bytes_received.items())])
+            counter("request_retries_total", "Retries of the api requests.",
+                    [(f'endpoint="{endpoint}"', value) for endpoint, value in sorted(self._retries.items())])
+            histogram("token_refresh_duration_seconds", "Duration of the token refreshes.",
+                      [("", self._token_refresh)])
+            histogram("poll_iterations", "Status requests until a channel log is done.", [("", self._poll_iterations)])
+            histogram("poll_duration_seconds", "Time until a channel log is done.", [("", self._poll_time)])
+        return "\n".join(lines) + "\n"
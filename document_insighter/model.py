@@ -3,22 +3,47 @@ from dataclasses_json import dataclass_json, LetterCase
 from typing import Dict, Optional, List
 from datetime import datetime
 
+# Env and the upload results live in light modules, so that the client can be imported without dataclasses_json
+from document_insighter.env import Env, EnvType  # noqa: F401
+from document_insighter.results import DuplicateCheck, UploadResult  # noqa: F401
 
-@dataclass
-class EnvType:
-    """
-    EnvType model, contains the host and service account token url
 
-    The service account token url is used for AWS Cognito based authentication.
+def _name(item):
+    return item.get("name") if item.__class__ is dict else item.name
+
+
+def _cached_index(obj, index_attr, items):
+    """
+    Return the index cached on obj for the list, None when the list was replaced or items were added or removed
+    since it was built.
     """
-    host: str
-    service_account_token_url: str
+    cached = obj.__dict__.get(index_attr)
+    if cached is None or cached[0] is not items or cached[1] != len(items):
+        return None
+    return cached[2]
 
 
-class Env:
-    PRODUCTION = EnvType("https://document-insighter.godeepsite.com", "https://prod-document-insighter-id.auth.us-east-1.amazoncognito.com/oauth2/token")
-    STAGING = EnvType("https://document-insighter-staging.godeepsite.com", "https://staging-document-insighter-id.auth.us-east-1.amazoncognito.com/oauth2/token")
-    DEV = EnvType("https://65-181-89-178.ap.ngrok.io", "https://dev-document-insighter-id.auth.us-east-1.amazoncognito.com/oauth2/token")
+def _lookup(obj, index_attr, items, name):
+    """
+    Find the first item with the name through a name to position index cached on obj. The index is rebuilt
+    when the list is replaced, when its length changes, or when the item at the cached position no longer has
+    the name. Items are read with list.__iter__, so that lazily decoded items are not decoded while the index
+    is built.
+    """
+    if not items:
+        return None
+    index = _cached_index(obj, index_attr, items)
+    for _ in range(2):
+        if index is None:
+            index = {}
+            for i, item in enumerate(list.__iter__(items)):
+                index.setdefault(_name(item), i)
+            obj.__dict__[index_attr] = (items, len(items), index)
+        i = index.get(name)
+        if i is None or _name(list.__getitem__(items, i)) == name:
+            break
+        index = None
+    return None if i is None else items[i]
 
 
 @dataclass_json(letter_case=LetterCase.CAMEL)
@@ -62,6 +87,21 @@ class Section:
     fields: Optional[List[Field]] = field(default_factory=lambda: [])
     tables: Optional[List[Table]] = field(default_factory=lambda: [])
 
+    def field(self, name: str) -> Optional[Field]:
+        """
+        Return the first field with the name, or None. The index is built on the first lookup and rebuilt
+        when fields are added or removed. A field replaced in place by a field of a new name, without changing
+        the number of fields, is only found once the index is rebuilt.
+        """
+        return _lookup(self, "_field_index", self.fields, name)
+
+    def table(self, name: str) -> Optional[Table]:
+        """
+        Return the first table with the name, or None. The index is built on the first lookup like the index
+        of field, tables which are decoded lazily are only decoded when they are returned.
+        """
+        return _lookup(self, "_table_index", self.tables, name)
+
 
 @dataclass_json
 @dataclass
@@ -71,6 +111,28 @@ class Data:
     """
     sections: Optional[List[Section]] = field(default_factory=lambda: [])
 
+    @property
+    def sections_by_category(self) -> Dict[str, List[Section]]:
+        """
+        Sections grouped by category, built on the first access and rebuilt when sections are added or
+        removed. Changing the category of a section is not seen until then.
+        """
+        sections = self.sections or []
+        index = _cached_index(self, "_sections_by_category", sections)
+        if index is None:
+            index = {}
+            for section in sections:
+                index.setdefault(section.category, []).append(section)
+            self.__dict__["_sections_by_category"] = (sections, len(sections), index)
+        return index
+
+    def section(self, category: str) -> Optional[Section]:
+        """
+        Return the first section of the category, or None.
+        """
+        sections = self.sections_by_category.get(category)
+        return sections[0] if sections else None
+
 
 @dataclass_json(letter_case=LetterCase.CAMEL)
 @dataclass
@@ -91,4 +153,17 @@ class Extraction:
     receive_from: str
     data: Data
     status: Optional[str] = field(default_factory=lambda: None)
-    tags: Optional[List[str]] = field(default_factory=lambda: [])
\ No newline at end of file
+    tags: Optional[List[str]] = field(default_factory=lambda: [])
+
+    @property
+    def sections_by_category(self) -> Dict[str, List[Section]]:
+        """
+        Sections grouped by category, built on the first access.
+        """
+        return self.data.sections_by_category if self.data else {}
+
+    def section(self, category: str) -> Optional[Section]:
+        """
+        Return the first section of the category, or None.
+        """
+        return self.data.section(category) if self.data else None
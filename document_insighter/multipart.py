@@ -0,0 +1,124 @@
+import hashlib
+import os
+import uuid
+from typing import Callable, Dict, Optional, Tuple, Union
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# (filename, content, content type), like the values of the requests files dict
+Part = Tuple[Optional[str], Union[bytes, str], str]
+
+
+def _quote(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class MultipartEncoder:
+    """
+    A multipart/form-data body which is read in chunks, instead of being built in memory.
+
+    Each part is given like a value of the requests files dict, as (filename, content, content type). The
+    content is bytes or text, except for a part with a filename, where a str content is the path of the file.
+    The files are opened when they are read and closed when they are read completely or when the encoder is
+    closed. The encoder has a length, so requests sends it with a Content-Length header:
+
+        with MultipartEncoder({"files": ("document.pdf", path, "application/octet-stream")}) as body:
+            session.post(url, data=body, headers={"Content-Type": body.content_type})
+    """
+
+    def __init__(
+            self,
+            parts: Dict[str, Part],
+            chunk_size: int = UPLOAD_CHUNK_SIZE,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
+            compute_md5: bool = False,
+            boundary: Optional[str] = None,
+    ):
+        """
+        :param parts: form field name to (filename, content, content type)
+        :param chunk_size: bytes read from a file at a time
+        :param progress_callback: called with the bytes sent and the total bytes after each chunk
+        :param compute_md5: compute the md5 checksum of the file parts while they are sent
+        :param boundary: multipart boundary, random by default
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self._md5 = hashlib.md5() if compute_md5 else None
+        self._segments = []
+        for name, (filename, content, content_type) in parts.items():
+            disposition = f'form-data; name="{_quote(name)}"'
+            if filename is not None:
+                disposition += f'; filename="{_quote(filename)}"'
+            header = (f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+                      f"Content-Type: {content_type}\r\n\r\n").encode()
+            self._segments.append(header)
+            if isinstance(content, str) and filename is None:
+                content = content.encode()
+            self._segments.append(content)
+            self._segments.append(b"\r\n")
+        self._segments.append(f"--{self.boundary}--\r\n".encode())
+        self.length = sum(
+            len(segment) if isinstance(segment, bytes) else os.path.getsize(segment) for segment in self._segments
+        )
+        self.bytes_read = 0
+        self._file = None
+        self._chunks = self._iter_chunks()
+        self._chunk = b""
+        self._offset = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def md5(self) -> Optional[str]:
+        """md5 checksum of the file parts, available once the body is read completely."""
+        if self._md5 is None or self.bytes_read < self.length:
+            return None
+        return self._md5.hexdigest()
+
+    def _iter_chunks(self):
+        for segment in self._segments:
+            if isinstance(segment, bytes):
+                if segment:
+                    yield segment
+                continue
+            with open(segment, "rb") as self._file:
+                for chunk in iter(lambda: self._file.read(self.chunk_size), b""):
+                    if self._md5 is not None:
+                        self._md5.update(chunk)
+                    yield chunk
+            self._file = None
+
+    def read(self, size: int = -1) -> bytes:
+        data = []
+        remaining = size
+        while size < 0 or remaining > 0:
+            if self._offset >= len(self._chunk):
+                self._chunk = next(self._chunks, b"")
+                self._offset = 0
+                if not self._chunk:
+                    break
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._offset + remaining)
+            data.append(self._chunk[self._offset:end])
+            remaining -= end - self._offset
+            self._offset = end
+        data = b"".join(data)
+        if data:
+            self.bytes_read += len(data)
+            if self.progress_callback:
+                self.progress_callback(self.bytes_read, self.length)
+        return data
+
+    def close(self):
+        self._chunks.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
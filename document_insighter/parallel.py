@@ -0,0 +1,85 @@
+"""
+Parallel decoding and transformation of extraction pages in a process pool.
+
+Decoding extractions and flattening their tables is CPU bound Python, one process is capped at one core by the GIL.
+`map_pages` sends each page to a worker process, as the raw json bytes of the response or as a list of dicts, where
+it is parsed, decoded into Extraction objects and passed to a transform. Only the result of the transform is sent
+back, so a transform which reduces the extractions avoids pickling them back to the consumer:
+
+    def out_of_spec(extractions):
+        return [(x.id, column.values) for x in extractions for ...]
+
+    pages = client.query_extractions_pages("NB_COA", start_date, end_date, raw=True)
+    for rows in map_pages(pages, out_of_spec, processes=8):
+        ...
+
+The transform runs in another process, it must be picklable, like a function defined at module level or a
+functools.partial of one.
+"""
+import json
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Generator, Iterable, Optional, Tuple, Union
+
+Page = Union[bytes, str, list]
+
+
+def decode_page(page: Page, transform: Optional[Callable[[list], Any]] = None, decode: bool = True,
+                lazy: Tuple[type, ...] = ()) -> Any:
+    """Parse and decode a page of extractions, and return the result of the transform on its extractions."""
+    if isinstance(page, (bytes, bytearray, str)):
+        page = json.loads(page)
+    if decode:
+        from document_insighter.codec import decoder
+        from document_insighter.model import Extraction
+
+        decode_extraction = decoder(Extraction, lazy)
+        page = [decode_extraction(x) for x in page]
+    return transform(page) if transform is not None else page
+
+
+def map_pages(
+        pages: Iterable[Page],
+        transform: Optional[Callable[[list], Any]] = None,
+        processes: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        decode: bool = True,
+        lazy: Tuple[type, ...] = (),
+        executor: Optional[Executor] = None,
+) -> Generator[Any, None, None]:
+    """
+    Decode and transform pages of extractions in a process pool, and yield the results in page order.
+
+    Pages are read from `pages` only while fewer than `max_pending` results wait to be yielded, so a slow
+    consumer holds back the download instead of buffering the whole query.
+
+    :param pages: pages of extraction dicts, or the raw json bytes of pages like query_extractions_pages(raw=True)
+    :param transform: picklable function called in the worker process with the extractions of a page, the page
+        of extractions is yielded when it is None
+    :param processes: number of worker processes, the number of cpus by default
+    :param max_pending: max number of pages submitted but not yet yielded, 2 * processes by default
+    :param decode: pass Extraction objects to the transform, instead of extraction dicts
+    :param lazy: classes whose lists are decoded lazily, see codec.LAZY_TABLES
+    :param executor: process pool to use instead of a new one, it is not shut down
+    :returns results of the transform in generator, one per page
+    """
+    processes = processes or os.cpu_count() or 1
+    max_pending = max(max_pending or 2 * processes, 1)
+    pool = executor or ProcessPoolExecutor(max_workers=processes)
+    pending = deque()
+    pages = iter(pages)
+    try:
+        while True:
+            for page in pages:
+                pending.append(pool.submit(decode_page, page, transform, decode, tuple(lazy)))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                return
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if executor is None:
+            pool.shutdown(wait=True)
@@ -0,0 +1,170 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from document_insighter.exceptions import ChannelLogTimeoutError
+from document_insighter.metrics import PollEvent
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('COMPLETED', 'FAILED')
+
+
+class _PollingEntry:
+
+    def __init__(self, channel_log_id, deadline, timeout, step, future):
+        self.channel_log_id = channel_log_id
+        self.deadline = deadline
+        self.timeout = timeout
+        self.step = step
+        self.future = future
+        self.last_status = None
+        self.iterations = 0
+        self.started = time.monotonic()
+
+
+class ChannelLogPoller:
+    """
+    Poll the status of many channel logs with one scheduling thread.
+
+    Each channel log is checked with its own adaptive backoff, starting at `initial_step` seconds and
+    growing by `backoff` up to `max_step` seconds, so long-running extractions are polled less often.
+    When a channel log is COMPLETED or FAILED, its future resolves with the result of
+    get_channel_extractions_exporting. When it does not finish before its deadline, the future fails with
+    ChannelLogTimeoutError.
+
+    The status requests run in a small worker pool shared by all channel logs.
+    """
+
+    def __init__(
+            self,
+            client,
+            initial_step: float = 1,
+            max_step: float = 30,
+            backoff: float = 1.5,
+            timeout: float = 600,
+            max_workers: int = 4,
+    ):
+        """
+        :param client: DocumentInsighter client used for the status and extractions requests
+        :param initial_step: seconds before the first status request of a channel log
+        :param max_step: max seconds between two status requests of a channel log
+        :param backoff: multiplier applied to the step after each unfinished status
+        :param timeout: default seconds to wait for a channel log
+        :param max_workers: number of threads sending status requests
+        """
+        self.client = client
+        self.initial_step = initial_step
+        self.max_step = max_step
+        self.backoff = backoff
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="channel-log-poller")
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="channel-log-poller-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(
+            self,
+            channel_log_id,
+            timeout: Optional[float] = None,
+            callback: Optional[Callable[[Future], None]] = None,
+    ) -> Future:
+        """
+        Start tracking a channel log.
+
+        :param channel_log_id: channel log id
+        :param timeout: seconds to wait for the channel log, defaults to the poller timeout
+        :param callback: called with the future when it is done
+        :return: future of the extraction list
+        """
+        timeout = self.timeout if timeout is None else timeout
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        entry = _PollingEntry(channel_log_id, time.monotonic() + timeout, timeout, self.initial_step, future)
+        self._schedule(entry, time.monotonic() + entry.step)
+        return future
+
+    def close(self, wait: bool = True):
+        """Stop the scheduling thread, pending futures are cancelled."""
+        with self._condition:
+            self._closed = True
+            entries, self._queue = self._queue, []
+            self._condition.notify_all()
+        for _, _, entry in entries:
+            entry.future.cancel()
+        if wait:
+            self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _schedule(self, entry, due):
+        with self._condition:
+            if self._closed:
+                entry.future.cancel()
+                return
+            heapq.heappush(self._queue, (due, next(self._counter), entry))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    self._condition.wait(self._queue[0][0] - time.monotonic() if self._queue else None)
+                if self._closed:
+                    return
+                _, _, entry = heapq.heappop(self._queue)
+            if entry.future.cancelled():
+                continue
+            try:
+                self._executor.submit(self._check, entry)
+            except RuntimeError:
+                # the executor is shut down by close(wait=False)
+                entry.future.cancel()
+                return
+
+    def _check(self, entry):
+        try:
+            entry.iterations += 1
+            entry.last_status = self.client.get_channel_log_status(entry.channel_log_id).get("status")
+            if entry.last_status in FINAL_STATUSES:
+                extractions = self.client.get_channel_extractions_exporting(entry.channel_log_id, entry.last_status)
+                self._report(entry)
+                if entry.future.set_running_or_notify_cancel():
+                    entry.future.set_result(extractions)
+                return
+        except Exception as e:
+            self._report(entry)
+            if entry.future.set_running_or_notify_cancel():
+                entry.future.set_exception(e)
+            return
+
+        now = time.monotonic()
+        if now >= entry.deadline:
+            logger.info("Channel log %s timed out in status %s.", entry.channel_log_id, entry.last_status)
+            self._report(entry)
+            if entry.future.set_running_or_notify_cancel():
+                entry.future.set_exception(
+                    ChannelLogTimeoutError(entry.channel_log_id, entry.timeout, entry.last_status)
+                )
+            return
+        entry.step = min(entry.step * self.backoff, self.max_step)
+        self._schedule(entry, min(now + entry.step, entry.deadline))
+
+    def _report(self, entry):
+        instrumentation = getattr(self.client, "instrumentation", None)
+        if instrumentation is not None and instrumentation.enabled:
+            instrumentation.emit(PollEvent(entry.channel_log_id, entry.iterations,
+                                           time.monotonic() - entry.started, entry.last_status))
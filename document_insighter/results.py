@@ -0,0 +1,35 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class UploadResult:
+    """
+    UploadResult model, contains the outcome of one file in a bulk upload.
+    the channel_log is the channel log returned by the upload api when the file was uploaded.
+    the error is the exception raised for this file, like ChannelLogExistsError or requests.HTTPError.
+    """
+    file_path: str
+    channel_log: Optional[dict] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class DuplicateCheck:
+    """
+    DuplicateCheck model, contains the duplicate check result of one file in a batch.
+    the existing_channel_log_uuids are the channel logs which were uploaded with the same md5 checksum.
+    the duplicate_of is the path of an earlier file in the same batch with the same content.
+    """
+    file_path: str
+    md5: str
+    existing_channel_log_uuids: List[str] = field(default_factory=lambda: [])
+    duplicate_of: Optional[str] = None
+
+    @property
+    def is_duplicate(self) -> bool:
+        return bool(self.existing_channel_log_uuids) or self.duplicate_of is not None
@@ -0,0 +1,225 @@
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Generator, List, Optional
+
+from document_insighter.api_client import SEARCH_DATE_FORMAT
+from document_insighter.helpers import date_windows
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    id TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    window_date TEXT NOT NULL,
+    status TEXT,
+    tags TEXT NOT NULL,
+    body TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS extractions_category_window ON extractions (category, window_date);
+CREATE TABLE IF NOT EXISTS synced_windows (
+    category TEXT NOT NULL,
+    tags_key TEXT NOT NULL,
+    window_date TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (category, tags_key, window_date)
+);
+"""
+
+
+def _tags_key(tags):
+    return json.dumps(sorted(tags or []))
+
+
+class ExtractionStore:
+    """
+    Local SQLite store of extractions, keyed by extraction id.
+
+    `sync` downloads extractions one day window at a time and records when each window was synced. A window is
+    closed once it was synced `open_days` days after its end, closed windows are never downloaded again, while
+    open windows are downloaded again on every sync so that changes of status and tags are updated in place.
+    Windows are recorded per category and tags, because a sync with tags only stores the extractions with them.
+    `query` reads the extractions from the store without any request.
+    """
+
+    def __init__(self, path: str, open_days: int = 2):
+        """
+        :param path: path of the SQLite database file, ":memory:" for an in-memory store
+        :param open_days: days after its end that a date window may still change
+        """
+        self.path = path
+        self.open_days = open_days
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def pending_windows(
+            self,
+            category: str,
+            start_date: datetime,
+            end_date: datetime,
+            tags: Optional[List[str]] = None,
+    ) -> List[datetime]:
+        """Return the days in [start_date, end_date) which are not synced or still open."""
+        synced = dict(self.conn.execute(
+            "SELECT window_date, synced_at FROM synced_windows WHERE category = ? AND tags_key = ?",
+            (category, _tags_key(tags)),
+        ))
+        pending = []
+        for day, next_day in date_windows(start_date, end_date, "day"):
+            synced_at = synced.get(day.strftime(SEARCH_DATE_FORMAT))
+            closed_at = (next_day + timedelta(days=self.open_days)).timestamp()
+            if synced_at is None or synced_at < closed_at:
+                pending.append(day)
+        return pending
+
+    def sync(
+            self,
+            client,
+            category: str,
+            tags: Optional[List[str]] = None,
+            start_date: Optional[datetime] = None,
+            end_date: Optional[datetime] = None,
+            page_size: int = 50,
+            max_workers: int = 4,
+    ) -> int:
+        """
+        Download the extractions of the days which are not synced or still open. A day which fails does not stop
+        the other days, they are saved and the first error is raised once every day was downloaded, so that the
+        next sync only downloads the failed days again.
+
+        :param client: DocumentInsighter client
+        :param category: extraction category, like NB_COA
+        :param tags: filter extractions which include any of the tags
+        :param start_date: first day to sync, defaults to the first day synced before for the category and tags
+        :param end_date: end of the sync, exclusive, defaults to tomorrow
+        :param page_size: number of extraction in each page
+        :param max_workers: number of days downloaded at the same time
+        :return: number of extractions downloaded
+        """
+        if start_date is None:
+            first, = self.conn.execute(
+                "SELECT MIN(window_date) FROM synced_windows WHERE category = ? AND tags_key = ?",
+                (category, _tags_key(tags)),
+            ).fetchone()
+            if first is None:
+                raise ValueError(f"start_date is required for the first sync of {category}")
+            start_date = datetime.strptime(first, SEARCH_DATE_FORMAT)
+        if end_date is None:
+            end_date = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+
+        days = self.pending_windows(category, start_date, end_date, tags)
+        logger.info("Syncing %d days of %s extractions.", len(days), category)
+
+        def fetch_day(day):
+            synced_at = time.time()
+            pages = client.query_extractions_pages(category, day, day + timedelta(days=1), page_size=page_size,
+                                                   tags=tags)
+            return synced_at, [extraction for page in pages for extraction in page]
+
+        count = 0
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            futures = {executor.submit(fetch_day, day): day for day in days}
+            for future in as_completed(futures):
+                day = futures[future]
+                try:
+                    synced_at, extractions = future.result()
+                except Exception as e:
+                    logger.warning("Failed to sync %s extractions of %s: %s", category, day.date(), e)
+                    errors.append(e)
+                    continue
+                self._save_window(category, tags, day, synced_at, extractions)
+                count += len(extractions)
+        if errors:
+            logger.warning("%d of %d days of %s extractions failed to sync.", len(errors), len(days), category)
+            raise errors[0]
+        return count
+
+    def _save_window(self, category, tags, day, synced_at, extractions):
+        """Save the extractions of a day and delete the stored ones the sync no longer returned, because they
+        were deleted or, for a sync with tags, lost all of the tags."""
+        window_date = day.strftime(SEARCH_DATE_FORMAT)
+        fresh = {x["id"] for x in extractions}
+        wanted = set(tags or [])
+        with self.conn:
+            stale = [
+                (extraction_id,) for extraction_id, row_tags in self.conn.execute(
+                    "SELECT id, tags FROM extractions WHERE category = ? AND window_date = ?", (category, window_date)
+                )
+                if extraction_id not in fresh and (not wanted or not wanted.isdisjoint(json.loads(row_tags)))
+            ]
+            self.conn.executemany("DELETE FROM extractions WHERE id = ?", stale)
+            self.conn.executemany(
+                """
+                INSERT INTO extractions (id, category, window_date, status, tags, body, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    window_date = excluded.window_date,
+                    status = excluded.status,
+                    tags = excluded.tags,
+                    body = excluded.body,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (x["id"], category, window_date, x.get("status"), json.dumps(x.get("tags") or []),
+                     json.dumps(x), synced_at)
+                    for x in extractions
+                ],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO synced_windows (category, tags_key, window_date, synced_at) VALUES (?, ?, ?, ?)",
+                (category, _tags_key(tags), window_date, synced_at),
+            )
+
+    def query(
+            self,
+            category: str,
+            start_date: datetime,
+            end_date: datetime,
+            tags: Optional[List[str]] = None,
+    ) -> Generator[dict, None, None]:
+        """Query stored extractions by dates, like query_extractions_pages but one extraction at a time.
+
+        Only the days synced without tags, or with tags which include all of `tags`, are read: a day synced for
+        other tags holds a part of the extractions only.
+
+        :param category: extraction category, like NB_COA
+        :param start_date: start date is inclusive.
+        :param end_date: end date is exclusive
+        :param tags: filter extractions which include any of the tags
+        :returns extraction dicts in generator
+        """
+        dates = (category, start_date.strftime(SEARCH_DATE_FORMAT), end_date.strftime(SEARCH_DATE_FORMAT))
+        wanted = set(tags or [])
+        synced = set()
+        for tags_key, window_date in self.conn.execute(
+                "SELECT tags_key, window_date FROM synced_windows"
+                " WHERE category = ? AND window_date >= ? AND window_date < ?",
+                dates,
+        ):
+            synced_tags = set(json.loads(tags_key))
+            if not synced_tags or (wanted and wanted <= synced_tags):
+                synced.add(window_date)
+        rows = self.conn.execute(
+            "SELECT window_date, tags, body FROM extractions"
+            " WHERE category = ? AND window_date >= ? AND window_date < ? ORDER BY window_date, rowid",
+            dates,
+        )
+        for window_date, row_tags, body in rows:
+            if window_date not in synced or (wanted and wanted.isdisjoint(json.loads(row_tags))):
+                continue
+            yield json.loads(body)
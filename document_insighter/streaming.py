@@ -0,0 +1,101 @@
+"""
+Incremental parsing of a JSON array which is read in chunks, like a streamed http response body.
+"""
+import codecs
+import json
+import re
+from typing import Any, Generator, Iterable
+
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+
+class JsonArrayParser:
+    """
+    Parse the elements of a JSON array from chunks of bytes.
+
+    Each element is decoded with the C scanner of json.JSONDecoder.raw_decode as soon as it is complete, so
+    that the buffer holds about one element at a time. An element which is not complete yet is only decoded
+    again once the buffer has doubled, which keeps the parsing linear for elements larger than a chunk.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._pending = []
+        self._pending_size = 0
+        self._started = False
+        self._expect_comma = False
+        self._retry_size = 0
+        self._has_elements = False
+        self.done = False
+
+    def feed(self, chunk: bytes, final: bool = False) -> list:
+        """Add a chunk and return the elements which are complete."""
+        self._pending.append(self._decoder.decode(chunk, final))
+        self._pending_size += len(self._pending[-1])
+        if self._pending_size < self._retry_size and not final:
+            # the incomplete element is not retried before the buffer has doubled
+            return []
+        text = "".join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        elements = []
+        pos = _WHITESPACE.match(text).end()
+        while pos < len(text):
+            if self.done:
+                raise ValueError("Unexpected data after the end of the JSON array")
+            char = text[pos]
+            if not self._started:
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                self._started = True
+                pos += 1
+            elif char == "]":
+                if self._has_elements and not self._expect_comma:
+                    raise ValueError("Trailing comma in JSON array")
+                self.done = True
+                pos += 1
+            elif self._expect_comma:
+                if char != ",":
+                    raise ValueError(f"Expected ',' in JSON array at {char!r}")
+                self._expect_comma = False
+                pos += 1
+            else:
+                if char == ",":
+                    raise ValueError("Empty element in JSON array")
+                try:
+                    element, end = self._json.raw_decode(text, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    # the element is not complete yet
+                    self._retry_size = 2 * (len(text) - pos)
+                    break
+                if end == len(text) and not final:
+                    # a number may continue in the next chunk
+                    break
+                elements.append(element)
+                self._has_elements = True
+                self._expect_comma = True
+                self._retry_size = 0
+                pos = end
+            pos = _WHITESPACE.match(text, pos).end()
+        if pos < len(text):
+            self._pending.append(text[pos:])
+            self._pending_size = len(text) - pos
+        return elements
+
+    def close(self) -> list:
+        """Parse what is left in the buffer and check that the array is complete."""
+        elements = self.feed(b"", final=True)
+        if not self.done:
+            raise ValueError("Incomplete JSON array")
+        return elements
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Generator[Any, None, None]:
+    """Yield the elements of a JSON array read from chunks of bytes."""
+    parser = JsonArrayParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
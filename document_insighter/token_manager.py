@@ -0,0 +1,161 @@
+import contextlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+from document_insighter.helpers import write_json_atomic
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover, not available on windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# seconds between two attempts when a background refresh fails
+REFRESH_RETRY_INTERVAL = 30
+
+
+def _expires_at(token: Optional[dict]) -> float:
+    return float((token or {}).get("expires_at") or 0)
+
+
+class TokenManager:
+    """
+    Holds the OAuth2 token of a client in memory and refreshes it in a background thread before it expires, so
+    that requests do not wait for a refresh.
+
+    The processes which share a token file coordinate their refreshes with an exclusive lock on
+    `<token file>.lock`: the first process refreshes the token and writes it, the others find the new token in
+    the file when they get the lock and adopt it instead of refreshing again.
+    """
+
+    def __init__(
+            self,
+            refresh: Callable[[], dict],
+            token_filename: Optional[str] = None,
+            token: Optional[dict] = None,
+            refresh_margin: float = 300,
+            on_update: Optional[Callable[[dict], None]] = None,
+            background: bool = True,
+    ):
+        """
+        :param refresh: function which requests a new token with the refresh token of the current token
+        :param token_filename: file the token is shared through, the token is only kept in memory when it is None
+        :param token: initial token
+        :param refresh_margin: seconds before expires_at the token is refreshed
+        :param on_update: called with the token when it is refreshed or adopted
+        :param background: refresh the token in a background thread
+        """
+        self._refresh = refresh
+        self.token_filename = token_filename
+        self.refresh_margin = refresh_margin
+        self.on_update = on_update
+        self._token = token
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name="document-insighter-token", daemon=True)
+            self._thread.start()
+
+    @property
+    def token(self) -> Optional[dict]:
+        return self._token
+
+    def _margin(self, token: dict) -> float:
+        # a token which lives less than twice the margin is refreshed at half of its life
+        expires_in = token.get("expires_in")
+        return min(self.refresh_margin, float(expires_in) / 2) if expires_in else self.refresh_margin
+
+    def needs_refresh(self, token: Optional[dict] = None) -> bool:
+        token = token if token is not None else self._token
+        expires_at = _expires_at(token)
+        return bool(expires_at) and expires_at - self._margin(token) < time.time()
+
+    def refresh(self) -> dict:
+        """
+        Refresh the token, unless another process refreshed it meanwhile, in which case its token is adopted.
+
+        :return: the current token
+        """
+        with self._lock, self._file_lock():
+            stored = self._read()
+            if stored and _expires_at(stored) > _expires_at(self._token) and not self.needs_refresh(stored):
+                logger.debug("Adopting the token refreshed by another process.")
+                self._set(stored)
+                return stored
+            logger.debug("Refreshing the token.")
+            token = self._refresh()
+            if self.token_filename:
+                write_json_atomic(self.token_filename, token)
+            self._set(token)
+            return token
+
+    def store(self, token: dict):
+        """Save a token which was fetched or refreshed outside the manager."""
+        with self._lock, self._file_lock():
+            if self.token_filename:
+                write_json_atomic(self.token_filename, token)
+            self._set(token)
+
+    def close(self):
+        """Stop the background refresh."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+
+    def _set(self, token):
+        self._token = token
+        if self.on_update:
+            self.on_update(token)
+        self._wakeup.set()
+
+    def _read(self) -> Optional[dict]:
+        if not self.token_filename:
+            return None
+        try:
+            with open(self.token_filename) as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        if not self.token_filename or fcntl is None:
+            yield
+            return
+        lock_filename = f"{self.token_filename}.lock"
+        os.makedirs(os.path.abspath(os.path.dirname(lock_filename)), exist_ok=True)
+        with open(lock_filename, "a") as fp:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            expires_at = _expires_at(self._token)
+            if not expires_at or not self._token.get("refresh_token"):
+                # nothing to refresh until a token is set
+                self._wakeup.wait()
+                continue
+            # the processes sharing the token file do not all wake up at the same time
+            margin = self._margin(self._token)
+            delay = expires_at - margin - time.time() - random.uniform(0, margin / 4)
+            if delay > 0:
+                self._wakeup.wait(delay)
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Failed to refresh the token: %s", e)
+                self._wakeup.wait(REFRESH_RETRY_INTERVAL)
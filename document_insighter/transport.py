@@ -0,0 +1,93 @@
+import random
+import time
+from dataclasses import dataclass, replace
+from typing import FrozenSet, Optional, Tuple, Union
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+@dataclass
+class TransportPolicy:
+    """
+    TransportPolicy model, contains the connection pool, timeout and retry settings of the client session.
+
+    Requests of the allowed methods are retried on connection errors and on the status codes in
+    status_forcelist, with exponential backoff and full jitter. The Retry-After header of 429 and 503
+    responses is respected. Uploads are POST requests, they are only retried when the connection failed
+    before the request was sent.
+    """
+    pool_connections: int = 10
+    pool_maxsize: int = 10
+    pool_block: bool = False
+    keep_alive: bool = True
+    timeout: Optional[Timeout] = (10, 300)
+    max_retries: int = 3
+    backoff_factor: float = 0.5
+    backoff_max: float = 60
+    status_forcelist: Tuple[int, ...] = (429, 500, 502, 503, 504)
+    allowed_methods: FrozenSet[str] = frozenset(["HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"])
+    respect_retry_after: bool = True
+
+    def with_pool_size(self, pool_maxsize: int) -> "TransportPolicy":
+        return replace(self, pool_maxsize=max(pool_maxsize, self.pool_maxsize))
+
+    def retry(self) -> "JitteredRetry":
+        from document_insighter.adapters import JitteredRetry
+
+        retry = JitteredRetry(
+            total=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.status_forcelist,
+            allowed_methods=self.allowed_methods,
+            respect_retry_after_header=self.respect_retry_after,
+            raise_on_status=False,
+        )
+        retry.backoff_cap = self.backoff_max
+        return retry
+
+    def adapter(self) -> "TimeoutHTTPAdapter":
+        from document_insighter.adapters import TimeoutHTTPAdapter
+
+        return TimeoutHTTPAdapter(
+            timeout=self.timeout,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=self.retry(),
+        )
+
+    def mount(self, session, prefixes=("https://", "http://")):
+        """Mount the adapter of the policy on the session."""
+        for prefix in prefixes:
+            session.mount(prefix, self.adapter())
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before the retry `attempt`, starting at 1, with full jitter."""
+        return random.uniform(0, min(self.backoff_factor * 2 ** (attempt - 1), self.backoff_max))
+
+    def retry_after(self, headers) -> Optional[float]:
+        """Seconds to wait from the Retry-After header, when it is set, respected and valid."""
+        value = headers.get("Retry-After") if self.respect_retry_after else None
+        if not value:
+            return None
+        if value.strip().isdigit():
+            return float(value)
+        import email.utils
+
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            # an invalid date is treated as a missing header
+            return None
+        return max(date.timestamp() - time.time(), 0) if date else None
+
+
+def __getattr__(name):
+    # the adapters import requests and urllib3, they are loaded when the session is configured
+    if name in ("JitteredRetry", "TimeoutHTTPAdapter"):
+        from document_insighter import adapters
+
+        return getattr(adapters, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
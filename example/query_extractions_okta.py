@@ -6,6 +6,7 @@ import argparse
 from datetime import datetime
 
 from document_insighter.api_client import OktaApplicationClient
+from document_insighter.codec import LAZY_TABLES, decoder
 from document_insighter.model import Env, Extraction
 import pandas as pd
 from typing import List, Optional, Generator
@@ -38,7 +39,8 @@ def query_extractions_pages(
         page_size=page_size,
         tags=tags or []
     )
-    return (Extraction.from_dict(x) for page in pages_generator for x in page)
+    decode = decoder(Extraction, lazy=LAZY_TABLES)
+    return (decode(x) for page in pages_generator for x in page)
 
 
 def print_extraction(extraction: Extraction):
@@ -48,27 +50,17 @@ def print_extraction(extraction: Extraction):
     print("Extraction Link", f"https://document-insighter.godeepsite.com/extractions/{extraction.id}/review")
     # print status 
     print("Status:", extraction.status)
-    header_section = next(
-        (section for section in extraction.data.sections if section.category == 'coa_header'),
-        None
-    )
+    header_section = extraction.section('coa_header')
     print("Tags:", extraction.tags)
     if header_section is not None:
-        print("Order #:", next(x for x in header_section.fields if x.name == 'order_number').value)
+        print("Order #:", header_section.field('order_number').value)
 
-    batch_sections = [x for x in extraction.data.sections if x.category == 'coa_batch']
-    for section in batch_sections:
-        batch_number_field = next(
-            (x for x in section.fields if x.name == 'batch_number'),
-            None
-        )
+    for section in extraction.sections_by_category.get('coa_batch', []):
+        batch_number_field = section.field('batch_number')
         if batch_number_field is not None:
             print("Batch #:", batch_number_field.value)
 
-        coa_attributes_table = next(
-            (x for x in section.tables if x.name == 'test_parameters'),
-            None
-        )
+        coa_attributes_table = section.table('test_parameters')
         if coa_attributes_table is not None:
             df = pd.DataFrame(
                 {col: col_obj.values for col, col_obj in coa_attributes_table.columns.items()}
@@ -16,6 +16,14 @@ setup(
         "Bug Tracker": "https://github.com/deepsite/document-insighter-python/issues"
     },
     license="MIT",
-    packages=find_packages(exclude=("tests*",)),
+    packages=find_packages(exclude=("tests*", "benchmarks*")),
     install_requires=["requests==2.31.0", "requests-oauthlib==1.3.1", "dataclasses-json==0.5.7", "polling2==0.5.0"],
+    extras_require={
+        "async": ["httpx>=0.23"],
+        "arrow": ["pyarrow>=8"],
+        "numpy": ["numpy"],
+    },
+    entry_points={
+        "console_scripts": ["document-insighter=document_insighter.cli:main"],
+    },
 )
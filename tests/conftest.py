@@ -0,0 +1,38 @@
+import json
+
+import pytest
+import requests
+
+from document_insighter.api_client import DocumentInsighter
+from document_insighter.model import Env
+
+
+def json_response(body, next_url=None, status_code=200) -> requests.Response:
+    """Return a response with the json body, and a next link to next_url when it is given."""
+    res = requests.Response()
+    res.status_code = status_code
+    res._content = json.dumps(body).encode()
+    if next_url:
+        res.headers["Link"] = f'<{next_url}>; rel="next"'
+    return res
+
+
+@pytest.fixture
+def make_client():
+    """Return a factory of offline clients, each with a fake session, requests.Session() by default."""
+    clients = []
+
+    def make(session=None, tenant=None) -> DocumentInsighter:
+        client = DocumentInsighter(Env.STAGING, None, None, None, None, tenant)
+        client.oauth = session if session is not None else requests.Session()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+@pytest.fixture
+def client(make_client) -> DocumentInsighter:
+    return make_client()
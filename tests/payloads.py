@@ -0,0 +1,54 @@
+"""
+Realistic extraction payloads, shaped like the NB_COA extractions returned by the extraction exporting api.
+"""
+import random
+
+TEST_PARAMETERS = ["Appearance", "Assay", "Moisture", "Ash", "Lead", "Arsenic", "Total Plate Count", "pH"]
+
+
+def make_extraction(index: int, batches: int = 3, rows: int = 12, seed: int = 0) -> dict:
+    rnd = random.Random(seed * 1_000_003 + index)
+    sections = [{
+        "category": "coa_header",
+        "fields": [
+            {"name": "order_number", "value": f"PO-{index:06d}", "standardValue": f"PO{index:06d}"},
+            {"name": "supplier", "value": "Acme Ingredients Co., Ltd.", "standardValue": "ACME"},
+            {"name": "product_name", "value": "Whey Protein Concentrate 80", "standardValue": None},
+            {"name": "issue_date", "value": "2022/03/%02d" % (index % 28 + 1), "standardValue": None},
+        ],
+        "tables": [],
+    }]
+    for batch in range(batches):
+        names = [TEST_PARAMETERS[i % len(TEST_PARAMETERS)] for i in range(rows)]
+        results = ["%.2f" % rnd.uniform(0, 12) for _ in range(rows)]
+        sections.append({
+            "category": "coa_batch",
+            "fields": [
+                {"name": "batch_number", "value": f"B{index:05d}-{batch}", "standardValue": None},
+                {"name": "manufacture_date", "value": "2022-02-%02d" % (batch + 1), "standardValue": None},
+                {"name": "expiry_date", "value": "2024-02-%02d" % (batch + 1)},
+            ],
+            "tables": [{
+                "name": "test_parameters",
+                "columns": {
+                    "name": {"values": names, "standardValues": [x.upper() for x in names]},
+                    "result": {"values": results, "standardValues": results},
+                    "unit": {"values": ["%"] * rows, "standardValues": []},
+                    "specification": {"values": ["<= 10.0"] * rows, "standardValues": ["10.0"] * rows},
+                },
+            }],
+        })
+    return {
+        "id": f"00000000-0000-0000-0000-{index:012d}",
+        "category": "NB_COA",
+        "categoryKey": f"PO-{index:06d}",
+        "receiveDate": "2022-03-%02dT08:00:00Z" % (index % 28 + 1),
+        "receiveFrom": "qa@example.com",
+        "status": rnd.choice(["COMPLETED", "REVIEWED"]),
+        "tags": rnd.sample(["HB_Ops", "NB Stade", "tag1", "tag2"], 2),
+        "data": {"sections": sections},
+    }
+
+
+def make_page(start: int, size: int, **kwargs) -> list:
+    return [make_extraction(i, **kwargs) for i in range(start, start + size)]
@@ -0,0 +1,225 @@
+"""
+A local stub of the Document Insighter api, for offline tests and benchmarks of the client.
+
+It implements the upload, md5 checksum, status, extraction exporting and paginated extraction endpoints, and the
+token endpoint, with configurable latency, error rate and payload sizes:
+
+    with StubServer(StubConfig(latency=0.02, error_rate=0.01)) as server:
+        client = server.client()
+        pages = list(client.query_extractions_pages("NB_COA", start_date, end_date))
+
+The server speaks plain http, so OAUTHLIB_INSECURE_TRANSPORT=1 is set for the OAuth2 session while the server
+runs. oauthlib reads it on each request, and it is restored when the server stops.
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from unittest import mock
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from document_insighter.model import EnvType
+from tests.payloads import make_extraction
+
+ROUTES = [
+    ("POST", re.compile(r"^/oauth2/token$"), "token"),
+    ("POST", re.compile(r"^/api/documents/common/upload$"), "upload"),
+    ("GET", re.compile(r"^/api/document-channel-logs/md5-checksum/(?P<md5>[^/]+)/uuids$"), "md5"),
+    ("GET", re.compile(r"^/api/document-channel-logs/(?P<id>[^/]+)/status$"), "status"),
+    ("GET", re.compile(r"^/api/extraction-exporting/document-channel-logs/(?P<id>[^/]+)/extractions$"),
+     "channel_extractions"),
+    ("GET", re.compile(r"^/api/extraction-exporting/extractions$"), "extractions"),
+]
+
+
+@dataclass
+class StubConfig:
+    """
+    StubConfig model, contains the behaviour of the stub server.
+    """
+    # seconds each request waits before it is answered, plus a random jitter up to latency_jitter
+    latency: float = 0
+    latency_jitter: float = 0
+    # probability that a request is answered with 503 and Retry-After: 0
+    error_rate: float = 0
+    # number of extractions returned by the paginated extraction query
+    extractions: int = 200
+    # size of each extraction, see tests.payloads.make_extraction
+    batches: int = 3
+    rows: int = 12
+    # seconds a channel log is PROCESSING after its upload
+    processing_time: float = 0
+    # md5 checksums reported as already uploaded
+    existing_md5s: Dict[str, List[str]] = field(default_factory=dict)
+    seed: int = 0
+
+
+class StubServer:
+    """
+    Threaded http server which answers like the Document Insighter api, it counts the requests of each endpoint
+    in `requests`, the requests of each X-CURRENT-TENANT in `tenants`, the bytes uploaded in `bytes_received` and
+    the connections opened in `connections`.
+    """
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StubConfig()
+        self.requests = Counter()
+        self.tenants = Counter()
+        self.connections = 0
+        self.bytes_received = 0
+        self.channel_logs = {}
+        self._extractions = {}
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+        self._insecure_transport = mock.patch.dict(os.environ, {"OAUTHLIB_INSECURE_TRANSPORT": "1"})
+        self.url = f"http://{host}:{self._httpd.server_port}"
+        self.env = EnvType(self.url, f"{self.url}/oauth2/token")
+
+    def start(self) -> "StubServer":
+        self._insecure_transport.start()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._insecure_transport.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def token(self, expires_in: int = 3600) -> dict:
+        return {"access_token": "stub", "id_token": "stub", "refresh_token": "stub-refresh", "token_type": "Bearer",
+                "expires_in": expires_in, "expires_at": time.time() + expires_in}
+
+    def client(self, client_class=None, **kwargs):
+        """Return a ServiceAccountClient, or an instance of client_class, connected to the stub."""
+        from document_insighter.api_client import ServiceAccountClient
+
+        client_class = client_class or ServiceAccountClient
+        return client_class(self.env, client_id="stub", client_secret="stub",
+                            token_json=json.dumps(self.token()), tenant="stub", **kwargs)
+
+    def _fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.config.error_rate
+
+    def _delay(self):
+        jitter = self.config.latency_jitter
+        with self._lock:
+            jitter = self._random.uniform(0, jitter) if jitter else 0
+        if self.config.latency + jitter:
+            time.sleep(self.config.latency + jitter)
+
+    def _extraction(self, index):
+        # the payloads are generated once, so that the server does not slow down the client under test
+        extraction = self._extractions.get(index)
+        if extraction is None:
+            config = self.config
+            extraction = make_extraction(index, batches=config.batches, rows=config.rows, seed=config.seed)
+            self._extractions[index] = extraction
+        return extraction
+
+    def handle(self, route, match, query, body):
+        """Return the status, headers and json of a request to a route."""
+        config = self.config
+        if route == "token":
+            return 200, {}, self.token()
+        if route == "upload":
+            log_id = str(uuid.uuid4())
+            log = {"id": log_id, "uuid": log_id, "status": "UPLOADING"}
+            with self._lock:
+                self.channel_logs[log_id] = (time.monotonic(), len(self.channel_logs))
+            return 200, {}, [log]
+        if route == "md5":
+            return 200, {}, config.existing_md5s.get(match["md5"], [])
+        if route in ("status", "channel_extractions"):
+            log = self.channel_logs.get(match["id"])
+            if log is None:
+                return 404, {}, {"title": "Not Found"}
+            processing = time.monotonic() - log[0] < config.processing_time
+            if route == "status":
+                return 200, {}, {"status": "PROCESSING" if processing else "COMPLETED"}
+            return 200, {"ETag": f'"{match["id"]}"'}, [] if processing else [self._extraction(log[1])]
+        # paginated extraction query
+        page = int(query.get("page", ["0"])[0])
+        size = int(query.get("size", ["50"])[0])
+        start = page * size
+        extractions = [self._extraction(i) for i in range(start, min(start + size, config.extractions))]
+        headers = {}
+        if start + size < config.extractions:
+            next_query = {key: values for key, values in query.items() if key != "page"}
+            next_query["page"] = [str(page + 1)]
+            next_url = f"{self.url}/api/extraction-exporting/extractions?{urlencode(next_query, doseq=True)}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return 200, headers, extractions
+
+
+def _handler(server: StubServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with server._lock:
+                server.connections += 1
+
+        def _respond(self):
+            url = urlparse(self.path)
+            body = self._read_body()
+            for method, pattern, route in ROUTES:
+                match = pattern.match(url.path)
+                if match and method == self.command:
+                    break
+            else:
+                return self._send(404, {}, {"title": "Not Found"})
+            with server._lock:
+                server.requests[route] += 1
+                server.tenants[self.headers.get("X-CURRENT-TENANT")] += 1
+                server.bytes_received += len(body)
+            server._delay()
+            if route != "token" and server._fail():
+                return self._send(503, {"Retry-After": "0"}, {"title": "Service Unavailable"})
+            self._send(*server.handle(route, match.groupdict(), parse_qs(url.query), body))
+
+        do_GET = do_POST = _respond
+
+        def _read_body(self) -> bytes:
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().strip(), 16)
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+                    if size == 0:
+                        return b"".join(chunks)
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def _send(self, status, headers, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
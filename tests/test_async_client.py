@@ -0,0 +1,247 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from document_insighter.exceptions import ChannelLogExistsError, ChannelLogTimeoutError
+from document_insighter.model import Env
+
+httpx = pytest.importorskip("httpx")
+
+from document_insighter.async_client import AsyncServiceAccountClient  # noqa: E402
+
+
+class Client(AsyncServiceAccountClient):
+    # the token is refreshed by the requests under test
+    BACKGROUND_TOKEN_REFRESH = False
+
+
+def make_client(tmp_path, handler, expires_at=None):
+    token_filename = tmp_path / "token.json"
+    token_filename.write_text(json.dumps({
+        "access_token": "access",
+        "id_token": "access",
+        "refresh_token": "refresh",
+        "token_type": "Bearer",
+        "expires_at": expires_at or time.time() + 3600,
+    }))
+    client = Client(Env.STAGING, client_id="id", client_secret="secret",
+                    token_filename=str(token_filename), tenant="acme")
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler), headers=dict(client.default_headers))
+    return client
+
+
+def test_query_extractions_pages_follows_next_links(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        page = int(request.url.params.get("page", 0))
+        headers = {}
+        if page < 2:
+            headers["Link"] = f'<http://example.com/api/extraction-exporting/extractions?page={page + 1}>; rel="next"'
+        return httpx.Response(200, json=[{"id": str(page)}], headers=headers)
+
+    async def run():
+        async with make_client(tmp_path, handler) as client:
+            return [page async for page in client.query_extractions_pages(
+                "NB_COA", datetime(2022, 3, 1), datetime(2022, 5, 17))]
+
+    pages = asyncio.run(run())
+    assert pages == [[{"id": "0"}], [{"id": "1"}], [{"id": "2"}]]
+    assert requests[0].headers["Authorization"] == "Bearer access"
+    assert requests[0].headers["X-CURRENT-TENANT"] == "acme"
+    assert requests[1].url.scheme == "https"
+
+
+def test_expired_token_is_refreshed_once(tmp_path):
+    def handler(request):
+        return httpx.Response(200, json={"status": "COMPLETED", "auth": request.headers["Authorization"]})
+
+    client = make_client(tmp_path, handler, expires_at=time.time() - 1)
+    refreshes = []
+
+    def refresh_token(url, auth=None):
+        refreshes.append(url)
+        # OAuth2Session.refresh_token stores the new token on the session
+        client.oauth.token = {"id_token": "refreshed", "refresh_token": "refresh", "token_type": "Bearer",
+                              "expires_at": time.time() + 3600}
+        return client.oauth.token
+
+    client.oauth.refresh_token = refresh_token
+
+    async def run():
+        return await asyncio.gather(*(client.get_channel_log_status(i) for i in range(5)))
+
+    statuses = asyncio.run(run())
+    assert refreshes == [Env.STAGING.service_account_token_url]
+    assert all(status["auth"] == "Bearer refreshed" for status in statuses)
+
+
+def test_upload_document_raises_for_duplicates(tmp_path):
+    document = tmp_path / "document.pdf"
+    document.write_bytes(b"%PDF")
+
+    bodies = []
+
+    async def handler(request):
+        if "md5-checksum" in request.url.path:
+            return httpx.Response(200, json=["existing-uuid"])
+        bodies.append(await request.aread())
+        return httpx.Response(200, json=[{"id": "log"}])
+
+    async def run():
+        client = make_client(tmp_path, handler)
+        with pytest.raises(ChannelLogExistsError):
+            await client.upload_document("BR", str(document))
+        return await client.upload_document("BR", str(document), ignore_duplicate=True)
+
+    assert asyncio.run(run()) == {"id": "log"}
+    assert b"%PDF" in bodies[0] and b'filename="document.pdf"' in bodies[0]
+
+
+def test_get_is_retried_on_retryable_status(tmp_path):
+    statuses = [503, 502, 200]
+
+    def handler(request):
+        return httpx.Response(statuses.pop(0), json={"status": "COMPLETED"}, headers={"Retry-After": "0"})
+
+    async def run():
+        async with make_client(tmp_path, handler) as client:
+            return await client.get_channel_log_status(1)
+
+    assert asyncio.run(run()) == {"status": "COMPLETED"}
+    assert statuses == []
+
+
+def paged_handler(requests=None, pages=3):
+    # each day of the query has `pages` pages of one extraction
+    def handler(request):
+        if requests is not None:
+            requests.append(request)
+        day = request.url.params.get("startDate", "2022-03-01")
+        page = int(request.url.params.get("page", 0))
+        headers = {}
+        if page < pages - 1:
+            headers["Link"] = (f'<https://example.com/api/extraction-exporting/extractions?startDate={day}'
+                               f'&page={page + 1}>; rel="next"')
+        return httpx.Response(200, json=[{"id": f"{day}-{page}"}], headers=headers)
+
+    return handler
+
+
+def test_sharded_query_is_paginated_on_the_event_loop(tmp_path):
+    async def run(ordered):
+        async with make_client(tmp_path, paged_handler()) as client:
+            return [page async for page in client.query_extractions_pages_sharded(
+                "NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 5), max_workers=2, ordered=ordered)]
+
+    expected = [[{"id": f"2022-03-0{day}-{page}"}] for day in range(1, 5) for page in range(3)]
+    assert asyncio.run(run(True)) == expected
+    assert sorted(asyncio.run(run(False)), key=lambda x: x[0]["id"]) == expected
+
+
+def test_closing_a_sharded_query_cancels_its_tasks(tmp_path):
+    async def run():
+        async with make_client(tmp_path, paged_handler()) as client:
+            pages = client.query_extractions_pages_sharded("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 31))
+            first = await pages.__anext__()
+            await pages.aclose()
+            return first, [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    first, tasks = asyncio.run(run())
+    assert first == [{"id": "2022-03-01-0"}]
+    assert tasks == []
+
+
+def test_query_extractions_streams_each_extraction(tmp_path):
+    async def run():
+        async with make_client(tmp_path, paged_handler()) as client:
+            return [x async for x in client.query_extractions("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2),
+                                                              chunk_size=4)]
+
+    assert asyncio.run(run()) == [{"id": f"2022-03-01-{page}"} for page in range(3)]
+
+
+def test_checkpointed_query_is_resumed(tmp_path):
+    checkpoint = str(tmp_path / "export.json")
+
+    async def run(limit=None):
+        async with make_client(tmp_path, paged_handler(pages=5)) as client:
+            pages = []
+            async for page in client.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2),
+                                                             prefetch=2, resume_from=checkpoint):
+                pages.append(page[0]["id"])
+                if len(pages) == limit:
+                    break
+            return pages
+
+    assert asyncio.run(run(limit=2)) == ["2022-03-01-0", "2022-03-01-1"]
+    # the page the consumer stopped at was not acknowledged, it is delivered again
+    assert asyncio.run(run()) == [f"2022-03-01-{page}" for page in range(1, 5)]
+    assert asyncio.run(run()) == []
+
+
+def test_upload_and_poll_times_out_with_channel_log_timeout_error(tmp_path):
+    document = tmp_path / "document.pdf"
+    document.write_bytes(b"%PDF")
+
+    def handler(request):
+        if request.url.path.endswith("/status"):
+            return httpx.Response(200, json={"status": "PROCESSING"})
+        if "md5-checksum" in request.url.path:
+            return httpx.Response(200, json=[])
+        return httpx.Response(200, json=[{"id": "log"}])
+
+    async def run():
+        async with make_client(tmp_path, handler) as client:
+            with pytest.raises(ValueError):
+                await client.upload_and_poll("BR", str(document), poller=object())
+            await client.upload_and_poll("BR", str(document), timeout=0.05, step=0.01)
+
+    with pytest.raises(ChannelLogTimeoutError) as e:
+        asyncio.run(run())
+    assert e.value.channel_log_id == "log"
+    assert e.value.last_status == "PROCESSING"
+
+
+def test_session_is_created_out_of_the_event_loop(tmp_path):
+    threads = []
+    client = make_client(tmp_path, lambda request: httpx.Response(200, json={"status": "COMPLETED"}))
+    create_session = client._create_session
+
+    def record_thread():
+        threads.append(threading.current_thread())
+        return create_session()
+
+    client._create_session = record_thread
+
+    async def run():
+        async with client:
+            return await client.get_channel_log_status(1)
+
+    assert asyncio.run(run()) == {"status": "COMPLETED"}
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+
+
+def test_missing_httpx_raises_an_install_hint(tmp_path, monkeypatch):
+    import document_insighter.async_client as async_client
+
+    client = make_client(tmp_path, lambda request: httpx.Response(200, json={}))
+    client._http = None
+    monkeypatch.setattr(async_client, "httpx", None)
+    with pytest.raises(ImportError, match=r"document-insighter\[async\]"):
+        asyncio.run(client.get_channel_log_status(1))
+
+
+def test_connection_pool_follows_the_transport_policy(tmp_path):
+    from document_insighter.transport import TransportPolicy
+
+    client = Client(Env.STAGING, client_id="id", client_secret="secret", token_filename=str(tmp_path / "token.json"),
+                    tenant="acme", transport=TransportPolicy(pool_maxsize=3, pool_block=True))
+    pool = client._client()._transport._pool
+    assert (pool._max_connections, pool._max_keepalive_connections) == (3, 3)
+    asyncio.run(client.aclose())
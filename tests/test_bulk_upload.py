@@ -0,0 +1,70 @@
+import threading
+import time
+
+from requests.exceptions import HTTPError
+
+from document_insighter.exceptions import ChannelLogExistsError
+from document_insighter.model import Env
+
+
+def test_upload_documents_reports_errors_per_file(client):
+
+    def upload_document(category, file_path, metadata=None, ignore_duplicate=False):
+        if file_path == "duplicate.pdf":
+            raise ChannelLogExistsError("md5", ["uuid"])
+        if file_path == "broken.pdf":
+            raise HTTPError("502 Server Error")
+        return {"id": file_path, "metadata": metadata}
+
+    client.upload_document = upload_document
+    results = list(client.upload_documents(
+        "BR", ["a.pdf", "duplicate.pdf", "broken.pdf", "b.pdf"], metadata_fn=lambda path: {"path": path}
+    ))
+
+    by_path = {result.file_path: result for result in results}
+    assert len(results) == 4
+    assert by_path["a.pdf"].ok and by_path["a.pdf"].channel_log == {"id": "a.pdf", "metadata": {"path": "a.pdf"}}
+    assert isinstance(by_path["duplicate.pdf"].error, ChannelLogExistsError)
+    assert isinstance(by_path["broken.pdf"].error, HTTPError)
+    assert by_path["b.pdf"].ok
+
+
+def test_upload_documents_reports_metadata_errors_per_file(client):
+    client.upload_document = lambda category, file_path, metadata=None, ignore_duplicate=False: {"id": file_path}
+
+    def metadata_fn(file_path):
+        if file_path == "unknown.pdf":
+            raise KeyError(file_path)
+        return {}
+
+    results = {x.file_path: x for x in client.upload_documents("BR", ["a.pdf", "unknown.pdf"], metadata_fn=metadata_fn)}
+    assert results["a.pdf"].ok
+    assert isinstance(results["unknown.pdf"].error, KeyError)
+
+
+def test_upload_documents_limits_in_flight(client):
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def upload_document(category, file_path, metadata=None, ignore_duplicate=False):
+        with lock:
+            active.append(file_path)
+            peak.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.remove(file_path)
+        return {"id": file_path}
+
+    client.upload_document = upload_document
+    paths = [f"{i}.pdf" for i in range(20)]
+    results = list(client.upload_documents("BR", paths, max_workers=8, max_in_flight=3))
+
+    assert sorted(result.file_path for result in results) == sorted(paths)
+    assert max(peak) <= 3
+
+
+def test_upload_documents_enlarges_connection_pool(client):
+    client.upload_document = lambda *args, **kwargs: {}
+    list(client.upload_documents("BR", ["a.pdf"], max_workers=32))
+    assert client.oauth.get_adapter(Env.STAGING.host)._pool_maxsize == 32
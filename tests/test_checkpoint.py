@@ -0,0 +1,86 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from document_insighter.checkpoint import PaginationCheckpoint
+from tests.stub_server import StubConfig, StubServer
+
+START_DATE = datetime(2022, 3, 1)
+END_DATE = datetime(2022, 3, 2)
+
+
+@pytest.fixture
+def server():
+    with StubServer(StubConfig(extractions=95, batches=1, rows=2)) as server:
+        yield server
+
+
+def keys(pages):
+    return [x["categoryKey"] for page in pages for x in page]
+
+
+def test_resume_after_crash_delivers_each_processed_page_once(server, tmp_path):
+    state_path = str(tmp_path / "state" / "export.json")
+    processed = []
+    with server.client() as client:
+        with pytest.raises(RuntimeError):
+            for page in client.query_extractions_pages("NB_COA", START_DATE, END_DATE, page_size=10,
+                                                       checkpoint=state_path):
+                if len(processed) == 4:
+                    raise RuntimeError("crash while processing the fifth page")
+                processed.append(page)
+
+        state = PaginationCheckpoint.load(state_path)
+        assert (state.pages, state.delivered, state.done) == (4, 40, False)
+        requests_before = server.requests["extractions"]
+
+        processed.extend(client.query_extractions_pages("NB_COA", START_DATE, END_DATE, page_size=10,
+                                                        resume_from=state_path))
+        assert server.requests["extractions"] - requests_before == 6
+
+    assert keys(processed) == [f"PO-{i:06d}" for i in range(95)]
+    state = PaginationCheckpoint.load(state_path)
+    assert (state.pages, state.delivered, state.done) == (10, 95, True)
+
+    with server.client() as client:
+        assert list(client.query_extractions_pages("NB_COA", START_DATE, END_DATE, page_size=10,
+                                                   resume_from=state_path)) == []
+
+
+def test_checkpoint_follows_the_consumer_with_prefetch(server, tmp_path):
+    state_path = str(tmp_path / "export.json")
+    with server.client() as client:
+        pages = client.query_extractions_pages("NB_COA", START_DATE, END_DATE, page_size=10, prefetch=4,
+                                               checkpoint=state_path, checkpoint_every=2)
+        next(pages)
+        next(pages)
+        next(pages)
+        assert json.loads(open(state_path).read())["pages"] == 2
+        pages.close()
+
+
+def test_resume_from_another_query_is_refused(server, tmp_path):
+    state_path = str(tmp_path / "export.json")
+    PaginationCheckpoint({"category": "BR", "startDate": "2022-03-01", "endDate": "2022-03-02", "size": 10,
+                          "tags": []}).save(state_path)
+    with server.client() as client:
+        with pytest.raises(ValueError):
+            client.query_extractions_pages("NB_COA", START_DATE, END_DATE, page_size=10, resume_from=state_path)
+
+
+def test_checkpoint_is_saved_after_each_page_and_flushed_every_few(server, tmp_path, monkeypatch):
+    state_path = str(tmp_path / "export.json")
+    fsyncs = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: fsyncs.append(fd) or fsync(fd))
+    with server.client() as client:
+        pages = client.query_extractions_pages("NB_COA", START_DATE, END_DATE, page_size=10,
+                                               checkpoint=state_path, checkpoint_every=4)
+        for _ in range(6):
+            next(pages)
+        # a resumed query starts at the page the consumer was processing, whatever checkpoint_every is
+        assert PaginationCheckpoint.load(state_path).pages == 5
+        assert len(fsyncs) == 1
+        pages.close()
@@ -0,0 +1,69 @@
+import copy
+import warnings
+
+import pytest
+
+from document_insighter.codec import LAZY_TABLES, LazyList, from_dict, to_dict
+from document_insighter.model import Column, Extraction, Field, Section, Table
+from tests.payloads import make_extraction
+
+
+@pytest.mark.parametrize("index", range(5))
+def test_decode_matches_dataclasses_json(index):
+    payload = make_extraction(index)
+    extraction = from_dict(Extraction, payload)
+    expected = Extraction.from_dict(payload)
+    assert extraction == expected
+    assert to_dict(extraction) == expected.to_dict()
+
+
+def test_decode_defaults_and_snake_case_keys():
+    payload = {
+        "id": "1",
+        "category": "NB_COA",
+        "category_key": "PO-1",
+        "receiveDate": "2022-03-01",
+        "receive_from": "qa@example.com",
+        "data": {"sections": [{"category": "coa_header"}, {"category": "coa_batch", "fields": None}]},
+    }
+    extraction = from_dict(Extraction, payload)
+    assert extraction == Extraction.from_dict(payload)
+    assert extraction.tags == [] and extraction.status is None
+    assert extraction.data.sections[0].tables == []
+    # default factories are not shared between instances
+    assert extraction.tags is not from_dict(Extraction, payload).tags
+
+
+def test_decode_copies_lists_and_keeps_instances():
+    values = ["1", "2"]
+    column = from_dict(Column, {"values": values})
+    assert column.values == values and column.values is not values
+
+    table = Table("test_parameters", {"result": column})
+    assert from_dict(Table, table) is table
+    assert from_dict(Section, {"category": "coa_batch", "tables": [table]}).tables[0] is table
+
+
+def test_decode_missing_required_field():
+    with pytest.raises(KeyError):
+        from_dict(Field, {"value": "1"})
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        with pytest.raises(KeyError):
+            Field.from_dict({"value": "1"})
+
+
+def test_lazy_tables_are_decoded_on_access():
+    payload = make_extraction(0, batches=3)
+    extraction = from_dict(Extraction, payload, lazy=LAZY_TABLES)
+    tables = extraction.section("coa_batch").tables
+
+    assert isinstance(tables, LazyList)
+    assert all(type(x) is dict for x in list.__iter__(tables))
+    assert extraction.section("coa_batch").table("test_parameters").columns["result"].values
+    assert type(list.__getitem__(tables, 0)) is Table
+
+    # equality, encoding and copies decode every table
+    assert extraction == Extraction.from_dict(payload)
+    assert to_dict(from_dict(Extraction, payload, lazy=LAZY_TABLES)) == Extraction.from_dict(payload).to_dict()
+    assert type(copy.deepcopy(tables)) is list
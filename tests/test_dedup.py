@@ -0,0 +1,87 @@
+import time
+
+import pytest
+import requests
+
+from document_insighter.dedup import DedupIndex
+from document_insighter.helpers import md5_checksum
+from tests.conftest import json_response
+
+
+class DedupSession(requests.Session):
+
+    def __init__(self, existing):
+        super().__init__()
+        self.existing = existing
+        self.checked = []
+        self.uploaded = 0
+
+    def get(self, url, **kwargs):
+        md5 = url.split("/")[-2]
+        self.checked.append(md5)
+        return json_response(self.existing.get(md5, []))
+
+    def post(self, url, data=None, **kwargs):
+        self.uploaded += 1
+        data.read()
+        return json_response([{"id": f"log-{self.uploaded}"}])
+
+
+@pytest.fixture
+def dedup_client(make_client):
+    def make(existing=None):
+        client = make_client(DedupSession(existing or {}))
+        client.dedup_index = DedupIndex()
+        return client
+
+    return make
+
+
+def test_dedup_index_expires_and_evicts():
+    index = DedupIndex(ttl=60, negative_ttl=0.01, max_entries=2)
+    index.put("a", ["uuid-a"])
+    index.put("b", [])
+    assert index.get("a") == ["uuid-a"]
+    assert index.get("b") == []
+    time.sleep(0.02)
+    assert index.get("b") is None
+
+    index.put("c", ["uuid-c"])
+    index.get("a")
+    index.put("d", ["uuid-d"])
+    # c is the least recently used
+    assert index.get("c") is None
+    assert index.get("a") == ["uuid-a"]
+
+    index.add("a", "uuid-a2")
+    assert index.get("a") == ["uuid-a", "uuid-a2"]
+
+
+def test_check_duplicates_in_batch_and_on_server(tmp_path, dedup_client):
+    paths = {}
+    for name, content in [("a.pdf", b"same"), ("b.pdf", b"same"), ("c.pdf", b"other"), ("d.pdf", b"uploaded")]:
+        paths[name] = str(tmp_path / name)
+        (tmp_path / name).write_bytes(content)
+    uploaded_md5 = md5_checksum(paths["d.pdf"])
+    client = dedup_client({uploaded_md5: ["uuid-d"]})
+
+    checks = client.check_duplicates([paths[x] for x in ("a.pdf", "b.pdf", "c.pdf", "d.pdf")])
+
+    assert [check.is_duplicate for check in checks] == [False, True, False, True]
+    assert checks[1].duplicate_of == paths["a.pdf"]
+    assert checks[3].existing_channel_log_uuids == ["uuid-d"]
+    # one request for each distinct md5
+    assert len(client.oauth.checked) == 3
+
+    client.check_duplicates([paths["c.pdf"], paths["d.pdf"]])
+    assert len(client.oauth.checked) == 3
+
+
+def test_upload_document_uses_and_fills_dedup_index(tmp_path, dedup_client):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"content")
+    client = dedup_client()
+
+    assert client.upload_document("BR", str(path)) == {"id": "log-1"}
+    assert client.dedup_index.get(md5_checksum(str(path))) == ["log-1"]
+    assert len(client.oauth.checked) == 1
@@ -0,0 +1,68 @@
+import pytest
+
+from document_insighter.codec import from_dict
+from document_insighter.export import iter_column_batches, iter_numpy_batches, write_arrow_ipc, write_parquet
+from document_insighter.model import Extraction
+from tests.payloads import make_extraction, make_page
+
+
+def collect(pages, chunk_size):
+    result = {"fields": {}, "tables": {}}
+    batches = []
+    for kind, columns in iter_column_batches(pages, chunk_size):
+        batches.append((kind, len(columns["extraction_id"])))
+        for name, values in columns.items():
+            result[kind].setdefault(name, []).extend(values)
+    return result, batches
+
+
+def test_column_batches_are_long_and_bounded():
+    pages = [make_page(0, 3, batches=2, rows=4), make_page(3, 2, batches=2, rows=4)]
+    result, batches = collect(pages, chunk_size=50)
+
+    # 4 header fields and 2 batch sections of 3 fields per extraction
+    assert len(result["fields"]["extraction_id"]) == 5 * (4 + 2 * 3)
+    # 2 tables of 4 columns and 4 rows per extraction
+    assert len(result["tables"]["extraction_id"]) == 5 * 2 * 4 * 4
+    # a chunk is flushed once it reaches the chunk size, so it never grows past one extraction more
+    assert all(size < 50 + 2 * 4 * 4 for _, size in batches)
+
+    tables = result["tables"]
+    first = make_extraction(0, batches=2, rows=4)["data"]["sections"][1]["tables"][0]["columns"]
+    rows = [i for i, name in enumerate(tables["column_name"]) if name == "unit"][:4]
+    assert [tables["value"][i] for i in rows] == first["unit"]["values"]
+    # missing standard values are exported as None
+    assert [tables["standard_value"][i] for i in rows] == [None] * 4
+    assert [tables["row_index"][i] for i in rows] == [0, 1, 2, 3]
+    assert {tables["section_category"][i] for i in rows} == {"coa_batch"}
+
+
+def test_column_batches_accept_extraction_objects():
+    page = make_page(0, 2)
+    assert collect([page], 1000)[0] == collect([[from_dict(Extraction, x) for x in page]], 1000)[0]
+
+
+def test_numpy_batches():
+    np = pytest.importorskip("numpy")
+    batches = dict(iter_numpy_batches([make_page(0, 2, batches=1, rows=3)]))
+    assert batches["tables"]["row_index"].dtype == np.int32
+    assert batches["fields"]["field_name"].dtype == object
+
+
+@pytest.mark.parametrize("write", [write_parquet, write_arrow_ipc])
+def test_write_arrow_files(tmp_path, write):
+    pa = pytest.importorskip("pyarrow")
+    fields_path, tables_path = str(tmp_path / "fields"), str(tmp_path / "tables")
+    pages = [make_page(i * 4, 4, batches=2, rows=5) for i in range(3)]
+
+    field_rows, table_rows = write(pages, fields_path, tables_path, chunk_size=100)
+
+    if write is write_parquet:
+        import pyarrow.parquet as pq
+        fields, tables = pq.read_table(fields_path), pq.read_table(tables_path)
+        assert pq.ParquetFile(tables_path).num_row_groups > 1
+    else:
+        fields = pa.ipc.open_file(fields_path).read_all()
+        tables = pa.ipc.open_file(tables_path).read_all()
+    assert (fields.num_rows, tables.num_rows) == (field_rows, table_rows) == (12 * 10, 12 * 2 * 4 * 5)
+    assert tables.schema.field("row_index").type == pa.int32()
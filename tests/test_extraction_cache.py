@@ -0,0 +1,123 @@
+import json
+
+import pytest
+import requests
+
+from document_insighter.extraction_cache import ExtractionCache
+
+
+class ExtractionsSession(requests.Session):
+
+    def __init__(self, extractions, etag=None):
+        super().__init__()
+        self.extractions = extractions
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append({k: v for k, v in (headers or {}).items() if k != "X-CURRENT-TENANT"})
+        res = requests.Response()
+        res.headers["ETag"] = self.etag
+        if self.etag and (headers or {}).get("If-None-Match") == self.etag:
+            res.status_code = 304
+            res._content = b""
+        else:
+            res.status_code = 200
+            res._content = json.dumps(self.extractions).encode()
+        return res
+
+
+@pytest.fixture
+def cached_client(make_client):
+    def make(session, cache, tenant="acme"):
+        client = make_client(session, tenant)
+        client.extraction_cache = cache
+        return client
+
+    return make
+
+
+def test_repeat_reads_are_served_from_cache(cached_client):
+    session = ExtractionsSession([{"id": "1", "status": "COMPLETED"}])
+    client = cached_client(session, ExtractionCache())
+    first = client.get_channel_extractions_exporting("log", "COMPLETED")
+    first[0]["id"] = "changed"
+    assert client.get_channel_extractions_exporting("log", "COMPLETED") == [{"id": "1", "status": "COMPLETED"}]
+    assert len(session.requests) == 1
+
+
+def test_stale_entry_is_revalidated_with_etag(cached_client):
+    session = ExtractionsSession([{"id": "1"}], etag='"v1"')
+    client = cached_client(session, ExtractionCache(max_age=0))
+    assert client.get_channel_extractions_exporting("log", "COMPLETED") == [{"id": "1"}]
+    assert client.get_channel_extractions_exporting("log", "COMPLETED") == [{"id": "1"}]
+    assert session.requests == [{}, {"If-None-Match": '"v1"'}]
+
+    session.etag = '"v2"'
+    session.extractions = [{"id": "2"}]
+    assert client.get_channel_extractions_exporting("log", "COMPLETED") == [{"id": "2"}]
+    assert client.extraction_cache.get("acme", "log").etag == '"v2"'
+
+
+def test_pending_extractions_are_not_cached(cached_client):
+    session = ExtractionsSession([])
+    client = cached_client(session, ExtractionCache())
+    client.get_channel_extractions_exporting("log", "COMPLETED")
+    session.extractions = [{"id": "1", "status": "PROCESSING"}]
+    client.get_channel_extractions_exporting("log", "COMPLETED")
+    assert len(client.extraction_cache) == 0
+    assert len(session.requests) == 2
+
+
+def test_extractions_are_only_cached_once_the_channel_log_is_completed(cached_client):
+    session = ExtractionsSession([{"id": "1", "status": "REVIEWED"}])
+    client = cached_client(session, ExtractionCache())
+    client.get_channel_extractions_exporting("log")
+    client.get_channel_extractions_exporting("log", "PROCESSING")
+    client.get_channel_extractions_exporting("log", "FAILED")
+    assert len(client.extraction_cache) == 0
+    client.get_channel_extractions_exporting("log", "COMPLETED")
+    assert client.extraction_cache.get("acme", "log") is not None
+
+
+def test_entries_are_keyed_by_tenant_and_invalidated(cached_client):
+    cache = ExtractionCache()
+    session = ExtractionsSession([{"id": "1"}])
+    cached_client(session, cache, "acme").get_channel_extractions_exporting("log", "COMPLETED")
+    cached_client(session, cache, "other").get_channel_extractions_exporting("log", "COMPLETED")
+    assert len(session.requests) == 2
+
+    cache.invalidate("acme", "log")
+    assert cache.get("acme", "log") is None
+    assert cache.get("other", "log") is not None
+    cache.invalidate()
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_memory_tier_is_limited_by_entries_and_bytes():
+    cache = ExtractionCache(max_entries=3, max_bytes=100)
+    for i in range(5):
+        cache.put("acme", i, b"x" * 10)
+    assert len(cache) == 3 and cache.get("acme", 0) is None
+
+    cache.get("acme", 2)
+    cache.put("acme", "large", b"x" * 80)
+    assert [key[1] for key in cache._entries] == ["4", "2", "large"]
+    assert cache.size == 100
+    cache.put("acme", "too large", b"x" * 101)
+    assert cache.get("acme", "too large") is None
+
+
+def test_disk_tier_is_compressed_and_shared(tmp_path):
+    path = str(tmp_path / "cache" / "extractions.db")
+    body = json.dumps([{"id": "1", "text": "a" * 10000}]).encode()
+    with ExtractionCache(path=path) as cache:
+        cache.put("acme", "log", body, '"v1"')
+
+    with ExtractionCache(path=path, max_bytes=0) as cache:
+        entry = cache.get("acme", "log")
+        assert (entry.body, entry.etag) == (body, '"v1"')
+        stored = cache._conn.execute("SELECT length(body) FROM cached_extractions").fetchone()[0]
+        assert stored < len(body) / 10
+        cache.invalidate("acme")
+        assert cache.get("acme", "log") is None
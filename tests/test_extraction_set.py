@@ -0,0 +1,91 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from document_insighter.codec import from_dict  # noqa: E402
+from document_insighter.extraction_set import ExtractionSet, group_by  # noqa: E402
+from document_insighter.model import Extraction  # noqa: E402
+from tests.payloads import make_page  # noqa: E402
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+@pytest.fixture
+def page():
+    page = make_page(0, 20, batches=2, rows=5)
+    page[3]["category"] = "BR"
+    page[4]["tags"] = ["urgent"]
+    return page
+
+
+def test_table_query_matches_nested_loops(page):
+    expected = []
+    for x in map(lambda d: from_dict(Extraction, d), page):
+        if x.category != "NB_COA":
+            continue
+        for section in x.sections_by_category.get("coa_batch", []):
+            table = section.table("test_parameters")
+            columns = table.columns
+            for row, (name, result) in enumerate(zip(columns["name"].values, columns["result"].values)):
+                if number(result) > number(columns["specification"].standard_values[row]):
+                    expected.append((x.id, row, name))
+
+    rows = ExtractionSet.from_pages([page]).table("test_parameters", section_category="coa_batch",
+                                                  category="NB_COA")
+    out = rows.filter(rows.numbers("result") > rows.numbers("specification", standard=True))
+
+    assert expected
+    assert list(zip(out.extraction_ids, out.rows, out.values("name"))) == expected
+    # the unit column has no standard values
+    assert set(rows.values("unit", standard=True)) == {None}
+    assert np.isnan(rows.numbers("missing")).all()
+
+
+def test_fields_indexes_and_group_by(page):
+    extractions = ExtractionSet(from_dict(Extraction, x) for x in page)
+
+    batches = extractions.fields("batch_number", tag="urgent")
+    assert list(batches.values()) == [f"B00004-{i}" for i in range(2)]
+    assert list(batches.sections) == [1, 2]
+    assert len(extractions.fields("order_number", category="BR")) == 1
+    assert len(extractions.fields("unknown")) == 0
+    assert extractions.select(category="NB_COA").sum() == 19
+    assert extractions.select(tag="HB_Ops", status="REVIEWED").sum() == \
+        sum(1 for x in page if "HB_Ops" in x["tags"] and x["status"] == "REVIEWED")
+    assert list(extractions.names(extractions.categories[:5])) == ["NB_COA"] * 3 + ["BR", "NB_COA"]
+
+    rows = extractions.table("test_parameters")
+    names, means = group_by(rows.values("name"), rows.numbers("result"), "mean")
+    for name, mean in zip(names, means):
+        results = [number(v) for x in page for s in x["data"]["sections"] for t in s["tables"]
+                   for n, v in zip(t["columns"]["name"]["values"], t["columns"]["result"]["values"]) if n == name]
+        assert mean == pytest.approx(np.nanmean(results))
+    categories, counts = group_by(rows.categories)
+    assert dict(zip(categories, counts)) == {"BR": 10, "NB_COA": 190}
+    assert list(group_by(np.array([1, 1, 2]), np.array([3.0, np.nan, 4.0]), "max")[1]) == [3.0, 4.0]
+    with pytest.raises(ValueError):
+        group_by(names, func="median")
+
+
+def test_group_by_groups_missing_keys_last(page):
+    page[0]["data"]["sections"][1]["tables"][0]["columns"]["name"]["values"].pop()
+    page[1]["data"]["sections"][1]["fields"][0]["value"] = None
+    extractions = ExtractionSet(page)
+
+    rows = extractions.table("test_parameters")
+    names, counts = group_by(rows.values("name"))
+    assert names[-1] is None and counts[-1] == 1
+    assert counts.sum() == len(rows)
+    assert list(names[:-1]) == sorted(set(rows.values("name")) - {None})
+
+    batches = extractions.fields("batch_number")
+    values, counts = group_by(batches.values(), np.ones(len(batches)), "sum")
+    assert values[-1] is None and counts[-1] == 1.0
+    assert len(values) == len(batches)
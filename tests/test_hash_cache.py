@@ -0,0 +1,40 @@
+import hashlib
+import os
+
+from document_insighter import hash_cache as hash_cache_module
+from document_insighter.hash_cache import FileHashCache
+from document_insighter.helpers import md5_checksum
+
+
+def test_md5_checksum_in_chunks(tmp_path):
+    data = os.urandom(10 * 1024 + 7)
+    path = tmp_path / "document.pdf"
+    path.write_bytes(data)
+    assert md5_checksum(str(path), chunk_size=1024) == hashlib.md5(data).hexdigest()
+    assert md5_checksum(str(path)) == hashlib.md5(data).hexdigest()
+
+
+def test_file_hash_cache_skips_unchanged_files(tmp_path, monkeypatch):
+    path = tmp_path / "document.pdf"
+    path.write_bytes(b"first")
+    hashed = []
+
+    def counting_md5_checksum(file_path):
+        hashed.append(file_path)
+        return md5_checksum(file_path)
+
+    monkeypatch.setattr(hash_cache_module, "md5_checksum", counting_md5_checksum)
+
+    with FileHashCache(str(tmp_path / "cache" / "hashes.db")) as cache:
+        assert cache.md5(str(path)) == hashlib.md5(b"first").hexdigest()
+        assert cache.md5(str(path)) == hashlib.md5(b"first").hexdigest()
+        assert len(hashed) == 1
+
+        path.write_bytes(b"second file")
+        assert cache.md5(str(path)) == hashlib.md5(b"second file").hexdigest()
+        assert len(hashed) == 2
+
+    # the cache is persisted
+    with FileHashCache(str(tmp_path / "cache" / "hashes.db")) as cache:
+        assert cache.md5(str(path)) == hashlib.md5(b"second file").hexdigest()
+        assert len(hashed) == 2
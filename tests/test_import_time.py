@@ -0,0 +1,33 @@
+import json
+import subprocess
+import sys
+
+LAZY_MODULES = ["requests", "urllib3", "requests_oauthlib", "oauthlib", "polling2", "dataclasses_json",
+                "marshmallow"]
+
+
+def loaded_modules(script):
+    script += "\nprint(json.dumps(sorted({name.split('.')[0] for name in sys.modules} & set(sys.argv[1:]))))"
+    res = subprocess.run([sys.executable, "-c", "import json, sys\n" + script, *LAZY_MODULES],
+                         capture_output=True, text=True, check=True)
+    return json.loads(res.stdout)
+
+
+def test_client_is_imported_and_constructed_without_heavy_dependencies():
+    assert loaded_modules("""
+from document_insighter.api_client import OktaApplicationClient, ServiceAccountClient
+from document_insighter.env import Env
+ServiceAccountClient(Env.STAGING, client_id="id", client_secret="secret", token_json='{"access_token": "a"}')
+OktaApplicationClient(Env.STAGING, idp_id="idp", client_id="id", client_secret="secret")
+""") == []
+
+
+def test_session_is_created_on_first_use():
+    assert loaded_modules("""
+from document_insighter.api_client import ServiceAccountClient
+from document_insighter.env import Env
+client = ServiceAccountClient(Env.STAGING, token_json='{"access_token": "a"}', tenant="acme")
+assert client.oauth is client.oauth and client.oauth.access_token == "a"
+assert client.oauth.headers["X-CURRENT-TENANT"] == "acme" and client.token_manager is not None
+client.close()
+""") == ["oauthlib", "requests", "requests_oauthlib", "urllib3"]
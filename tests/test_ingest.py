@@ -0,0 +1,158 @@
+import hashlib
+import json
+
+import pytest
+
+from document_insighter import cli
+from document_insighter.hash_cache import FileHashCache
+from document_insighter.ingest import (
+    DONE,
+    DUPLICATE,
+    FAILED,
+    UPLOADED,
+    UPLOADING,
+    DirectoryIngestor,
+    IngestManifest,
+)
+from tests.stub_server import StubConfig, StubServer
+
+
+@pytest.fixture
+def server():
+    existing = hashlib.md5(b"%PDF already uploaded").hexdigest()
+    config = StubConfig(batches=1, rows=2, processing_time=0.05, existing_md5s={existing: ["existing-log"]})
+    with StubServer(config) as server:
+        yield server
+
+
+@pytest.fixture
+def drop(tmp_path):
+    directory = tmp_path / "drop"
+    (directory / "2024" / "05").mkdir(parents=True)
+    for i in range(6):
+        (directory / "2024" / "05" / f"scan-{i}.pdf").write_bytes(f"%PDF {i}".encode())
+    (directory / "copy-of-scan-0.pdf").write_bytes(b"%PDF 0")
+    (directory / "old.pdf").write_bytes(b"%PDF already uploaded")
+    (directory / "notes.txt").write_text("not a document")
+    return directory
+
+
+def ingest(client, drop, tmp_path, **kwargs):
+    with IngestManifest(str(tmp_path / "out" / "manifest.db")) as manifest:
+        ingestor = DirectoryIngestor(client, "BR", manifest, output=str(tmp_path / "out"), patterns=["*.pdf"],
+                                     poll_workers=2, poll_step=0.02, **kwargs)
+        return ingestor.run(str(drop)), manifest.entries()
+
+
+def test_ingest_uploads_polls_and_writes_extractions(server, drop, tmp_path):
+    with server.client() as client:
+        outcomes, entries = ingest(client, drop, tmp_path, upload_workers=4)
+
+    assert outcomes == {"done": 6, "duplicate": 2}
+    assert server.requests["upload"] == 6
+    copies = {entries["copy-of-scan-0.pdf"].duplicate_of, entries["2024/05/scan-0.pdf"].duplicate_of}
+    assert copies in ({None, "copy-of-scan-0.pdf"}, {None, "2024/05/scan-0.pdf"})
+    assert entries["old.pdf"].channel_log_id == "existing-log"
+    assert "notes.txt" not in entries
+    done = [entry for entry in entries.values() if entry.state == DONE]
+    assert len(done) == 6
+    for entry in done:
+        assert json.loads(open(entry.output).read())[0]["categoryKey"].startswith("PO-")
+    assert (tmp_path / "out" / "2024" / "05" / "scan-3.pdf.json").exists()
+
+
+def test_rerun_skips_done_files_and_resumes_uploaded_ones(server, drop, tmp_path):
+    with server.client() as client:
+        outcomes, entries = ingest(client, drop, tmp_path, wait=False)
+        assert outcomes == {"uploaded": 6, "duplicate": 2}
+        assert {entry.state for entry in entries.values()} == {UPLOADED, DUPLICATE}
+
+        # a crash while polling: the files are polled again, not uploaded again
+        outcomes, entries = ingest(client, drop, tmp_path)
+        assert outcomes == {"done": 6, "skipped": 2}
+        assert server.requests["upload"] == 6
+
+        (drop / "2024" / "05" / "scan-1.pdf").write_bytes(b"%PDF 1 changed")
+        outcomes, _ = ingest(client, drop, tmp_path)
+        assert outcomes == {"done": 1, "skipped": 7}
+        assert server.requests["upload"] == 7
+
+
+def test_failed_uploads_are_retried_by_the_next_run(server, drop, tmp_path):
+    with server.client() as client:
+        upload_document = client.upload_document
+
+        def failing_upload(category, path, *args, **kwargs):
+            if path.endswith("scan-2.pdf"):
+                raise OSError("disk error")
+            return upload_document(category, path, *args, **kwargs)
+
+        client.upload_document = failing_upload
+        outcomes, entries = ingest(client, drop, tmp_path)
+        assert outcomes == {"done": 5, "duplicate": 2, "failed": 1}
+        assert entries["2024/05/scan-2.pdf"].state == FAILED
+
+        client.upload_document = upload_document
+        outcomes, entries = ingest(client, drop, tmp_path)
+        assert outcomes == {"done": 1, "skipped": 7}
+        assert entries["2024/05/scan-2.pdf"].state == DONE
+
+
+def test_cli_ingest(server, drop, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(cli, "make_client", lambda args: server.client())
+    output = tmp_path / "extractions"
+
+    assert cli.main(["ingest", str(drop), "--category", "BR", "--output", str(output), "--pattern", "*.pdf",
+                     "--workers", "2"]) == 0
+    assert "This run: done 6, duplicate 2, uploaded 0, failed 0, skipped 0" in capsys.readouterr().out
+    assert (output / "manifest.db").exists()
+    assert len(list(output.rglob("*.pdf.json"))) == 6
+
+
+def test_errors_not_handled_by_a_stage_fail_the_file(server, drop, tmp_path):
+    with server.client() as client:
+        upload_document = client.upload_document
+        client.upload_document = lambda category, path, *args, **kwargs: \
+            None if path.endswith("scan-4.pdf") else upload_document(category, path, *args, **kwargs)
+        outcomes, entries = ingest(client, drop, tmp_path, upload_workers=1)
+
+    assert outcomes == {"done": 5, "duplicate": 2, "failed": 1}
+    assert "no channel log" in entries["2024/05/scan-4.pdf"].error
+
+
+def test_upload_interrupted_before_it_was_recorded_is_polled(server, drop, tmp_path):
+    with server.client() as client:
+        ingest(client, drop, tmp_path, wait=False)
+        # the run stopped after the upload request, before the channel log was recorded
+        with IngestManifest(str(tmp_path / "out" / "manifest.db")) as manifest:
+            entry = manifest.get("2024/05/scan-5.pdf")
+            server.config.existing_md5s[entry.md5] = [entry.channel_log_id]
+            manifest.update(entry, UPLOADING, channel_log_id=None)
+
+        outcomes, entries = ingest(client, drop, tmp_path)
+
+    assert outcomes == {"done": 6, "skipped": 2}
+    assert server.requests["upload"] == 6
+    assert entries["2024/05/scan-5.pdf"].state == DONE
+
+
+def test_copies_of_a_failed_file_are_ingested_again(server, drop, tmp_path):
+    with server.client() as client:
+        client.hash_cache = FileHashCache(str(tmp_path / "hashes.db"))
+        upload_document = client.upload_document
+
+        def failing_upload(category, path, *args, **kwargs):
+            if path.endswith("scan-0.pdf"):
+                raise OSError("disk error")
+            return upload_document(category, path, *args, **kwargs)
+
+        client.upload_document = failing_upload
+        ingest(client, drop, tmp_path, upload_workers=1)
+        client.upload_document = upload_document
+        ingest(client, drop, tmp_path)
+        _, entries = ingest(client, drop, tmp_path)
+
+    copies = [entries["2024/05/scan-0.pdf"], entries["copy-of-scan-0.pdf"]]
+    assert sorted(entry.state for entry in copies) == [DONE, DUPLICATE]
+    assert all(entries[entry.duplicate_of].state == DONE for entry in copies if entry.duplicate_of)
+    assert client.hash_cache._conn.execute("SELECT COUNT(*) FROM file_hashes").fetchone()[0] == 8
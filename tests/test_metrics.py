@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+
+from document_insighter.metrics import (
+    Histogram,
+    MetricsCollector,
+    PollEvent,
+    RequestEvent,
+    TokenRefreshEvent,
+    endpoint_name,
+)
+from document_insighter.poller import ChannelLogPoller
+from document_insighter.transport import TransportPolicy
+from tests.stub_server import StubConfig, StubServer
+
+
+@pytest.fixture
+def server():
+    with StubServer(StubConfig(extractions=30, batches=1, rows=2)) as server:
+        yield server
+
+
+def test_requests_token_refresh_and_polls_are_reported(server, tmp_path):
+    server.config.error_rate = 0.5
+    document = tmp_path / "document.pdf"
+    document.write_bytes(b"%PDF" * 100)
+    events = []
+    with server.client(transport=TransportPolicy(max_retries=10, backoff_factor=0.001)) as client:
+        client.instrumentation.add_listener(events.append)
+        list(client.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2), page_size=10))
+        server.config.error_rate = 0
+        log = client.upload_document("NB_COA", str(document), ignore_duplicate=True)
+        with ChannelLogPoller(client, initial_step=0.01) as poller:
+            poller.submit(log["id"]).result(timeout=10)
+        client._refresh_access_token()
+
+    requests = [event for event in events if isinstance(event, RequestEvent)]
+    pages = [event for event in requests if event.endpoint == "extractions"]
+    assert [event.status for event in pages] == [200, 200, 200]
+    assert sum(event.retries for event in pages) == server.requests["extractions"] - 3
+    assert all(event.bytes_received > 0 and event.elapsed > 0 for event in pages)
+
+    upload = next(event for event in requests if event.endpoint == "upload")
+    assert (upload.method, upload.status) == ("POST", 200)
+    assert upload.bytes_sent > 400
+
+    polls = [event for event in events if isinstance(event, PollEvent)]
+    assert len(polls) == 1 and polls[0].iterations == 1 and polls[0].status == "COMPLETED"
+    assert len([event for event in events if isinstance(event, TokenRefreshEvent)]) == 1
+    assert any(event.endpoint == "token" for event in requests)
+
+
+def test_no_events_without_listeners(server):
+    with server.client() as client:
+        calls = []
+        client.instrumentation.emit = calls.append
+        list(client.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2)))
+    assert calls == []
+
+
+def test_collector_snapshot_and_prometheus():
+    collector = MetricsCollector()
+    collector(RequestEvent("extractions", "GET", 200, 0.02, 0, 1000, retries=1))
+    collector(RequestEvent("extractions", "GET", 503, 0.2, 0, 10))
+    collector(TokenRefreshEvent(0.3))
+    collector(PollEvent("log", 3, 2.0, "COMPLETED"))
+
+    snapshot = collector.snapshot()
+    extractions = snapshot["endpoints"]["extractions"]
+    assert extractions["statuses"] == {"200": 1, "503": 1}
+    assert (extractions["bytes_received"], extractions["retries"]) == (1010, 1)
+    assert extractions["latency"]["count"] == 2 and extractions["latency"]["p50"] == 0.025
+    assert snapshot["token_refresh"]["count"] == 1 and snapshot["poll_iterations"]["sum"] == 3
+
+    text = collector.prometheus()
+    assert 'document_insighter_request_duration_seconds_bucket{endpoint="extractions",le="0.025"} 1' in text
+    assert 'document_insighter_request_duration_seconds_bucket{endpoint="extractions",le="+Inf"} 2' in text
+    assert 'document_insighter_requests_total{endpoint="extractions",status="503"} 1' in text
+    assert "document_insighter_poll_iterations_count 1" in text
+
+
+def test_histogram_and_endpoint_names():
+    histogram = Histogram((1, 2))
+    for value in (0.5, 1, 1.5, 3):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.quantile(0.5) == 1 and histogram.quantile(1) == float("inf")
+    assert endpoint_name("https://host/api/document-channel-logs/123/status") == "channel_log_status"
+    assert endpoint_name("https://host/api/document-channel-logs/md5-checksum/abc/uuids") == "md5_uuids"
+    assert endpoint_name("https://host/oauth2/token") == "token"
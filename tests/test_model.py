@@ -0,0 +1,50 @@
+from document_insighter.codec import from_dict
+from document_insighter.model import Extraction, Field, Section, Table
+from tests.payloads import make_extraction
+
+
+def test_sections_by_category():
+    extraction = from_dict(Extraction, make_extraction(0, batches=3))
+    assert [x.category for x in extraction.sections_by_category["coa_batch"]] == ["coa_batch"] * 3
+    assert extraction.section("coa_header") is extraction.data.sections[0]
+    assert extraction.section("coa_footer") is None
+
+
+def test_field_and_table_lookup():
+    section = Section("coa_batch", fields=[Field("batch_number", "B1"), Field("batch_number", "B2")],
+                      tables=[Table("test_parameters", {})])
+    assert section.field("batch_number").value == "B1"
+    assert section.field("expiry_date") is None
+    assert section.table("test_parameters") is section.tables[0]
+    assert section.table("other") is None
+
+
+def test_lookup_index_is_rebuilt_when_items_move():
+    section = Section("coa_batch", fields=[Field("a", "1"), Field("b", "2")])
+    assert section.field("b").value == "2"
+    section.fields.insert(0, Field("c", "3"))
+    assert section.field("b").value == "2"
+
+
+def test_indexes_are_rebuilt_when_items_are_added_or_replaced():
+    section = Section("coa_batch", fields=[Field("a", "1")])
+    assert section.field("b") is None
+    section.fields.append(Field("b", "2"))
+    assert section.field("b").value == "2"
+    section.fields = [Field("c", "3")]
+    assert section.field("c").value == "3"
+
+    extraction = from_dict(Extraction, make_extraction(0, batches=1))
+    assert extraction.section("coa_extra") is None
+    extraction.data.sections.append(Section("coa_extra"))
+    assert extraction.section("coa_extra") is extraction.data.sections[-1]
+    extraction.data.sections = []
+    assert extraction.sections_by_category == {}
+
+
+def test_index_is_not_part_of_the_model():
+    section = Section("coa_batch", fields=[Field("a", "1")])
+    section.field("a")
+    assert section == Section("coa_batch", fields=[Field("a", "1")])
+    assert section.to_dict() == {"category": "coa_batch", "fields": [{"name": "a", "value": "1", "standardValue": None}],
+                                 "tables": []}
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+
+import requests
+from urllib3.filepost import encode_multipart_formdata
+
+from document_insighter.dedup import DedupIndex
+from document_insighter.multipart import MultipartEncoder
+from tests.conftest import json_response
+
+
+def test_encoder_matches_requests_multipart_body(tmp_path):
+    data = os.urandom(100 * 1024 + 3)
+    path = tmp_path / "document.pdf"
+    path.write_bytes(data)
+    fields = json.dumps([{"source": "test"}])
+
+    progress = []
+    with MultipartEncoder({
+        "fields": (None, fields, "application/json"),
+        "files": ("document.pdf", str(path), "application/octet-stream"),
+    }, chunk_size=4096, boundary="boundary", compute_md5=True,
+            progress_callback=lambda sent, total: progress.append((sent, total))) as body:
+        chunks = iter(lambda: body.read(8192), b"")
+        encoded = b"".join(chunks)
+        expected, content_type = encode_multipart_formdata({
+            "fields": (None, fields, "application/json"),
+            "files": ("document.pdf", data, "application/octet-stream"),
+        }, boundary="boundary")
+        assert encoded == expected
+        assert body.content_type == content_type
+        assert len(body) == len(expected)
+        assert body.md5 == hashlib.md5(data).hexdigest()
+    assert progress[-1] == (len(expected), len(expected))
+    assert all(sent <= total for sent, total in progress)
+
+
+def test_encoder_closes_the_file_when_closed_early(tmp_path):
+    path = tmp_path / "document.pdf"
+    path.write_bytes(b"x" * 10000)
+    body = MultipartEncoder({"files": ("document.pdf", str(path), "application/octet-stream")}, chunk_size=100)
+    body.read(500)
+    file = body._file
+    assert not file.closed
+    body.close()
+    assert file.closed
+    assert body.md5 is None
+
+
+class UploadSession(requests.Session):
+
+    def post(self, url, data=None, headers=None, **kwargs):
+        self.body = data.read()
+        self.content_type = headers["Content-Type"]
+        return json_response([{"id": "log"}])
+
+
+def test_upload_document_streams_file_and_records_md5(tmp_path, make_client):
+    path = tmp_path / "document.pdf"
+    path.write_bytes(b"%PDF-1.4 content")
+    client = make_client(UploadSession())
+    client.dedup_index = DedupIndex()
+    progress = []
+
+    log = client.upload_document("BR", str(path), {"a": 1}, ignore_duplicate=True,
+                                 progress_callback=lambda sent, total: progress.append(sent))
+
+    assert log == {"id": "log"}
+    assert b"%PDF-1.4 content" in client.oauth.body
+    assert client.oauth.content_type.startswith("multipart/form-data; boundary=")
+    assert progress[-1] == len(client.oauth.body)
+    assert client.dedup_index.get(hashlib.md5(b"%PDF-1.4 content").hexdigest()) == ["log"]
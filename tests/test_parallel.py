@@ -0,0 +1,67 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from document_insighter.codec import LAZY_TABLES
+from document_insighter.model import Extraction
+from document_insighter.parallel import decode_page, map_pages
+from tests.payloads import make_page
+from tests.stub_server import StubConfig, StubServer
+
+
+def batch_numbers(extractions):
+    return [(x.category_key, x.section("coa_batch").field("batch_number").value) for x in extractions]
+
+
+def fail_on_third_page(extractions):
+    if extractions[0]["categoryKey"] == "PO-000020":
+        raise ValueError("bad page")
+    return len(extractions)
+
+
+def test_results_are_yielded_in_page_order():
+    pages = [make_page(start, 10, batches=1, rows=2) for start in range(0, 100, 10)]
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        results = list(map_pages(pages, batch_numbers, max_pending=4, executor=executor))
+        extractions = list(map_pages([json.dumps(page).encode() for page in pages], lazy=LAZY_TABLES,
+                                     executor=executor))
+
+    assert results == [batch_numbers(decode_page(page)) for page in pages]
+    assert [x.category_key for page in extractions for x in page] == [f"PO-{i:06d}" for i in range(100)]
+    assert isinstance(extractions[0][0], Extraction)
+
+
+def test_pages_are_read_ahead_up_to_max_pending():
+    read = []
+
+    def pages():
+        for start in range(0, 100, 10):
+            read.append(start)
+            yield make_page(start, 10, batches=1, rows=2)
+
+    results = map_pages(pages(), len, processes=2, max_pending=3, decode=False)
+    assert next(results) == 10
+    assert len(read) == 3
+    results.close()
+
+
+def test_transform_errors_are_raised_at_their_page():
+    pages = [make_page(start, 10, batches=1, rows=2) for start in range(0, 50, 10)]
+    results = map_pages(pages, fail_on_third_page, processes=2, decode=False)
+    assert [next(results), next(results)] == [10, 10]
+    with pytest.raises(ValueError, match="bad page"):
+        next(results)
+
+
+def test_raw_pages_of_a_query():
+    with StubServer(StubConfig(extractions=45, batches=1, rows=2)) as server, server.client() as client:
+        pages = client.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2), page_size=10,
+                                               raw=True)
+        results = list(map_pages(pages, batch_numbers, processes=2))
+        with pytest.raises(ValueError):
+            client.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2), raw=True,
+                                           checkpoint="export.json")
+
+    assert [key for page in results for key, _ in page] == [f"PO-{i:06d}" for i in range(45)]
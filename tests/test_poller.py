@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from document_insighter.exceptions import ChannelLogTimeoutError
+from document_insighter.poller import ChannelLogPoller
+
+
+class FakeClient:
+
+    def __init__(self, statuses):
+        self.statuses = {log_id: list(values) for log_id, values in statuses.items()}
+        self.status_requests = []
+        self.lock = threading.Lock()
+
+    def get_channel_log_status(self, channel_log_id):
+        with self.lock:
+            self.status_requests.append(channel_log_id)
+            values = self.statuses[channel_log_id]
+            return {"status": values.pop(0) if len(values) > 1 else values[0]}
+
+    def get_channel_extractions_exporting(self, channel_log_id, status=None):
+        return [{"id": f"extraction-{channel_log_id}"}]
+
+
+def test_poller_resolves_many_channel_logs():
+    client = FakeClient({
+        "a": ["PROCESSING", "COMPLETED"],
+        "b": ["UPLOADING", "PROCESSING", "PROCESSING", "FAILED"],
+        "c": ["COMPLETED"],
+    })
+    done = []
+    with ChannelLogPoller(client, initial_step=0.01, max_step=0.02) as poller:
+        futures = {log_id: poller.submit(log_id, callback=done.append) for log_id in "abc"}
+        results = {log_id: future.result(timeout=5) for log_id, future in futures.items()}
+
+    assert results == {log_id: [{"id": f"extraction-{log_id}"}] for log_id in "abc"}
+    assert len(done) == 3
+    assert client.status_requests.count("a") == 2
+    assert client.status_requests.count("b") == 4
+    assert client.status_requests.count("c") == 1
+
+
+def test_poller_backs_off_and_times_out():
+    client = FakeClient({"slow": ["PROCESSING"]})
+    with ChannelLogPoller(client, initial_step=0.01, max_step=0.05, backoff=2) as poller:
+        future = poller.submit("slow", timeout=0.3)
+        with pytest.raises(ChannelLogTimeoutError) as e:
+            future.result(timeout=5)
+
+    assert e.value.last_status == "PROCESSING"
+    # 0.01, 0.02, 0.04 and then at most every 0.05 seconds
+    assert len(client.status_requests) <= 10
+
+
+def test_poller_propagates_request_errors():
+    class BrokenClient(FakeClient):
+        def get_channel_log_status(self, channel_log_id):
+            raise ConnectionError("boom")
+
+    with ChannelLogPoller(BrokenClient({}), initial_step=0.01) as poller:
+        with pytest.raises(ConnectionError):
+            poller.submit("a").result(timeout=5)
@@ -0,0 +1,77 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+import requests
+
+from document_insighter.helpers import read_ahead
+from tests.conftest import json_response
+
+
+class PagesSession(requests.Session):
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url, params=None, **kwargs):
+        page = params["page"] if params else int(url.rsplit("=", 1)[1])
+        self.requested.append(page)
+        next_url = f"https://example.com/extractions?page={page + 1}" if page + 1 < self.pages else None
+        return json_response([{"id": str(page)}], next_url)
+
+
+def test_read_ahead_keeps_order_and_buffers_at_most_depth():
+    produced = []
+
+    def numbers():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    items = read_ahead(numbers(), 2)
+    assert next(items) == 0
+    time.sleep(0.05)
+    # one item is consumed, two are buffered and one is blocked on the full buffer
+    assert len(produced) <= 4
+    assert list(items) == list(range(1, 10))
+
+
+def test_read_ahead_raises_errors_in_position():
+    def numbers():
+        yield 1
+        yield 2
+        raise requests.HTTPError("502 Server Error")
+
+    items = read_ahead(numbers(), 5)
+    assert next(items) == 1
+    assert next(items) == 2
+    with pytest.raises(requests.HTTPError):
+        next(items)
+
+
+def test_read_ahead_close_stops_producer():
+    stopped = threading.Event()
+
+    def numbers():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            stopped.set()
+
+    items = read_ahead(numbers(), 1)
+    next(items)
+    items.close()
+    assert stopped.wait(1)
+
+
+def test_query_extractions_pages_with_prefetch(make_client):
+    client = make_client(PagesSession(5))
+    pages = client.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 5, 17), prefetch=2)
+    assert [page[0]["id"] for page in pages] == ["0", "1", "2", "3", "4"]
+    assert client.oauth.requested == [0, 1, 2, 3, 4]
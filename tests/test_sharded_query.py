@@ -0,0 +1,83 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+from document_insighter.helpers import date_windows
+
+
+@pytest.fixture
+def client(make_client):
+    client = make_client()
+
+    def query_extractions_pages(category, start_date, end_date, page_size=50, tags=None):
+        for page in range(3):
+            time.sleep(random.random() / 100)
+            if start_date == datetime(2022, 3, 4) and page == 1:
+                raise requests.HTTPError("502 Server Error")
+            yield [{"date": start_date.strftime("%Y-%m-%d"), "page": page}]
+
+    client.query_extractions_pages = query_extractions_pages
+    return client
+
+
+def test_date_windows():
+    assert date_windows(datetime(2022, 3, 1), datetime(2022, 3, 10), "week") == [
+        (datetime(2022, 3, 1), datetime(2022, 3, 8)),
+        (datetime(2022, 3, 8), datetime(2022, 3, 10)),
+    ]
+    assert len(date_windows(datetime(2022, 3, 1), datetime(2022, 4, 1), timedelta(days=2))) == 16
+    with pytest.raises(ValueError):
+        date_windows(datetime(2022, 3, 1), datetime(2022, 4, 1), timedelta(hours=12))
+
+
+def test_sharded_pages_are_ordered(client):
+    pages = list(client.query_extractions_pages_sharded(
+        "NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 4), max_workers=3
+    ))
+    assert pages == [
+        [{"date": f"2022-03-0{day}", "page": page}] for day in (1, 2, 3) for page in range(3)
+    ]
+
+
+def test_sharded_pages_unordered_yields_every_page(client):
+    pages = list(client.query_extractions_pages_sharded(
+        "NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 4), max_workers=3, ordered=False
+    ))
+    assert sorted(page[0]["date"] + str(page[0]["page"]) for page in pages) == [
+        f"2022-03-0{day}{page}" for day in (1, 2, 3) for page in range(3)
+    ]
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_sharded_pages_raise_shard_errors(ordered, client):
+    with pytest.raises(requests.HTTPError):
+        list(client.query_extractions_pages_sharded(
+            "NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 10), max_workers=2, ordered=ordered
+        ))
+
+
+def test_ordered_shards_are_streamed_and_stopped_on_close(make_client):
+    client = make_client()
+    fetched = []
+
+    def query_extractions_pages(category, start_date, end_date, page_size=50, tags=None):
+        for page in range(100):
+            fetched.append((start_date, page))
+            yield [{"date": start_date.strftime("%Y-%m-%d"), "page": page}]
+
+    client.query_extractions_pages = query_extractions_pages
+    pages = client.query_extractions_pages_sharded("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 31),
+                                                   max_workers=3)
+    assert next(pages) == [{"date": "2022-03-01", "page": 0}]
+    time.sleep(0.2)
+    # each shard reads only a few pages ahead of the consumer instead of buffering all of them
+    assert len(fetched) <= 3 * 4
+    start = time.perf_counter()
+    pages.close()
+    assert time.perf_counter() - start < 1
+    count = len(fetched)
+    time.sleep(0.2)
+    assert len(fetched) == count
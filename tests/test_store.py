@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from document_insighter.store import ExtractionStore
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.requested = []
+        self.statuses = {}
+
+    def query_extractions_pages(self, category, start_date, end_date, page_size=50, tags=None):
+        self.requested.append(start_date)
+        day = start_date.strftime("%Y-%m-%d")
+        extraction_id = f"{category}-{day}"
+        yield [{"id": extraction_id, "category": category, "status": self.statuses.get(extraction_id, "PROCESSING"),
+                "tags": ["HB_Ops"] if start_date.day % 2 else ["other"]}]
+
+
+def test_sync_downloads_only_pending_windows():
+    client = FakeClient()
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    start_date = today - timedelta(days=10)
+
+    with ExtractionStore(":memory:", open_days=2) as store:
+        assert store.sync(client, "NB_COA", start_date=start_date) == 11
+        assert len(client.requested) == 11
+
+        client.requested.clear()
+        client.statuses[f"NB_COA-{today.strftime('%Y-%m-%d')}"] = "COMPLETED"
+        store.sync(client, "NB_COA")
+        # only the days which may still change are downloaded again
+        assert client.requested == [today - timedelta(days=2), today - timedelta(days=1), today]
+
+        stored = list(store.query("NB_COA", start_date, today + timedelta(days=1)))
+        assert len(stored) == 11
+        assert stored[-1]["status"] == "COMPLETED"
+
+
+def test_query_filters_by_dates_and_tags():
+    client = FakeClient()
+    with ExtractionStore(":memory:") as store:
+        store.sync(client, "NB_COA", start_date=datetime(2022, 3, 1), end_date=datetime(2022, 3, 11))
+        assert [x["id"] for x in store.query("NB_COA", datetime(2022, 3, 3), datetime(2022, 3, 6), tags=["HB_Ops"])] \
+            == ["NB_COA-2022-03-03", "NB_COA-2022-03-05"]
+        assert list(store.query("COA", datetime(2022, 3, 1), datetime(2022, 3, 11))) == []
+
+
+def test_first_sync_requires_start_date():
+    with ExtractionStore(":memory:") as store:
+        with pytest.raises(ValueError):
+            store.sync(FakeClient(), "NB_COA")
+
+
+def test_tagged_sync_does_not_complete_untagged_queries():
+    client = FakeClient()
+    with ExtractionStore(":memory:") as store:
+        store.sync(client, "NB_COA", tags=["HB_Ops"], start_date=datetime(2022, 3, 1), end_date=datetime(2022, 3, 5))
+        assert [x["id"] for x in store.query("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 5), tags=["HB_Ops"])] \
+            == ["NB_COA-2022-03-01", "NB_COA-2022-03-03"]
+        # the days were only synced for HB_Ops, they do not answer other queries
+        assert list(store.query("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 5))) == []
+        assert list(store.query("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 5), tags=["other"])) == []
+
+        client.requested.clear()
+        store.sync(client, "NB_COA", start_date=datetime(2022, 3, 1), end_date=datetime(2022, 3, 5))
+        assert len(client.requested) == 4
+        assert len(list(store.query("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 5)))) == 4
+
+
+def test_failed_day_does_not_discard_the_other_days():
+    client = FakeClient()
+    query_extractions_pages = client.query_extractions_pages
+
+    def failing_query(category, start_date, end_date, page_size=50, tags=None):
+        if start_date == datetime(2022, 3, 2):
+            raise ConnectionError("reset")
+        return query_extractions_pages(category, start_date, end_date, page_size, tags)
+
+    client.query_extractions_pages = failing_query
+    with ExtractionStore(":memory:") as store:
+        with pytest.raises(ConnectionError):
+            store.sync(client, "NB_COA", start_date=datetime(2022, 3, 1), end_date=datetime(2022, 3, 5))
+        assert [x["id"] for x in store.query("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 5))] \
+            == ["NB_COA-2022-03-01", "NB_COA-2022-03-03", "NB_COA-2022-03-04"]
+        assert store.pending_windows("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 5)) == [datetime(2022, 3, 2)]
+
+
+def test_extractions_which_drop_out_of_an_open_window_are_deleted():
+    client = FakeClient()
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    query_extractions_pages = client.query_extractions_pages
+    extra = [{"id": "retagged", "category": "NB_COA", "status": "COMPLETED", "tags": ["HB_Ops"]},
+             {"id": "other-tag", "category": "NB_COA", "status": "COMPLETED", "tags": ["other"]}]
+
+    def query(category, start_date, end_date, page_size=50, tags=None):
+        for page in query_extractions_pages(category, start_date, end_date, page_size, tags):
+            yield page + [x for x in extra if not tags or set(tags) & set(x["tags"])]
+
+    client.query_extractions_pages = query
+    with ExtractionStore(":memory:") as store:
+        store.sync(client, "NB_COA", start_date=today, end_date=today + timedelta(days=1))
+        store.sync(client, "NB_COA", tags=["HB_Ops"], start_date=today, end_date=today + timedelta(days=1))
+        ids = {x["id"] for x in store.query("NB_COA", today, today + timedelta(days=1))}
+        assert {"retagged", "other-tag"} <= ids
+
+        # the extraction loses its tag, a sync with the tag no longer returns it
+        extra[0]["tags"] = ["other"]
+        store.sync(client, "NB_COA", tags=["HB_Ops"])
+        assert "retagged" not in {x["id"] for x in store.query("NB_COA", today, today + timedelta(days=1),
+                                                               tags=["HB_Ops"])}
+        # the rows without the tag of the sync are left to the untagged sync
+        assert "other-tag" in {x["id"] for x in store.query("NB_COA", today, today + timedelta(days=1))}
+
+        del extra[:]
+        store.sync(client, "NB_COA")
+        assert [x["id"] for x in store.query("NB_COA", today, today + timedelta(days=1))] \
+            == [f"NB_COA-{today.strftime('%Y-%m-%d')}"]
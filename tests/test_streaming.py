@@ -0,0 +1,98 @@
+import json
+from datetime import datetime
+
+import pytest
+import requests
+
+from document_insighter.model import Extraction
+from document_insighter.streaming import JsonArrayParser, iter_json_array
+from tests.payloads import make_page
+
+ELEMENTS = [
+    {"id": "1", "value": "quote \" backslash \\ bracket ] brace } comma ,", "nested": [[1, 2], {"a": []}]},
+    "café 中文",
+    12.5,
+    None,
+    [],
+    {"escaped": "\\\\\""},
+]
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_iter_json_array_any_chunk_size(size):
+    data = json.dumps(ELEMENTS, ensure_ascii=False, indent=2).encode()
+    assert list(iter_json_array(chunked(data, size))) == ELEMENTS
+
+
+def test_parser_keeps_about_one_element_in_buffer():
+    page = make_page(0, 50)
+    data = json.dumps(page).encode()
+    parser = JsonArrayParser()
+    largest = 0
+    parsed = []
+    for chunk in chunked(data, 1024):
+        parsed.extend(parser.feed(chunk))
+        largest = max(largest, parser._pending_size)
+    parsed.extend(parser.close())
+    assert parsed == page
+    # an incomplete element is buffered until the buffer doubles
+    assert largest < 2 * max(len(json.dumps(x)) for x in page) + 1024
+
+
+def test_numbers_split_across_chunks():
+    assert list(iter_json_array([b"[1, 2", b"3, 4", b"5]"])) == [1, 23, 45]
+
+
+@pytest.mark.parametrize("data", [b"", b"[1, 2", b'{"a": 1}', b"[1,,2]", b"[1,]", b"[1] 2", b'[{"a": 1'])
+def test_iter_json_array_rejects_invalid_arrays(data):
+    with pytest.raises(ValueError):
+        list(iter_json_array([data]))
+
+
+class StreamingSession(requests.Session):
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+        self.streamed = []
+
+    def get(self, url, params=None, stream=False, **kwargs):
+        page = params["page"] if params else int(url.rsplit("=", 1)[1])
+        self.streamed.append(stream)
+        res = requests.Response()
+        res.status_code = 200
+        res.raw = _Raw(json.dumps(self.pages[page]).encode())
+        if page + 1 < len(self.pages):
+            res.headers["Link"] = f'<http://example.com/extractions?page={page + 1}>; rel="next"'
+        return res
+
+
+class _Raw:
+
+    def __init__(self, data):
+        self.chunks = chunked(data, 100)
+
+    def stream(self, chunk_size, decode_content=True):
+        yield from self.chunks
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+def test_query_extractions_streams_each_page(make_client):
+    pages = [make_page(0, 3), make_page(3, 2)]
+    client = make_client(StreamingSession(pages))
+
+    extractions = list(client.query_extractions("NB_COA", datetime(2022, 3, 1), datetime(2022, 5, 17)))
+    assert extractions == pages[0] + pages[1]
+    assert client.oauth.streamed == [True, True]
+
+    decoded = list(client.query_extractions("NB_COA", datetime(2022, 3, 1), datetime(2022, 5, 17), decode=True))
+    assert decoded == [Extraction.from_dict(x) for x in pages[0] + pages[1]]
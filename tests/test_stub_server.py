@@ -0,0 +1,73 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from document_insighter.exceptions import ChannelLogTimeoutError
+from document_insighter.poller import ChannelLogPoller
+from document_insighter.transport import TransportPolicy
+from tests.stub_server import StubConfig, StubServer
+
+FAST = TransportPolicy(max_retries=10, backoff_factor=0.001)
+
+
+@pytest.fixture
+def server():
+    with StubServer(StubConfig(extractions=120, batches=1, rows=2)) as server:
+        yield server
+
+
+def test_pagination_follows_next_links_through_errors(server):
+    server.config.error_rate = 0.5
+    with server.client(transport=FAST) as client:
+        pages = list(client.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2),
+                                                    page_size=50))
+    assert [len(page) for page in pages] == [50, 50, 20]
+    assert [x["categoryKey"] for page in pages for x in page] == [f"PO-{i:06d}" for i in range(120)]
+    assert server.requests["extractions"] > 3
+
+
+def test_streamed_query_matches_pages(server):
+    with server.client() as client:
+        extractions = list(client.query_extractions("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2),
+                                                    page_size=50, decode=True))
+    assert [x.category_key for x in extractions] == [f"PO-{i:06d}" for i in range(120)]
+
+
+def test_upload_and_poll(server, tmp_path):
+    server.config.processing_time = 0.2
+    files = []
+    for i in range(4):
+        files.append(tmp_path / f"document-{i}.pdf")
+        files[-1].write_bytes(b"%PDF" * (i + 1))
+
+    with server.client() as client, ChannelLogPoller(client, initial_step=0.05) as poller:
+        results = list(client.upload_documents("NB_COA", map(str, files), max_workers=2))
+        assert all(result.ok for result in results)
+        futures = [poller.submit(result.channel_log["id"]) for result in results]
+        extractions = [future.result(timeout=10) for future in futures]
+
+    assert all(len(x) == 1 for x in extractions)
+    assert server.requests["upload"] == 4 and server.requests["md5"] == 4
+    assert server.requests["status"] >= 4
+    assert server.bytes_received > sum(file.stat().st_size for file in files)
+
+
+def test_insecure_transport_is_only_allowed_while_the_server_runs(monkeypatch):
+    monkeypatch.delenv("OAUTHLIB_INSECURE_TRANSPORT", raising=False)
+    with StubServer(StubConfig(extractions=1)) as server:
+        assert os.environ["OAUTHLIB_INSECURE_TRANSPORT"] == "1"
+        with server.client() as client:
+            list(client.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2)))
+    assert "OAUTHLIB_INSECURE_TRANSPORT" not in os.environ
+
+
+def test_upload_and_poll_times_out_with_channel_log_timeout_error(server, tmp_path):
+    server.config.processing_time = 10
+    document = tmp_path / "document.pdf"
+    document.write_bytes(b"%PDF")
+
+    with server.client() as client:
+        with pytest.raises(ChannelLogTimeoutError) as e:
+            client.upload_and_poll("NB_COA", str(document), timeout=0.5)
+    assert e.value.last_status in ("UPLOADING", "PROCESSING")
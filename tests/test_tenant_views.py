@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from document_insighter.dedup import DedupIndex
+from document_insighter.extraction_cache import ExtractionCache
+from tests.stub_server import StubConfig, StubServer
+
+
+@pytest.fixture
+def server():
+    with StubServer(StubConfig(extractions=20, batches=1, rows=2)) as server:
+        yield server
+
+
+def test_tenant_views_share_one_session(server, tmp_path):
+    document = tmp_path / "document.pdf"
+    document.write_bytes(b"%PDF")
+    with server.client() as client:
+        client.extraction_cache = ExtractionCache()
+        client.dedup_index = DedupIndex()
+        views = [client.for_tenant(f"tenant-{i}") for i in range(3)]
+        for view in views:
+            log = view.upload_document("NB_COA", str(document))
+            status = view.get_channel_log_status(log["id"])["status"]
+            view.get_channel_extractions_exporting(log["id"], status)
+            list(view.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2), page_size=10))
+        client.get_channel_log_status(log["id"])
+
+        assert all(view.oauth is client.oauth and view.token_manager is client.token_manager for view in views)
+        assert all(view.extraction_cache is client.extraction_cache for view in views)
+        assert all(view.dedup_index is None for view in views)
+        assert views[0].for_tenant("other")._root is client
+        views[0].close()
+        assert client.oauth.adapters
+
+    assert server.tenants == {"tenant-0": 6, "tenant-1": 6, "tenant-2": 6, "stub": 1}
+    # the requests were sent one after another on a kept-alive connection
+    assert server.connections == 1
+    assert {key[0] for key in client.extraction_cache._entries} == {"tenant-0", "tenant-1", "tenant-2"}
+
+
+def test_async_tenant_views_share_one_connection_pool(server):
+    pytest.importorskip("httpx")
+    from document_insighter.async_client import AsyncServiceAccountClient
+
+    async def run():
+        async with server.client(AsyncServiceAccountClient) as client:
+            views = [client.for_tenant(f"tenant-{i}") for i in range(3)]
+            for view in views:
+                await view.get_channel_log_uuids_by_md5("md5")
+            await views[0].aclose()
+            await client.get_channel_log_uuids_by_md5("md5")
+
+    asyncio.run(run())
+    assert server.tenants == {"tenant-0": 1, "tenant-1": 1, "tenant-2": 1, "stub": 1}
+    assert server.connections == 1
+
+
+def test_caches_set_after_the_view_are_shared(server):
+    with server.client() as client:
+        view = client.for_tenant("tenant-0")
+        client.extraction_cache = ExtractionCache()
+        assert view.extraction_cache is client.extraction_cache
+        view.hash_cache = object()
+        assert client.hash_cache is view.hash_cache
+        assert view.instrumentation is client.instrumentation
+        assert view.dedup_index is None
@@ -0,0 +1,90 @@
+import json
+import threading
+import time
+
+from document_insighter.api_client import ServiceAccountClient
+from document_insighter.model import Env
+from document_insighter.token_manager import TokenManager
+
+
+def make_token(access_token, expires_in=3600):
+    return {"access_token": access_token, "id_token": access_token, "refresh_token": "refresh",
+            "token_type": "Bearer", "expires_in": expires_in, "expires_at": time.time() + expires_in}
+
+
+class Refresher:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.count += 1
+            count = self.count
+        time.sleep(self.delay)
+        return make_token(f"refreshed-{count}")
+
+
+def test_refresh_writes_token_file_atomically(tmp_path):
+    token_filename = tmp_path / "tokens" / "token.json"
+    updates = []
+    manager = TokenManager(Refresher(), str(token_filename), make_token("old", expires_in=-1),
+                           on_update=updates.append, background=False)
+
+    token = manager.refresh()
+    assert token["access_token"] == "refreshed-1"
+    assert json.loads(token_filename.read_text()) == token
+    assert updates == [token]
+    assert [path.name for path in token_filename.parent.iterdir() if path.name.endswith(".tmp")] == []
+
+
+def test_token_refreshed_by_another_process_is_adopted(tmp_path):
+    token_filename = str(tmp_path / "token.json")
+    first, second = Refresher(), Refresher()
+    expired = make_token("old", expires_in=-1)
+    managers = [TokenManager(first, token_filename, expired, background=False),
+                TokenManager(second, token_filename, expired, background=False)]
+
+    managers[0].refresh()
+    assert managers[1].refresh()["access_token"] == "refreshed-1"
+    assert (first.count, second.count) == (1, 0)
+
+
+def test_concurrent_refreshes_are_serialized_by_the_file_lock(tmp_path):
+    token_filename = str(tmp_path / "token.json")
+    refresher = Refresher(delay=0.05)
+    # each manager opens its own lock file, like separate processes
+    managers = [TokenManager(refresher, token_filename, make_token("old", expires_in=-1), background=False)
+                for _ in range(8)]
+    threads = [threading.Thread(target=manager.refresh) for manager in managers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert refresher.count == 1
+    assert {manager.token["access_token"] for manager in managers} == {"refreshed-1"}
+
+
+def test_token_is_refreshed_in_background_before_it_expires(tmp_path):
+    refresher = Refresher()
+    refreshed = threading.Event()
+    manager = TokenManager(refresher, str(tmp_path / "token.json"), make_token("old", expires_in=1.5),
+                           refresh_margin=1, on_update=lambda token: refreshed.set())
+    try:
+        assert refreshed.wait(2)
+        assert manager.token["access_token"] == "refreshed-1"
+        assert not manager.needs_refresh()
+    finally:
+        manager.close()
+
+
+def test_service_account_client_parses_token_json():
+    token = make_token("access")
+    client = ServiceAccountClient(Env.STAGING, client_id="id", client_secret="secret", token_json=json.dumps(token))
+    try:
+        assert client.oauth.access_token == "access"
+        assert client.token_manager.token == token
+    finally:
+        client.close()
@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from datetime import datetime
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from document_insighter.api_client import DocumentInsighter
+from document_insighter.model import EnvType
+from document_insighter.transport import JitteredRetry, TimeoutHTTPAdapter, TransportPolicy
+
+FAST = TransportPolicy(max_retries=3, backoff_factor=0.01, timeout=5)
+
+
+@pytest.fixture
+def server():
+    """Local server which answers the paths in `server.responses`, a list of (status, headers, body) per path."""
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self):
+            path = urlparse(self.path)
+            if self.headers.get("Content-Length"):
+                self.rfile.read(int(self.headers["Content-Length"]))
+            httpd.requests.append((self.command, self.path))
+            responses = httpd.responses[path.path]
+            status, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+            if callable(body):
+                body = body(parse_qs(path.query))
+            body = json.dumps(body).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value.format(port=httpd.server_port))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = _respond
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.requests = []
+    httpd.responses = {}
+    httpd.url = f"http://127.0.0.1:{httpd.server_port}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class LocalSession(requests.Session):
+    """Session which accepts the OAuth2Session keywords."""
+
+    def request(self, method, url, client_id=None, client_secret=None, **kwargs):
+        return super().request(method, url, **kwargs)
+
+
+def make_client(server, transport=FAST):
+    client = DocumentInsighter(EnvType(server.url, None), None, None, None, None, "acme", transport=transport)
+    client.oauth = LocalSession()
+    client._configure_session()
+    return client
+
+
+def test_policy_is_mounted_on_the_session(server):
+    client = make_client(server, TransportPolicy(pool_maxsize=32, timeout=(1, 2), keep_alive=False))
+    adapter = client.oauth.get_adapter("https://example.com")
+    assert isinstance(adapter, TimeoutHTTPAdapter)
+    assert adapter.timeout == (1, 2)
+    assert adapter._pool_maxsize == 32
+    assert isinstance(adapter.max_retries, JitteredRetry)
+    assert client.oauth.headers["Connection"] == "close"
+    assert client.oauth.headers["X-CURRENT-TENANT"] == "acme"
+
+
+def test_get_is_retried_on_retryable_status(server):
+    server.responses["/api/document-channel-logs/1/status"] = [
+        (502, {}, {}), (503, {"Retry-After": "0"}, {}), (200, {}, {"status": "COMPLETED"}),
+    ]
+    client = make_client(server)
+    assert client.get_channel_log_status(1) == {"status": "COMPLETED"}
+    assert len(server.requests) == 3
+
+
+def test_retries_are_exhausted_with_the_last_response(server):
+    server.responses["/api/document-channel-logs/1/status"] = [(503, {}, {})]
+    client = make_client(server, TransportPolicy(max_retries=2, backoff_factor=0))
+    with pytest.raises(requests.HTTPError) as e:
+        client.get_channel_log_status(1)
+    assert e.value.response.status_code == 503
+    assert len(server.requests) == 3
+
+
+def test_upload_is_not_retried(server, tmp_path):
+    file_path = tmp_path / "document.pdf"
+    file_path.write_bytes(b"%PDF")
+    server.responses["/api/documents/common/upload"] = [(503, {}, {}), (200, {}, [{"id": 1}])]
+    client = make_client(server)
+    with pytest.raises(requests.HTTPError):
+        client.upload_document("NB_COA", str(file_path), ignore_duplicate=True)
+    assert len(server.requests) == 1
+
+
+def test_pagination_retry_resumes_at_failed_page(server):
+    next_link = '<http://127.0.0.1:{port}/api/extraction-exporting/extractions?page=%s>; rel="next"'
+
+    def page(query):
+        return [{"id": query["page"][0]}]
+
+    server.responses["/api/extraction-exporting/extractions"] = [
+        (200, {"Link": next_link % 1}, page),
+        (500, {}, {}),
+        (200, {"Link": next_link % 2}, page),
+        (200, {}, page),
+    ]
+    client = make_client(server)
+    pages = list(client.query_extractions_pages("NB_COA", datetime(2022, 3, 1), datetime(2022, 3, 2)))
+    assert pages == [[{"id": "0"}], [{"id": "1"}], [{"id": "2"}]]
+    assert [urlparse(path).query.split("page=")[1][:1] for _, path in server.requests] == ["0", "1", "1", "2"]
+
+
+def test_backoff_has_full_jitter_and_cap():
+    policy = TransportPolicy(max_retries=10, backoff_factor=1, backoff_max=5)
+    delays = [policy.backoff(10) for _ in range(200)]
+    assert all(0 <= delay <= 5 for delay in delays)
+    assert len(set(delays)) > 1
+
+    retry = policy.retry()
+    for _ in range(6):
+        retry = retry.increment("GET", "/", error=requests.exceptions.ConnectionError())
+    assert retry.backoff_cap == 5
+    assert 0 <= retry.get_backoff_time() <= 5
+
+
+def test_retry_after_header():
+    policy = TransportPolicy()
+    assert policy.retry_after({"Retry-After": "3"}) == 3
+    assert 0 < policy.retry_after({"Retry-After": formatdate(time.time() + 30, usegmt=True)}) <= 30
+    assert policy.retry_after({}) is None
+    assert policy.retry_after({"Retry-After": "not a date"}) is None
+    assert policy.retry_after({"Retry-After": "Fri, 99 Foo 2022 25:61:00 GMT"}) is None
+    assert TransportPolicy(respect_retry_after=False).retry_after({"Retry-After": "3"}) is None